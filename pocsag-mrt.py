@@ -15,400 +15,165 @@
 # 
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from gruel import pmt
 from gnuradio import gr
-from gnuradio import extras
 from gnuradio import eng_notation
 from gnuradio.eng_option import eng_option
+import os
 import sys
 import time
 import argparse
+import threading
+import SocketServer
 import osmosdr
-import pocsag
-
-try:
-	from gnuradio import qtgui
-	from PyQt4 import QtGui, QtCore, uic
-	import sip
-except ImportError:
-	print "Error: Program requires PyQt4 and gr-qtgui."
-	sys.exit(1)
-
-BANNER = "POCSAG Multichannel Realtime Decoder -- iZsh (izsh at fail0verflow.com)"
+import pocsag_shard
+import pocsag_store
+import pocsag_metrics
+import pocsag_plan
+import pocsag_record
+import pocsag_engine
+from pocsag_channels import DEDUP_TTL, BANNER, channelizer, sample_counter, channel_manager, msghub, message_cache, format_pagerline, freq_str, read_channels, parse_symrates, record_publisher
 
 INI_FREQ_CORR = 0.0
 INI_FREQ= 0.0
 INI_SAMPLERATE = 1e6
 INI_SYMRATE = 1200
-SPS = 8 # signal per symbol
-
-FFTSIZE = 2048
-XLATING_CUTOFF = 10e3
-
-class pocsag_msgsink(gr.block, QtCore.QObject):
-
-	pocsag_pagermsg = QtCore.pyqtSignal(dict)
-
-	def __init__(self):
-		gr.block.__init__(
-			self,
-			name = "POCSAG message sink",
-			in_sig = None,
-			out_sig = None,
-			has_msg_input = True
-		)
-		QtCore.QObject.__init__(self)
-
-	def work(self, input_items, output_items):
-		try:
-			msg = self.pop_msg_queue()
-			key = pmt.pmt_symbol_to_string(msg.key)
-			txt = pmt.to_python(msg.value)
-			if key == pocsag.POCSAG_ID:
-				self.pocsag_pagermsg.emit(txt)
-				return 1
-			return 0
-		except:
-			return -1
-
-# We can't derive from extras.stream_selector... hence the ugly workaround
-class stream_selector:
-	def __init__(self, num_inputs, size_of_items):
-		self.ss = extras.stream_selector(gr.io_signature(num_inputs, num_inputs, size_of_items),
-			gr.io_signature(1, 1, size_of_items))
-		self.num_inputs = num_inputs
-	def set_output(self, n):
-		p = [-2] * self.num_inputs
-		p[n] = 0
-		self.ss.set_paths(p)
-
-class main_window(QtGui.QMainWindow):
-
-	backspacepressed = QtCore.pyqtSignal()
-
-	def __init__(self, topblock, args):
-		QtGui.QMainWindow.__init__(self)
-
-		uic.loadUi('pocsag-mrt_main.ui', self)
-		self.srcsink = uic.loadUi('pocsag-mrt_srcsink.ui')
-		self.demodsink = uic.loadUi('pocsag-mrt_demodsink.ui')
 
+# Headless mode: no Qt and no visualisation sinks at all.
+# The decoded messages go to stdout (or to a file) and the channels can be
+# added/removed at runtime through a local unix socket, one command per line:
+#   add <freq> / remove <freq> / list / stats
+#   debug <freq> on|off / trace <freq>
+#   reload (the --capcodes file)
+# With a shard pool, the channels run in the worker processes, the main
+# flowgraph only feeds them through the shared memory ring.
+class daemon:
+	def __init__(self, topblock, args, pool = None):
 		self.topblock = topblock
-		self.args = args
-		self.push_text(BANNER, QtCore.Qt.magenta)
-
-		self.init_sink()
-
-		# Connect the signals/slots etc.
-		self.freq_list.installEventFilter(self)
-		self.srcsink.installEventFilter(self)
-		self.demodsink.installEventFilter(self)
-		self.installEventFilter(self)
-		self.centerfreq_edit.returnPressed.connect(self.centerfreq_edittext)
-		self.addfreq_edit.returnPressed.connect(self.addfreq_edittext)
-		self.symrate_edit.returnPressed.connect(self.symrate_edittext)
-		self.samplerate_edit.returnPressed.connect(self.samplerate_edittext)
-		self.freqcorr_edit.returnPressed.connect(self.freqcorr_edittext)
-		self.freq_list.itemSelectionChanged.connect(self.select_freq)
-		self.backspacepressed.connect(self.remove_selected_freq)
-		self.debug_check.stateChanged.connect(self.debug_state)
-		self.srcsink_check.stateChanged.connect(self.srcsink_state)
-		self.demodsink_check.stateChanged.connect(self.demodsink_state)
-		# General inits
-		self.selected_freq = None
-		self.freqs = dict()
-		self.set_freqcorr(self.topblock.source.get_freq_corr())
-		self.set_samplerate(self.topblock.source.get_sample_rate())
-		self.set_centerfreq(self.topblock.source.get_center_freq())
-		self.symrate_edit.setText("%d" % self.args.symrate)
-		self.symrate = float(self.args.symrate)
-		self.read_channels(args.channels_file)
-
-	def init_sink(self):
-		self.topblock.stop()
-		self.topblock.wait()
-		self.enable_selector_buttons(False)
-		#
-		# Source/premodulation
-		#
-		# Create the selector and connect the source to it
-		self.sel_c = stream_selector(3, gr.sizeof_gr_complex)
-		self.topblock.connect(self.topblock.source, (self.sel_c.ss, 0))
-		self.srcsink.source_source_radio.setEnabled(True)
-		self.sel_c.set_output(0)
-		# Add the sink
-		self.srcsink.grsink = qtgui.sink_c(FFTSIZE, gr.firdes.WIN_BLACKMAN_hARRIS,
-			self.topblock.source.get_center_freq(), self.topblock.source.get_sample_rate(),
-			"Source Signal", True, True, True, False)
-		self.srcsink.grsink.set_update_time(0.1)
-		self.topblock.connect(self.sel_c.ss, self.srcsink.grsink)
-		self.srcsink.sink = sip.wrapinstance(self.srcsink.grsink.pyqwidget(), QtGui.QWidget)
-		self.srcsink.horizontalLayout.addWidget(self.srcsink.sink)
-		# add a button group for the radio buttons
-		self.waveselc = QtGui.QButtonGroup(self.srcsink.verticalLayout)
-		self.waveselc.addButton(self.srcsink.source_source_radio, 0)
-		self.waveselc.addButton(self.srcsink.source_xlating_radio, 1)
-		self.waveselc.addButton(self.srcsink.source_interpolator_radio, 2)
-		self.waveselc.buttonClicked[int].connect(self.waveselc_toggled)
-		self.srcsink.source_source_radio.setChecked(True)
-		#
-		# Demodulation
-		#
-		# Add the sink
-		self.sel_f = stream_selector(4, gr.sizeof_float)
-		self.sel_f.set_output(0)
-		self.demodsink.grsink = qtgui.sink_f(FFTSIZE, gr.firdes.WIN_BLACKMAN_hARRIS,
-			0, self.args.symrate * SPS, "Demodulated Signal", True, True, True, False)
-		self.demodsink.grsink.set_update_time(0.1)
-		self.topblock.connect(self.sel_f.ss, self.demodsink.grsink)
-		self.demodsink.sink = sip.wrapinstance(self.demodsink.grsink.pyqwidget(), QtGui.QWidget)
-		self.demodsink.horizontalLayout.addWidget(self.demodsink.sink)
-		# Add the button group
-		self.waveself = QtGui.QButtonGroup(self.demodsink.verticalLayout)
-		self.waveself.addButton(self.demodsink.demodulation_quaddemod_radio, 0)
-		self.waveself.addButton(self.demodsink.demodulation_lowpass_radio, 1)
-		self.waveself.addButton(self.demodsink.demodulation_clockrecovery_radio, 2)
-		self.waveself.addButton(self.demodsink.demodulation_bits_radio, 3)
-		self.waveself.buttonClicked[int].connect(self.waveself_toggled)
-		self.demodsink.demodulation_quaddemod_radio.setChecked(True)
-		#
-		self.topblock.start()
-
-	def read_channels(self, channels_file):
-		if not channels_file: return
-		for freq in channels_file.readlines():
-			self.addfreq(eng_notation.str_to_num(freq.strip()))
-
-	def eventFilter(self, watched, event):
-		if event.type() == QtCore.QEvent.KeyPress and event.key() == QtCore.Qt.Key_Backspace:
-			self.backspacepressed.emit()
-			return True
-		if event.type() == QtCore.QEvent.Close and watched == self.srcsink:
-			self.srcsink_check.setCheckState(QtCore.Qt.Unchecked)
-			return True
-		if event.type() == QtCore.QEvent.Close and watched == self.demodsink:
-			self.demodsink_check.setCheckState(QtCore.Qt.Unchecked)
-			return True
-		if event.type() == QtCore.QEvent.Close and watched == self:
-			self.srcsink_check.setCheckState(QtCore.Qt.Unchecked)
-			self.demodsink_check.setCheckState(QtCore.Qt.Unchecked)
-			# Keep processing the event, we want to close the app
-		return False
-
-	def enable_selector_buttons(self, enabled = True):
-		# We never disable the source button
-		self.srcsink.source_xlating_radio.setEnabled(enabled)
-		self.srcsink.source_interpolator_radio.setEnabled(enabled)
-		self.demodsink.demodulation_quaddemod_radio.setEnabled(enabled)
-		self.demodsink.demodulation_lowpass_radio.setEnabled(enabled)
-		self.demodsink.demodulation_clockrecovery_radio.setEnabled(enabled)
-		self.demodsink.demodulation_bits_radio.setEnabled(enabled)
-
-	def waveselc_toggled(self, Id):
-		self.sel_c.set_output(Id)
-		self.set_uisink_frequency_range()
-
-	def waveself_toggled(self, Id):
-		self.sel_f.set_output(Id)
-		self.set_uisink_frequency_range()
-
-	def push_text(self, text, color = QtCore.Qt.black):
-		self.console.setTextColor(color)
-		self.console.append(text)
-
-	def push_pagermsg(self, txt):
-		ch = "N/A" if txt["channel"] == None else txt["channel"]
-		pagertext = "Pager message -- Channel %s, From pager %d (%d), TXT: %s" % (ch, txt["addr"], txt["fun"], txt["text"])
-		if txt["endofmsg"]:
-			self.push_text(pagertext, QtCore.Qt.blue)
+		self.pool = pool
+		self.output = open(args.msgfile, "a") if args.msgfile else sys.stdout
+		# the messages come from the gnuradio threads, the commands from
+		# the control socket threads
+		self.output_lock = threading.Lock()
+		self.lock = threading.Lock()
+		self.msghub = msghub(cache = message_cache(args.dedup) if args.dedup else None)
+		self.store = pocsag_store.message_store(args.store, self.log) if args.store else None
+		self.publisher = record_publisher(args.msgsocket, self.log) if args.msgsocket else None
+		self.msghub.start_delivery(self.write_pagermsgs)
+		if pool:
+			self.channels = pool
+			pool.start_merger(self.log, self.msghub.push)
+			self.topblock.stop()
+			self.topblock.wait()
+			self.topblock.connect(self.topblock.source, pool.sink())
+			self.topblock.start()
 		else:
-			self.push_text(pagertext, QtCore.Qt.red)
-
-	def set_uisink_frequency_range(self):
-		if not  hasattr(self, 'freq') or not hasattr(self, 'freqshift') or not  hasattr(self, 'samplerate'):
-			return
-		if self.waveselc.checkedId() == 0: # the source
-			self.srcsink.grsink.set_frequency_range(self.centerfreq, self.samplerate)
-		elif self.waveselc.checkedId() == 1: # the shifted frequency
-			self.srcsink.grsink.set_frequency_range(self.centerfreq + self.freqshift, self.samplerate)
-		elif self.waveselc.checkedId() == 2: # interpolated/decimated
-			self.srcsink.grsink.set_frequency_range(self.centerfreq + self.freqshift, self.symrate * SPS)
-		if self.waveself.checkedId() == 0: # quad demod
-			self.demodsink.grsink.set_frequency_range(0, self.symrate * SPS)
-		elif self.waveself.checkedId() == 1: # lowpass
-			self.demodsink.grsink.set_frequency_range(0, self.symrate * SPS)
-		elif self.waveself.checkedId() == 2: # clock recovery
-			self.demodsink.grsink.set_frequency_range(0, self.symrate)
-		elif self.waveself.checkedId() == 3: # bits
-			self.demodsink.grsink.set_frequency_range(0, self.symrate)
-
-	def set_centerfreq(self, freq):
-		self.centerfreq = freq
-		self.centerfreq_edit.setText("%.3fM" % (self.centerfreq / 1e6))
-		self.push_text("Setting center frequency to %.3fMhz" % (self.centerfreq / 1e6))
-		self.update_freqs()
-		self.topblock.source.set_center_freq(self.centerfreq)
-		self.set_uisink_frequency_range()
-
-	def update_freqs(self):
-		for freq_txt, values in self.freqs.items():
-			if abs(self.centerfreq - values["freq"]) > self.samplerate / 2.0:
-				self.push_text("%s is outside of the bandwidth reach!" % freq_txt)
-				self.remove_freq(freq_txt)
-
-	def addfreq(self, freq):
-		self.addfreq_edit.clearFocus()
-		self.addfreq_edit.clear()
-		freq_txt = "%.6fMHz" % (freq / 1e6)
-		if freq_txt in self.freqs:
-			self.push_text("%s is already monitored!" % freq_txt)
-			return
-		if abs(self.centerfreq - freq) > self.samplerate / 2.0:
-			self.push_text("%s is outside of the bandwidth reach!" % freq_txt)
-			return
-		self.push_text("Monitoring %s" % freq_txt)
-		freqshift = self.centerfreq - freq
-		# reconfigure the flowgraph
-		# We use stop()/wait() because lock()/unlock() seems to freeze the app
-		# Can't find the reason...
-		self.topblock.stop()
-		self.topblock.wait()
-		# self.topblock.lock()
-		freq_xlating_fir_filter = gr.freq_xlating_fir_filter_ccc(1, (gr.firdes.low_pass(1.0, self.samplerate, XLATING_CUTOFF, XLATING_CUTOFF / 2)), freqshift, self.samplerate)
-		pocsag_decoder = pocsag.pocsag_decoder(self.samplerate, channel_str = freq_txt, symbolrate = self.symrate, debug = self.debug_check.isChecked())
-		msgsink = pocsag_msgsink() # FIXME: Shouldn't we use only one general msgsink?
-		self.topblock.connect(self.topblock.source, freq_xlating_fir_filter, pocsag_decoder, msgsink)
-		# Connect the QT signal from the msgsink to the UI
-		msgsink.pocsag_pagermsg.connect(self.push_pagermsg)
-		# self.topblock.unlock()
-		self.topblock.start()
-		# Save the blocks
-		self.freqs[freq_txt] = {
-			"freq": freq,
-			"freq_xlating_fir_filter": freq_xlating_fir_filter,
-			"pocsag_decoder": pocsag_decoder,
-			"msgsink": msgsink,
-			"uchar2float": gr.uchar_to_float() # we need a converter to connect it to the qtsink
-		}
-		self.freq_list.addItem(freq_txt)
-
-	def disconnect_sink(self, freq):
-		self.topblock.disconnect(self.freqs[freq]["freq_xlating_fir_filter"], (self.sel_c.ss, 1))
-		self.topblock.disconnect(self.freqs[freq]["pocsag_decoder"].fractional_interpolator, (self.sel_c.ss, 2))
-		self.topblock.disconnect(self.freqs[freq]["pocsag_decoder"].quadrature_demod, (self.sel_f.ss, 0))
-		self.topblock.disconnect(self.freqs[freq]["pocsag_decoder"].low_pass_filter, (self.sel_f.ss, 1))
-		self.topblock.disconnect(self.freqs[freq]["pocsag_decoder"].digital_clock_recovery_mm, (self.sel_f.ss, 2))
-		self.topblock.disconnect(self.freqs[freq]["pocsag_decoder"].digital_binary_slicer_fb, self.freqs[freq]["uchar2float"], (self.sel_f.ss, 3))
-
-	def connect_sink(self, freq):
-		self.topblock.connect(self.freqs[freq]["freq_xlating_fir_filter"], (self.sel_c.ss, 1))
-		self.topblock.connect(self.freqs[freq]["pocsag_decoder"].fractional_interpolator, (self.sel_c.ss, 2))
-		self.topblock.connect(self.freqs[freq]["pocsag_decoder"].quadrature_demod, (self.sel_f.ss, 0))
-		self.topblock.connect(self.freqs[freq]["pocsag_decoder"].low_pass_filter, (self.sel_f.ss, 1))
-		self.topblock.connect(self.freqs[freq]["pocsag_decoder"].digital_clock_recovery_mm, (self.sel_f.ss, 2))
-		self.topblock.connect(self.freqs[freq]["pocsag_decoder"].digital_binary_slicer_fb, self.freqs[freq]["uchar2float"], (self.sel_f.ss, 3))
-
-	def select_freq(self):
-		if len(self.freq_list.selectedItems()) == 0:
-			return
-		freq = str(self.freq_list.selectedItems()[0].text())
-		# Stop the flowchart
-		self.topblock.stop()
-		self.topblock.wait()
-		# self.topblock.lock()
-		# Disconnect the old selection
-		if self.selected_freq:
-			self.disconnect_sink(self.selected_freq)
-		# Connect the new selection
-		self.connect_sink(freq)
-		# Restart the flowgraph
-		self.topblock.start()
-		# self.topblock.unlock()
-		# Adjust the UI info
-		self.set_uisink_frequency_range()
-		self.enable_selector_buttons(True)
-		self.selected_freq = freq
-
-	def remove_selected_freq(self):
-		if self.selected_freq == None: return
-		self.remove_freq(self.selected_freq)
-
-	def remove_freq(self, freq):
-		if freq == None or freq not in self.freqs: return
-		self.push_text("Removing %s" % freq)
-		self.topblock.stop()
-		self.topblock.wait()
-		if self.selected_freq == freq: self.disconnect_sink(freq)
-		self.topblock.disconnect(self.topblock.source,
-			self.freqs[freq]["freq_xlating_fir_filter"],
-			self.freqs[freq]["pocsag_decoder"],
-			self.freqs[freq]["msgsink"])
-		self.topblock.start()
-		self.enable_selector_buttons(False)
-		del self.freqs[freq]
-		self.set_uisink_frequency_range()
-		if self.selected_freq == freq: self.selected_freq = None
-		self.freq_list.takeItem(self.freq_list.row(self.freq_list.findItems(freq, QtCore.Qt.MatchExactly)[0]))
-
-	def set_freqcorr(self, freqcorr):
-		self.freqcorr = freqcorr
-		self.topblock.source.set_freq_corr(self.freqcorr, 0)
-		self.freqcorr_edit.setText("%.3f" % self.freqcorr)
-		self.push_text("Setting freq. correction to %.3f ppm" % self.freqcorr)
-
-	def set_samplerate(self, samplerate):
-		self.samplerate = samplerate
-		self.samplerate_edit.setText("%.3fM" % (self.samplerate / 1e6))
-		self.push_text("Setting sample rate to %.3fMhz" % (self.samplerate / 1e6))
-		self.update_freqs()
-		self.set_uisink_frequency_range()	
-
-	def centerfreq_edittext(self):
-		# try:
-			self.set_centerfreq(eng_notation.str_to_num(str(self.centerfreq_edit.text())))
-		# except ValueError:
-		# 	self.push_text("Bad center frequency value entered")
-
-	def addfreq_edittext(self):
-		try:
-			self.addfreq(eng_notation.str_to_num(str(self.addfreq_edit.text())))
-		except ValueError:
-			self.push_text("Bad frequency value entered")
-
-	def symrate_edittext(self):
+			self.channels = channel_manager(topblock, topblock.source.get_sample_rate(),
+				topblock.source.get_center_freq(), float(args.symrate),
+				log = self.log, pagermsg = self.msghub.push,
+				squelch = args.squelch, squelch_db = args.squelch_db, symrates = args.symrates,
+				record = pocsag_record.record_settings(args), capcodes = args.capcodes)
+		if args.slots and not pool:
+			self.topblock.stop()
+			self.topblock.wait()
+			self.channels.init_slots(args.slots)
+			self.topblock.start()
+		for freq in args.channels:
+			self.channels.addfreq(freq)
+		if args.metrics:
+			pocsag_metrics.start_dump(args.metrics, self.metrics, args.metrics_period, self.log)
+		self.server = None
+		if args.control:
+			if os.path.exists(args.control):
+				os.unlink(args.control)
+			self.server = control_server(args.control, control_handler)
+			self.server.control = self
+			thread = threading.Thread(target = self.server.serve_forever)
+			thread.daemon = True
+			thread.start()
+
+	def write(self, lines):
+		with self.output_lock:
+			self.output.write("".join(line + "\n" for line in lines))
+			self.output.flush()
+
+	def log(self, text):
+		self.write(["# " + text])
+
+	def write_pagermsgs(self, batch):
+		now = time.strftime("%Y-%m-%d %H:%M:%S")
+		self.write([format_pagerline(txt, now) for txt in batch])
+		if self.store:
+			self.store.push(batch)
+		if self.publisher:
+			self.publisher.publish(batch)
+		dropped = self.msghub.new_drops()
+		if dropped:
+			self.log("%d messages dropped, the output can't keep up!" % dropped)
+
+	def metrics(self):
+		metrics = self.channels.stats()
+		metrics["source"] = dict(metrics.get("source", {}), **self.topblock.counter.stats(self.topblock.source.get_sample_rate()))
+		metrics["hub"] = self.msghub.counters()
+		return metrics
+
+	def command(self, line):
+		cmd = line.split()
+		if len(cmd) == 0:
+			return "ERR empty command"
+		with self.lock:
+			try:
+				if cmd[0] == "list" and len(cmd) == 1:
+					return "OK " + " ".join(sorted(self.channels.freqs.keys()))
+				if cmd[0] == "stats" and len(cmd) == 1:
+					return "OK " + self.msghub.stats()
+				if cmd[0] == "add" and len(cmd) == 2:
+					freq_txt = self.channels.addfreq(eng_notation.str_to_num(cmd[1]))
+					return "OK %s" % freq_txt if freq_txt else "ERR can't monitor %s" % cmd[1]
+				if cmd[0] == "remove" and len(cmd) == 2:
+					freq_txt = freq_str(eng_notation.str_to_num(cmd[1]))
+					return "OK %s" % freq_txt if self.channels.remove_freq(freq_txt) else "ERR %s is not monitored" % freq_txt
+				if cmd[0] == "debug" and len(cmd) == 3 and cmd[2] in ["on", "off"]:
+					freq_txt = freq_str(eng_notation.str_to_num(cmd[1]))
+					return "OK %s" % freq_txt if self.channels.set_debug(cmd[2] == "on", freq_txt) else "ERR %s is not monitored" % freq_txt
+				if cmd[0] == "trace" and len(cmd) == 2:
+					freq_txt = freq_str(eng_notation.str_to_num(cmd[1]))
+					lines = self.channels.dump_trace(freq_txt)
+					if lines == None:
+						return "ERR %s is not monitored" % freq_txt
+					return "\n".join(lines + ["OK %d trace entries" % len(lines)])
+				if cmd[0] == "reload" and len(cmd) == 1:
+					try:
+						entries = self.channels.reload_filter()
+					except (IOError, ValueError) as e:
+						return "ERR %s" % e
+					return "OK %d capcode entries" % entries if entries != None else "ERR no capcode filter (see --capcodes)"
+			except ValueError:
+				return "ERR bad frequency value"
+		return "ERR unknown command"
+
+	def run(self):
 		try:
-			self.symrate = eng_notation.str_to_num(str(self.symrate_edit.text()))
-			self.push_text("Setting symbol rate to %.3fbaud\n" % self.symrate)
-		except ValueError:
-			self.push_text("Bad symbol rate value entered\n")
-
-	def samplerate_edittext(self):
-		try:
-			self.set_samplerate(eng_notation.str_to_num(str(self.samplerate_edit.text())))
-		except ValueError:
-			self.push_text("Bad sample rate value entered")
-
-	def freqcorr_edittext(self):
-		try:
-			self.set_freqcorr(eng_notation.str_to_num(str(self.freqcorr_edit.text())))
-		except ValueError:
-			self.push_text("Bad Freq. correction value entered")
-
-	def debug_state(self, state):
-		for value in self.freqs.values():
-			value["pocsag_decoder"].set_debug(state == QtCore.Qt.Checked)
-
-	def srcsink_state(self, state):
-		if state == QtCore.Qt.Checked:
-			self.srcsink.show()
-		else:
-			self.srcsink.hide()
-
-	def demodsink_state(self, state):
-		if state == QtCore.Qt.Checked:
-			self.demodsink.show()
-		else:
-			self.demodsink.hide()
+			while True:
+				time.sleep(1)
+		except KeyboardInterrupt:
+			pass
+		if self.server:
+			self.server.shutdown()
+			os.unlink(self.server.server_address)
+		if self.pool:
+			self.pool.stop()
+		if self.store:
+			self.store.close()
+		if self.publisher:
+			self.publisher.close()
+
+class control_server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	daemon_threads = True
+
+class control_handler(SocketServer.StreamRequestHandler):
+	def handle(self):
+		for line in self.rfile:
+			self.wfile.write(self.server.control.command(line.strip()) + "\n")
 
 class my_top_block(gr.top_block):
 	def __init__(self, args):
@@ -420,6 +185,8 @@ class my_top_block(gr.top_block):
 		self.source.set_gain_mode(0, 0)
 		self.source.set_gain(10, 0)
 		self.source.set_if_gain(24, 0)
+		self.channelizer = channelizer(self, args.samplerate) if args.channelizer else None
+		self.counter = sample_counter(self, self.source)
 		if args.output_file:
 			self.file_sink = gr.file_sink(gr.sizeof_gr_complex, args.output_file)
 			self.connect(self.source, self.file_sink)
@@ -441,18 +208,100 @@ if __name__ == "__main__":
 		type=eng_notation.str_to_num, default=INI_SAMPLERATE, help='set the samplerate')
 	parser.add_argument('-s', '--symrate', dest='symrate', action='store',
 		type=int, default=INI_SYMRATE, help='set the symbol rate')
+	parser.add_argument('-b', '--symrates', dest='symrates', action='store',
+		type=parse_symrates, default=None, help='decode several symbol rates at once (e.g. 512,1200,2400), sharing the demodulation (overrides --symrate)')
+	parser.add_argument('-P', '--channelizer', dest='channelizer', action='store_true',
+		help='use a shared polyphase channelizer front end instead of one full rate xlating filter per channel')
+	parser.add_argument('-S', '--slots', dest='slots', action='store',
+		type=int, default=0, help='pre-allocate channel slots, to add/remove/select channels without restarting the flowgraph')
+	parser.add_argument('-q', '--squelch', dest='squelch', action='store_true',
+		help='gate the idle channels with a power squelch (adaptive threshold, unless --squelch-db)')
+	parser.add_argument('--squelch-db', dest='squelch_db', action='store',
+		type=float, default=None, help='fixed squelch threshold (dBFS)')
+	parser.add_argument('--record', dest='record', action='store',
+		default=None, help='record the (decimated) samples of the channels around the decoded messages, in this directory (see pocsag_record.py)')
+	parser.add_argument('--record-format', dest='record_format', action='store',
+		choices=sorted(pocsag_record.RECORD_EXTENSIONS.keys()), default=pocsag_record.RECORD_FORMAT, help='recorded samples format')
+	parser.add_argument('--record-pre', dest='record_pre', action='store',
+		type=float, default=pocsag_record.RECORD_PRE, help='recorded seconds before a message (which is decoded at its end)')
+	parser.add_argument('--record-post', dest='record_post', action='store',
+		type=float, default=pocsag_record.RECORD_POST, help='recorded seconds after a message')
+	parser.add_argument('--capcodes', dest='capcodes', action='store',
+		default=None, help='only decode the pagers (addresses and functions) listed in this file, reloaded by the "reload" control command (see pocsag_engine.capcode_filter)')
 	parser.add_argument('-C', '--channelsfile', dest='channels_file', type=file,
 		help='read an initial channels list from a file')
+	parser.add_argument('-A', '--autoplan', dest='autoplan', action='store_true',
+		help='pick the center frequency and the sample rate covering the --channelsfile channels at the lowest cost (see pocsag_plan.py)')
+	parser.add_argument('--rates', dest='rates', action='store',
+		type=pocsag_plan.parse_rates, default=pocsag_plan.PLAN_RATES, help='autoplan: the sample rates supported by the device, comma separated')
+	parser.add_argument('--guard', dest='guard', action='store',
+		type=eng_notation.str_to_num, default=pocsag_plan.PLAN_GUARD, help='autoplan: no channel closer than this to the center frequency (Hz)')
+	parser.add_argument('--devices', dest='devices', action='store',
+		type=int, default=1, help='autoplan: split the channels over at most this many tunings (devices)')
+	parser.add_argument('--tuning', dest='tuning', action='store',
+		type=int, default=0, help='autoplan: the tuning this instance runs (the other ones being run by other instances)')
+	parser.add_argument('-H', '--headless', dest='headless', action='store_true',
+		help='run without any UI, the messages are written to stdout (or to the --msgfile file)')
+	parser.add_argument('-m', '--msgfile', dest='msgfile', action='store',
+		help='append the messages to a file (headless mode: instead of stdout)')
+	parser.add_argument('-d', '--dedup', dest='dedup', action='store',
+		type=float, default=0, help='drop the messages seen again on another channel within this delay (s, e.g. %d), simulcast, and the partial ones completed meanwhile (0 to disable)' % DEDUP_TTL)
+	parser.add_argument('-D', '--store', dest='store', action='store',
+		help='store the messages, in SQLite if the file ends with .db or .sqlite (see pocsag_store.py to query it), in JSON lines otherwise')
+	parser.add_argument('-O', '--msgsocket', dest='msgsocket', action='store',
+		default=None, help='send the messages, as binary records, to the clients of this unix socket (see pocsag_engine.pack_record)')
+	parser.add_argument('-M', '--metrics', dest='metrics', action='store',
+		help='periodically dump the metrics (per channel counters and histograms) to a file, as JSON if it ends with .json, in the Prometheus text format otherwise')
+	parser.add_argument('--metrics-period', dest='metrics_period', action='store',
+		type=float, default=pocsag_metrics.METRICS_PERIOD, help='metrics dump period (s)')
+	parser.add_argument('-u', '--control', dest='control', action='store',
+		help='headless mode: unix socket accepting the add/remove/list channel commands (and stats, debug, trace, reload)')
+	parser.add_argument('-w', '--workers', dest='workers', action='store',
+		type=int, default=0, help='headless mode: spread the channels over this many worker processes')
 	args = parser.parse_args()
-
+	args.channels = read_channels(args.channels_file)
+	if args.capcodes:
+		try:
+			pocsag_engine.capcode_filter(args.capcodes)
+		except (IOError, ValueError) as e:
+			print "Error: %s" % e
+			sys.exit(1)
+	try:
+		pocsag_record.record_settings(args)
+	except OSError as e:
+		print "Error: can't record in %s (%s)" % (args.record, e)
+		sys.exit(1)
+	if args.autoplan:
+		outrate = max(args.symrates or [args.symrate]) * pocsag_plan.SPS
+		try:
+			tunings = pocsag_plan.plan(args.channels, args.devices, args.rates, args.guard, outrate = outrate)
+		except ValueError as e:
+			print "Error: %s" % e
+			sys.exit(1)
+		if tunings == None or args.tuning >= len(tunings):
+			print "Error: the channels can't be covered by %d tuning(s)" % args.devices
+			sys.exit(1)
+		print "\n".join(pocsag_plan.describe(tunings, outrate))
+		args.centerfreq, args.samplerate, args.channels = tunings[args.tuning]
+		print "Running tuning %d" % args.tuning
+
+	# the workers must be forked before the main flowgraph is created
+	pool = pocsag_shard.shard_pool(args, args.workers) if args.headless and args.workers else None
 	# init the flowgraph and run it
 	tb = my_top_block(args)
 	tb.start()
+	if args.headless:
+		daemon(tb, args, pool).run()
+		tb.stop()
+		sys.exit(0)
 	# build and show the UI
+	# (imported here, the headless mode doesn't need Qt at all)
+	from pocsag_gui import QtGui, main_window
 	qapp = QtGui.QApplication(sys.argv)
 	main_window = main_window(tb, args)
 	main_window.show()
 	# Run rabbit, run!
 	qapp.exec_()
+	main_window.close_store()
 	tb.stop()
 
@@ -17,78 +17,44 @@ from gruel import pmt
 from gnuradio import gr
 from gnuradio import digital
 from gnuradio import extras
+import time
+import bisect
 import numpy
+import threading
+import pocsag_metrics
+import pocsag_record
+from pocsag_metrics import histogram, WORK_TIME_BOUNDS, INPUT_ITEMS_BOUNDS
+# the protocol code lives in pocsag_engine (without gnuradio), it's
+# re-exported here
+from pocsag_engine import *
 
 POCSAG_ID = "POCSAG"
 SYMRATE = 1200
 FM_DEVIATION = 4500 # standard deviation is 4.5kHz
 SPS = 8 # signal per symbol
-
-# yeah I know, it's slow, and there are nice bit tricks to do this,
-# but meh
-def hamming_weight(val):
-	return bin(val).count('1')
-
-def is_evenparity(val):
-	return True if hamming_weight(val) & 1 else False
-
-# the code used by POCSAG is a (n=31,k=21) BCH Code with dmin=5,
-# thus it could correct two bit errors in a 31-Bit codeword.
-# It is a systematic code.
-# The generator polynomial is: 
-#   g(x) = x^10+x^9+x^8+x^6+x^5+x^3+1
-# The parity check polynomial is: 
-#   h(x) = x^21+x^20+x^18+x^16+x^14+x^13+x^12+x^11+x^8+x^5+x^3+1
-#   g(x) * h(x) = x^n+1
-# 
-POCSAG_BCH_POLY = 0x769
-POCSAG_BCH_N = 31
-POCSAG_BCH_K = 21
-
-def BCH_syndrome(data, BCH_POLY, BCH_N, BCH_K):
-	mask = 1 << (BCH_N - 1)
-	coeff = BCH_POLY << (BCH_K - 1)
-	n = BCH_K
-
-	s = data >> 1 # throw away parity bit
-	while n > 0:
-		if s & mask:
-			s ^= coeff
-		n -= 1
-		mask >>= 1
-		coeff >>= 1
-	if is_evenparity(data):
-		s |= 1 << (BCH_N - BCH_K)
-
-	return s
-
-def BCH_fix(data, BCH_POLY, BCH_N, BCH_K):
-	for i in xrange(32):
-		t = data ^ (1 << i)
-		if BCH_syndrome(t, BCH_POLY, BCH_N, BCH_K) == 0:
-			return t
-	for i in xrange(32):
-		for j in xrange(i + 1, 32):
-			t = data ^ ((1 << i) | (1 << j))
-			if BCH_syndrome(t, BCH_POLY, BCH_N, BCH_K) == 0:
-				return t
-	return data
-
-# automata states
-POCSAG_SEARCH_PREAMBLE_START = 0
-POCSAG_SEARCH_PREAMBLE_END = 1
-POCSAG_SYNC = 2
-POCSAG_SEARCH_SYNC = 3
-POCSAG_SYNCHED = 4
-# Some constants
-POCSAG_STD_SYNC = 0x7cd215d8
-POCSAG_STD_IDLE = 0x7a89c197
-POCSAG_WORDSIZE = 32
-POCSAG_SOFTTHRESHOLD = 2
-POCSAG_MAXWORD = 16
-
+CHANNEL_CUTOFF = 10e3 # channel low-pass filter cutoff
+MAX_DECIMATION = 8 # maximum decimation of a single filter stage
+SQUELCH_WINDOW = 0.01 # s, the power is measured over such windows
+SQUELCH_PREROLL = 0.1 # s, passed along when the squelch opens
+SQUELCH_HANG = 0.2 # s, the squelch only closes after that long below the threshold
+SQUELCH_MARGIN = 6 # dB, adaptive threshold above the noise floor
+SQUELCH_FALL = 0.5 # noise floor tracking, when the power goes down
+SQUELCH_RISE = 0.02 # and when it goes up (slower, not to follow the signals)
+MULTIRATE_PROBE = 128 # bits, probe window of a backed off multi-rate branch
+MULTIRATE_PERIOD = 4096 # bits, longest backoff period
+MULTIRATE_WINDOW = 32 # bits, preamble detection window
+MULTIRATE_THRESHOLD = 0.8 # preamble detection (1 being a perfect preamble)
+MULTIRATE_HOLD = 1152 # bits, open that long after a preamble, the decoder waiting for the SYNC word
+GAPS_SIZE = 1024 # gaps remembered by a gating block, the older ones are forgotten
+
+# Thin gnuradio adapter of the protocol engine: the records are posted as
+# pmt messages, packed (see pack_record) in a u8 vector rather than as
+# dicts, whose pmt conversions (both ways) cost much more. (The vector is
+# still copied by pmt.from_python and pmt.to_python, gnuradio 3.6 blobs
+# can't be built nor read from python.)
 class pocsag_pktdecoder(gr.block):
-	def __init__(self, channel_str = None, sendmsg = True, debug = False):
+	# (send: where the records go, posted by default)
+	def __init__(self, channel_str = None, sendmsg = True, debug = False, send = None, capfilter = None):
 		gr.block.__init__(
 				self,
 				name = "pocsag",
@@ -96,233 +62,491 @@ class pocsag_pktdecoder(gr.block):
 				out_sig = None,
 				num_msg_outputs = 1
 		)
-		self.channel_str = channel_str
-		self.sendmsg = sendmsg
-		self.debug = debug
-		self.acc = 0
-		self.bcnt = 0
-		self.wcnt = -1
-		self.reset_txtvars()
-		# there's two ways/two automata:
-		# - one search for the preamble and then for the SYNC word
-		#   (this could be useful to extend to non-standard SYNC words)
-		# - the other one directly looks for the SYNC word
-		# To properly factorize the code, we just set the initial
-		# automata state, and the code will take care of taking the
-		# proper path
-		self.init_state = POCSAG_SEARCH_SYNC
-		self.state = self.init_state
-		self.compute_syncmask(32)
-		# self.compute_syncmask(576)
-
-	def reset_txtvars(self):
-		self.activetxt = False
-		self.txt = ""
-		self.num = ""
-		self.txt_w = 0
-		self.txt_bcnt = 0
-		self.addr = 0
-		self.fun = 0
-
-	def compute_syncmask(self, length):
-		self.preamble = 0
-		assert(length % 2 == 0)
-		for i in xrange(length / 2):
-			self.preamble = (self.preamble << 2) | 0b10
-		self.preamble_mask = 2 ** length - 1
-		self.preamble_shifted = ((self.preamble << 1) | 1) & self.preamble_mask
-
-	def send_txt(self, endofmsg = False):
-		if self.sendmsg and (self.addr != 0 or len(self.txt) > 0):
-			self.post_msg(0,
-				pmt.pmt_string_to_symbol(POCSAG_ID),
-				pmt.from_python(
-					{
-						"addr": self.addr,
-						"fun": self.fun,
-						"text": self.txt,
-						"num": self.num,
-						"endofmsg": endofmsg,
-						"channel": self.channel_str
-					})
-				)
-
-	def BCH_syndrome(self, data):
-		return BCH_syndrome(data, POCSAG_BCH_POLY, POCSAG_BCH_N, POCSAG_BCH_K)
-
-	def BCH_fix(self, data):
-		return BCH_fix(data, POCSAG_BCH_POLY, POCSAG_BCH_N, POCSAG_BCH_K)
-
-	def log(self, word, hammingw, status, txt):
-		status_str = "OK" if status else "ERR"
-		if self.debug:
-			print "%2d %08x (%08x) %d %3s %s" % (self.wcnt, word, self.acc, hammingw, status_str, txt)
-
-	def add_preamble_bit(self, b):
-		self.add_bit(b, self.preamble_mask)
-
-	def add_bit(self, b, mask = 0xFFFFFFFF):
-		self.bcnt += 1
-		self.acc = ((self.acc << 1) | int(~b & 1)) & mask
-
-	def read_word(self, inp):
-		assert(len(inp) >= POCSAG_WORDSIZE)
-		self.acc = 0
-		self.bcnt = 0
-		for i in xrange(POCSAG_WORDSIZE):
-			self.add_bit(inp[i])
-
-	def push_text(self, data):
-		for i in reversed(xrange(20)):
-			b = (data >> i) & 1
-			self.txt_w = (self.txt_w >> 1) | (b << 6)
-			self.txt_bcnt += 1
-			if self.txt_bcnt == 7:
-				self.txt += chr(self.txt_w)
-				self.txt_w = 0
-				self.txt_bcnt = 0
-
-	def push_num(self, data):
-		num = ""
-		for i in xrange(5):
-			num += "0123456789*U -)("[(data >> (16 - 4 * i)) & 0xF]
-		self.num += num
-		return num
+		self.key = pmt.pmt_string_to_symbol(POCSAG_ID)
+		self.engine = pocsag_engine(channel_str = channel_str, sendmsg = sendmsg,
+			debug = debug, send = send if send else self.post_txt, capfilter = capfilter)
+		# time spent decoding (s), the gnuradio performance counters
+		# don't cover the python blocks
+		self.work_time = 0.0
+		self.work_hist = histogram(WORK_TIME_BOUNDS)
+		# the items available at each call, hinting at how full the
+		# input buffer is (i.e. how late we are)
+		self.input_hist = histogram(INPUT_ITEMS_BOUNDS)
+
+	def post_txt(self, txt):
+		self.post_msg(0, self.key, pmt.from_python(numpy.frombuffer(pack_record(txt), dtype = numpy.uint8)))
+
+	def set_debug(self, debug = False):
+		self.engine.set_debug(debug)
+
+	def dump_trace(self):
+		return self.engine.dump_trace()
+
+	def reset(self, channel_str = None):
+		self.engine.reset(channel_str)
+		self.work_time = 0.0
+		self.work_hist.reset()
+		self.input_hist.reset()
+
+	def stats(self):
+		stats = self.engine.counters()
+		stats["work_seconds"] = self.work_hist.stats()
+		stats["input_items"] = self.input_hist.stats()
+		return stats
 
 	def work(self, input_items, output_items):
-		return {
-			POCSAG_SEARCH_PREAMBLE_START: self.search_preamble_start,
-			POCSAG_SEARCH_PREAMBLE_END: self.search_preamble_end,
-			POCSAG_SYNC: self.sync,
-			POCSAG_SEARCH_SYNC: self.search_sync,
-			POCSAG_SYNCHED: self.synched
-		}[self.state](input_items[0])
-
-	# it is not really needed, we could directly look for the SYNC word
-	# but let's keep this code, it could be useful in case something
-	# is not using a standard SYNC word
-	def search_preamble_start(self, inp):
-		self.wcnt = -1
-		self.reset_txtvars()
-		for i in xrange(len(inp)):
-			self.add_preamble_bit(inp[i])
-			if self.acc == self.preamble or self.acc == self.preamble_shifted:
-				print "Found preamble @ %d, with 0x%x" % (self.bcnt, self.acc)
-				self.state = POCSAG_SEARCH_PREAMBLE_END
-				return i + 1
-		return len(inp)
-
-	def search_preamble_end(self, inp):
-		for i in xrange(len(inp)):
-			self.add_preamble_bit(inp[i])
-			if self.acc != self.preamble and self.acc != self.preamble_shifted:
-				print "Found end of preamble @ %d, 0x%x " % (self.bcnt, self.acc)
-				self.state = POCSAG_SYNC
-				return i
-		return len(inp)
-
-	def search_sync(self, inp):
-		self.wcnt = -1
-		self.reset_txtvars()
-		for i in xrange(len(inp)):
-			self.add_bit(inp[i])
-			hw = hamming_weight(self.acc ^ POCSAG_STD_SYNC)
-			if hw <= POCSAG_SOFTTHRESHOLD:
-				self.log(self.acc, hw, True, "=> SYNC")
-				self.state = POCSAG_SYNCHED
-				return i + 1
-		return len(inp)
-
-	def sync(self, inp):
-		# wait till we have at least enough bit
-		# this simplify the following code
-		if len(inp) < POCSAG_WORDSIZE: 
-			return 0
-		self.wcnt = -1
-		self.read_word(inp)
-		hw = hamming_weight(self.acc ^ POCSAG_STD_SYNC)
-		if hw <= POCSAG_SOFTTHRESHOLD:
-			self.log(self.acc, hw, True, "=> SYNC")
-			self.state = POCSAG_SYNCHED
-		else:
-			self.log(self.acc, hw, False, "=> lost sync!")
-			self.send_txt(False)
-			self.state = self.init_state
-		return POCSAG_WORDSIZE
-
-	def synched(self, inp):
-		if len(inp) < POCSAG_WORDSIZE: 
-			return 0
-		self.wcnt += 1
-		if self.wcnt >= POCSAG_MAXWORD:
-			self.state = POCSAG_SYNC
-			return 0
-		self.read_word(inp)
-		w = self.acc
-		if self.BCH_syndrome(w) != 0:
-			w = self.BCH_fix(self.acc)
-		if self.BCH_syndrome(w):
-			self.log(w, hamming_weight(self.acc ^ w), False, "=> lost sync!")
-			self.send_txt(False)
-			self.state = self.init_state
-			return POCSAG_WORDSIZE
-		assert(w != POCSAG_STD_SYNC)
-		if w == POCSAG_STD_IDLE and self.activetxt:
-			self.log(w, hamming_weight(self.acc ^ POCSAG_STD_IDLE), True, "=> IDLE (end of message)")
-			self.send_txt(True)
-			self.reset_txtvars()
-		elif w == POCSAG_STD_IDLE:
-			self.log(w, hamming_weight(self.acc ^ POCSAG_STD_IDLE), True, "=> IDLE")
-		elif w & (1 << 31):
-			self.decode_data(w)
+		start = time.time()
+		consumed = self.engine.process(input_items[0])
+		elapsed = time.time() - start
+		self.work_time += elapsed
+		self.work_hist.add(elapsed)
+		self.input_hist.add(len(input_items[0]))
+		return consumed
+
+# Where the output samples of a gating block (squelch, rate gate) come
+# from: a list of (output position, offset) entries, the output samples from
+# that position on being the input ones offset samples later (until the
+# next entry). The gating block adds an entry at each gap, and one for its
+# next output while it's closed, so that the position of what wasn't
+# passed yet keeps up with the input.
+# (The entries list is replaced, never modified in place: the positions can
+# be read from another thread.)
+class gap_log:
+	def __init__(self, size = GAPS_SIZE):
+		self.size = size
+		self.reset()
+
+	def reset(self):
+		self.entries = [(0, 0)]
+
+	def add(self, output, offset):
+		entries = self.entries
+		if entries[-1][1] == offset:
+			return
+		if entries[-1][0] == output:
+			entries = entries[:-1]
+		self.entries = (entries + [(output, offset)])[-self.size:]
+
+	# the input position of an output one
+	def input(self, output):
+		entries = self.entries
+		i = max(0, bisect.bisect_right(entries, (output, float("inf"))) - 1)
+		return output + entries[i][1]
+
+# Power squelch: while a channel is idle, nothing goes through, and the
+# following blocks (demodulation, clock recovery, decoding) don't run at all.
+# The threshold is either fixed (threshold_db, in dBFS) or adaptive, margin_db
+# above the tracked noise floor. The last preroll seconds are kept while
+# closed and passed along first when opening, so that the preamble is not
+# lost. The gaps are logged (see gap_log).
+class power_squelch(gr.block):
+	def __init__(self, samplerate, threshold_db = None, margin_db = SQUELCH_MARGIN,
+		window = SQUELCH_WINDOW, preroll = SQUELCH_PREROLL, hang = SQUELCH_HANG):
+		gr.block.__init__(
+				self,
+				name = "power squelch",
+				in_sig = [numpy.complex64],
+				out_sig = [numpy.complex64]
+		)
+		self.window = max(1, int(samplerate * window))
+		self.preroll = int(samplerate * preroll)
+		self.hang = max(1, int(hang / window))
+		self.threshold = 10 ** (threshold_db / 10.0) if threshold_db != None else None
+		self.margin = 10 ** (margin_db / 10.0)
+		self.gaps = gap_log()
+		self.reset()
+
+	def reset(self):
+		self.floor = None
+		self.isopen = False
+		self.quiet = 0
+		self.history = numpy.zeros(0, dtype = numpy.complex64)
+		# produced, but waiting for some room in the output buffer
+		self.pending = numpy.zeros(0, dtype = numpy.complex64)
+		self.total = 0
+		self.passed = 0
+		self.gaps.reset()
+
+	def level(self):
+		return self.threshold if self.threshold != None else self.floor * self.margin
+
+	# fraction of the samples that went through
+	def duty(self):
+		return 1.0 * self.passed / self.total if self.total else 0.0
+
+	def update(self, power):
+		if self.floor == None:
+			self.floor = power
+		if power > self.level():
+			self.isopen = True
+			self.quiet = 0
+		elif self.isopen:
+			self.quiet += 1
+			self.isopen = self.quiet < self.hang
+		if not self.isopen:
+			self.floor += (SQUELCH_FALL if power < self.floor else SQUELCH_RISE) * (power - self.floor)
+
+	# a general block: the input is consumed explicitly, by whole windows
+	def work(self, input_items, output_items):
+		inp = input_items[0]
+		out = output_items[0]
+		if len(self.pending):
+			n = min(len(out), len(self.pending))
+			out[:n] = self.pending[:n]
+			self.pending = self.pending[n:]
+			self.consume(0, 0)
+			return n
+		nwin = len(inp) / self.window
+		size = nwin * self.window
+		powers = (inp[:size].real ** 2 + inp[:size].imag ** 2).reshape(nwin, self.window).mean(axis = 1)
+		passed = []
+		npassed = 0
+		for i in xrange(nwin):
+			wasopen = self.isopen
+			self.update(powers[i])
+			samples = inp[i * self.window:(i + 1) * self.window]
+			if self.isopen:
+				if not wasopen:
+					output = self.passed + npassed
+					self.gaps.add(output, self.total + i * self.window - len(self.history) - output)
+					passed.append(self.history)
+					npassed += len(self.history)
+					self.history = self.history[:0]
+				passed.append(samples)
+				npassed += len(samples)
+			else:
+				history = numpy.concatenate((self.history, samples))
+				self.history = history[max(0, len(history) - self.preroll):]
+		passed = numpy.concatenate(passed) if passed else self.pending
+		n = min(len(out), len(passed))
+		out[:n] = passed[:n]
+		self.pending = passed[n:].copy()
+		self.consume(0, size)
+		self.total += size
+		self.passed += len(passed)
+		if not self.isopen:
+			self.gaps.add(self.passed, self.total - len(self.history) - self.passed)
+		return n
+
+# Shared by the branches of a multi-rate decoder: a channel only transmits at
+# a single rate at a time, the first branch finding a transmission owns the
+# channel until it's over, the other ones being stopped meanwhile
+class rate_arbiter:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.owner = None
+
+	# whether the branch may run
+	def claim(self, branch, active):
+		with self.lock:
+			if active and self.owner == None:
+				self.owner = branch
+			elif not active and self.owner == branch:
+				self.owner = None
+			return self.owner == None or self.owner == branch
+
+# The input of a multi-rate decoder branch (before its clock recovery).
+# Without any transmission, the branch backs off: it only gets probe
+# windows, further and further apart (up to MULTIRATE_PERIOD), and nothing
+# at all while another branch owns the channel. A preamble at the branch
+# rate (the signal at t and t + 2 symbols alike, opposed to the one at
+# t + 1 symbol) opens it right away, and for long enough for the decoder
+# to find the SYNC word. The gaps are logged (see gap_log).
+class rate_gate(gr.block):
+	def __init__(self, arbiter, pktdecoder, samplepersymbol):
+		gr.block.__init__(
+				self,
+				name = "rate gate",
+				in_sig = [numpy.float32],
+				out_sig = [numpy.float32]
+		)
+		self.arbiter = arbiter
+		self.pktdecoder = pktdecoder
+		self.lag = int(round(samplepersymbol))
+		self.window = int(MULTIRATE_WINDOW * samplepersymbol)
+		self.probe = int(MULTIRATE_PROBE * samplepersymbol)
+		self.maxperiod = int(MULTIRATE_PERIOD * samplepersymbol)
+		self.holdtime = int(MULTIRATE_HOLD * samplepersymbol)
+		self.gaps = gap_log()
+		self.reset()
+
+	def reset(self):
+		# continuously open, until the first probe fails
+		self.period = self.probe
+		self.phase = 0
+		self.hold = 0
+		self.total = 0
+		self.passed = 0
+		self.gaps.reset()
+
+	# fraction of the samples that went through
+	def duty(self):
+		return 1.0 * self.passed / self.total if self.total else 0.0
+
+	# start of the first window looking like a preamble, None otherwise
+	def find_preamble(self, x):
+		n = (len(x) - 2 * self.lag) / self.window
+		if n <= 0:
+			return None
+		size = n * self.window
+		energy = (x[:size] ** 2).reshape(n, self.window).sum(axis = 1) + 1e-12
+		half = -(x[:size] * x[self.lag:self.lag + size]).reshape(n, self.window).sum(axis = 1) / energy
+		full = (x[:size] * x[2 * self.lag:2 * self.lag + size]).reshape(n, self.window).sum(axis = 1) / energy
+		found = numpy.flatnonzero(numpy.minimum(half, full) > MULTIRATE_THRESHOLD)
+		return int(found[0]) * self.window if len(found) else None
+
+	# the probe windows, returns the number of samples passed
+	def backoff(self, inp, out):
+		produced = 0
+		i = 0
+		while i < len(inp):
+			if self.phase < self.probe:
+				m = min(len(inp) - i, self.probe - self.phase)
+				self.gaps.add(self.passed + produced, self.total + i - self.passed - produced)
+				out[produced:produced + m] = inp[i:i + m]
+				produced += m
+			else:
+				m = min(len(inp) - i, self.period - self.phase)
+			i += m
+			self.phase += m
+			if self.phase == self.period:
+				self.phase = 0
+				self.period = min(2 * self.period, self.maxperiod)
+		return produced
+
+	# a general block: whatever is gated is consumed without output
+	def work(self, input_items, output_items):
+		n = min(len(input_items[0]), len(output_items[0]))
+		inp = input_items[0][:n]
+		out = output_items[0]
+		active = self.hold > 0 or self.pktdecoder.engine.active()
+		produced = 0
+		if not self.arbiter.claim(self, active):
+			self.period, self.phase, self.hold = self.probe, 0, 0
+		elif active:
+			self.period, self.phase = self.probe, 0
+			self.hold = max(0, self.hold - n)
+			self.gaps.add(self.passed, self.total - self.passed)
+			out[:n] = inp
+			produced = n
 		else:
-			self.decode_addr(w)
-		return POCSAG_WORDSIZE
-
-	def decode_data(self, w):
-		data = (w >> 11) & (2 ** 20 - 1)
-		self.push_text(data)
-		num = self.push_num(data)
-		self.log(w, hamming_weight(self.acc ^ w), True, "=> NUM: |%s| - TXT: |%s|" % (num, self.txt))
-
-	def decode_addr(self, w):
-		self.reset_txtvars()
-		self.activetxt = True
-		self.addr = ((w >> 13) & (2 ** 18 - 1)) | (self.wcnt / 2)
-		self.fun = (w >> 11) & 3
-		self.log(w, hamming_weight(self.acc ^ w), True, "=> Pager %d (fun = %d)" % (self.addr, self.fun))
-
+			start = self.find_preamble(inp)
+			if start != None and self.arbiter.claim(self, True):
+				self.period, self.phase = self.probe, 0
+				self.hold = self.holdtime - (n - start)
+				self.gaps.add(self.passed, self.total + start - self.passed)
+				out[:n - start] = inp[start:]
+				produced = n - start
+			else:
+				produced = self.backoff(inp, out)
+		self.consume(0, n)
+		self.total += n
+		self.passed += produced
+		# (the next output comes from the next input at best)
+		self.gaps.add(self.passed, self.total - self.passed)
+		return produced
+
+# The taps are cached, channels usually share the same rates and cutoffs
+lowpass_taps_cache = dict()
+
+def lowpass_taps(samplerate, cutoff, transition):
+	key = (samplerate, cutoff, transition)
+	if key not in lowpass_taps_cache:
+		lowpass_taps_cache[key] = tuple(gr.firdes.low_pass(1.0, samplerate, cutoff, transition, gr.firdes.WIN_HAMMING))
+	return lowpass_taps_cache[key]
+
+# Plan the integer decimation stages bringing samplerate down to (just
+# above) outrate, so that most of the filtering runs at low rates, the
+# fractional resampler only taking care of the remaining ratio.
+# Each stage only has to protect [0, cutoff] from the aliases, hence a
+# transition band as wide as the stage output rate allows: the early
+# stages (at high rates) have very few taps.
+# Returns a list of (decimation, input rate, taps) tuples
+def decimation_plan(samplerate, outrate, cutoff = CHANNEL_CUTOFF, transition = CHANNEL_CUTOFF / 2.0, maxdecim = MAX_DECIMATION):
+	plan = []
+	minrate = max(outrate, 2 * cutoff + transition)
+	rate = samplerate
+	while True:
+		decim = min(maxdecim, int(rate / minrate))
+		if decim < 2:
+			break
+		plan.append((decim, rate, lowpass_taps(rate, cutoff, 1.0 * rate / decim - 2 * cutoff)))
+		rate = 1.0 * rate / decim
+	return plan
+
+def plan_outrate(samplerate, plan):
+	for decim, rate, taps in plan:
+		samplerate = 1.0 * samplerate / decim
+	return samplerate
+
+# Human readable plan, with the estimated cost of each stage
+# (in multiply-accumulates per second)
+def describe_plan(samplerate, plan, outrate):
+	stages = ["%.0f" % samplerate]
+	for decim, rate, taps in plan:
+		stages.append("/%d (%d taps, %.1fM MAC/s) -> %.0f" % (decim, len(taps), len(taps) * rate / decim / 1e6, rate / decim))
+	stages.append("x%.4f -> %.0f" % (outrate / plan_outrate(samplerate, plan), outrate))
+	return " ".join(stages)
+
+# With several symbolrates, the front end (decimation, demodulation and
+# low-pass) runs once at the fastest rate, and a branch per rate takes it
+# from the clock recovery on. The branches are gated (see rate_gate): only
+# the one decoding a transmission runs, the other ones backing off.
+# The first rate is the main branch: its blocks are the ones visualised, and
+# its pktdecoder posts the messages of every branch.
+# With record (the pocsag_record.iq_recorder settings), the decimated
+# samples are recorded around the messages.
+# capfilter: the pocsag_engine.capcode_filter of the pktdecoders.
+# The records carry their position (pos): the sample of the source feeding
+# the decoder (origin being its first one, ratio the source samples per
+# input sample) where their last bit was, traced back through the gaps of
+# the squelch and the rate gates (the filters delays aside).
+# With deliver, the records are handed to deliver(txt) right away (from
+# the decoding thread) instead of being posted: nothing comes out then.
 class pocsag_decoder(gr.hier_block2):
 	def __init__(self, samplerate, symbolrate = SYMRATE, channel_str = None,
 		sendmsg = True, debug = False,
-		samplepersymbol = SPS, fmdeviation = FM_DEVIATION
+		samplepersymbol = SPS, fmdeviation = FM_DEVIATION,
+		cutoff = CHANNEL_CUTOFF, squelch = False, squelch_db = None,
+		symbolrates = None, record = None, capfilter = None,
+		origin = 0, ratio = 1.0, deliver = None
 		):
 
 		gr.hier_block2.__init__(self, "pocsag",
 			gr.io_signature(1, 1, gr.sizeof_gr_complex), gr.io_signature(1, 1, 1))
 
 		self.samplerate = samplerate
+		self.symbolrates = list(symbolrates) if symbolrates else [symbolrate]
+		symbolrate = max(self.symbolrates)
 		self.symbolrate = symbolrate
 		self.sendmsg = sendmsg
 		self.debug = debug
 		self.samplepersymbol = samplepersymbol
 		self.fmdeviation = fmdeviation
-
-		self.fractional_interpolator = gr.fractional_interpolator_cc(0, 1.0 * samplerate / (symbolrate * samplepersymbol))
+		self.origin = origin
+		self.ratio = ratio
+		self.deliver = deliver
+
+		# integer decimation stages first, the fractional resampler last
+		self.plan = decimation_plan(samplerate, symbolrate * samplepersymbol, cutoff)
+		self.outrate = plan_outrate(samplerate, self.plan)
+		self.frontrate = symbolrate * samplepersymbol
+		self.decimators = [gr.fir_filter_ccf(decim, taps) for decim, rate, taps in self.plan]
+		# the squelch runs at the lowest rate, just before the (costly) rest
+		# of the chain it gates
+		self.squelch = power_squelch(plan_outrate(samplerate, self.plan), squelch_db) if squelch else None
+		self.fractional_interpolator = gr.fractional_interpolator_cc(0, plan_outrate(samplerate, self.plan) / (symbolrate * samplepersymbol))
 		self.quadrature_demod = gr.quadrature_demod_cf((symbolrate * samplepersymbol) / (fmdeviation * 4.0))
 		self.low_pass_filter = gr.fir_filter_fff(1, gr.firdes.low_pass(1, symbolrate * samplepersymbol, symbolrate * 2, symbolrate / 2.0, gr.firdes.WIN_HAMMING, 6.76))
-		self.digital_clock_recovery_mm = digital.clock_recovery_mm_ff(samplepersymbol, 0.03 * 0.03 * 0.3, 0.4, 0.03, 1e-4)
-		self.digital_binary_slicer_fb = digital.binary_slicer_fb()
-		self.pktdecoder = pocsag_pktdecoder(channel_str = channel_str, sendmsg = sendmsg, debug = debug)
-		self.connect(self,
+		self.connect(self, *(self.decimators + ([self.squelch] if self.squelch else []) + [
 			self.fractional_interpolator,
 			self.quadrature_demod,
-			self.low_pass_filter,
-			self.digital_clock_recovery_mm,
-			self.digital_binary_slicer_fb,
-			self.pktdecoder,
-			self)
+			self.low_pass_filter]))
+		# the recorder taps the samples before the squelch, not to miss the
+		# start of the transmissions
+		self.recorder = pocsag_record.iq_recorder(plan_outrate(samplerate, self.plan), channel_str = channel_str, **record) if record else None
+		if self.recorder:
+			self.connect(self.decimators[-1] if self.decimators else self, self.recorder)
+		self.arbiter = rate_arbiter() if len(self.symbolrates) > 1 else None
+		self.branches = []
+		for rate in self.symbolrates:
+			sps = 1.0 * symbolrate * samplepersymbol / rate
+			branch = {
+				"symbolrate": rate,
+				"sps": sps,
+				"digital_clock_recovery_mm": digital.clock_recovery_mm_ff(sps, 0.03 * 0.03 * 0.3, 0.4, 0.03, 1e-4),
+				"digital_binary_slicer_fb": digital.binary_slicer_fb()
+			}
+			branch["pktdecoder"] = pocsag_pktdecoder(channel_str = channel_str, sendmsg = sendmsg, debug = debug,
+				send = lambda txt, branch = branch: self.send_txt(txt, branch), capfilter = capfilter)
+			branch["gate"] = rate_gate(self.arbiter, branch["pktdecoder"], sps) if self.arbiter else None
+			self.connect(self.low_pass_filter, *(([branch["gate"]] if branch["gate"] else []) + [
+				branch["digital_clock_recovery_mm"],
+				branch["digital_binary_slicer_fb"],
+				branch["pktdecoder"]]))
+			self.branches.append(branch)
+		self.digital_clock_recovery_mm = self.branches[0]["digital_clock_recovery_mm"]
+		self.digital_binary_slicer_fb = self.branches[0]["digital_binary_slicer_fb"]
+		self.pktdecoder = self.branches[0]["pktdecoder"]
+		self.connect(self.pktdecoder, self)
+
+	# the records of every branch, posted by the main one
+	def send_txt(self, txt, branch):
+		txt["pos"] = int(self.position(branch, branch["pktdecoder"].engine.bitpos - 1))
+		if self.recorder:
+			self.recorder.trigger(txt)
+		if self.deliver:
+			self.deliver(txt)
+		else:
+			self.pktdecoder.post_txt(txt)
+
+	# The source position of a bit of a branch (counted since the reset):
+	# back through its gate, the fractional resampler, the squelch and
+	# the decimation stages
+	def position(self, branch, bitpos):
+		x = bitpos * branch["sps"]
+		if branch["gate"]:
+			x = branch["gate"].gaps.input(x)
+		x = x * self.outrate / self.frontrate
+		if self.squelch:
+			x = self.squelch.gaps.input(x)
+		x = x * self.samplerate / self.outrate
+		return self.origin + self.ratio * x
+
+	# The source position every branch decoded up to: nothing decoded
+	# later on will be before it
+	def horizon(self):
+		return min(self.position(branch, branch["pktdecoder"].engine.nbits) for branch in self.branches)
+
+	def pktdecoders(self):
+		return [branch["pktdecoder"] for branch in self.branches]
 
 	def set_debug(self, debug = False):
 		self.debug = debug
-		self.pktdecoder.debug = debug
+		for pktdecoder in self.pktdecoders():
+			pktdecoder.set_debug(debug)
+
+	# (prefixed with the rate, with several branches)
+	def dump_trace(self):
+		if len(self.branches) == 1:
+			return self.pktdecoder.dump_trace()
+		return ["%d: %s" % (branch["symbolrate"], line) for branch in self.branches
+			for line in branch["pktdecoder"].dump_trace()]
+
+	def reset(self, channel_str = None, origin = 0):
+		self.origin = origin
+		for branch in self.branches:
+			branch["pktdecoder"].reset(channel_str)
+			if branch["gate"]:
+				branch["gate"].reset()
+		if self.squelch:
+			self.squelch.reset()
+		if self.recorder:
+			self.recorder.reset(channel_str)
+
+	# the counters of the branches are summed up
+	def stats(self):
+		stats = self.pktdecoder.stats()
+		for branch in self.branches[1:]:
+			stats = pocsag_metrics.merge(stats, branch["pktdecoder"].stats())
+		if self.squelch:
+			stats["squelch_open_ratio"] = self.squelch.duty()
+		if self.recorder:
+			stats.update(self.recorder.stats())
+		if self.arbiter:
+			for branch in self.branches:
+				stats["rate_%d_open_ratio" % branch["symbolrate"]] = branch["gate"].duty()
+				stats["rate_%d_messages" % branch["symbolrate"]] = branch["pktdecoder"].engine.nmessages
+		return stats
+
+	def describe_plan(self):
+		return describe_plan(self.samplerate, self.plan, self.symbolrate * self.samplepersymbol)
+
+	# Time spent in each stage (in ns), when gnuradio was built with the
+	# performance counters; None otherwise
+	def stage_times(self):
+		stages = self.decimators + [self.fractional_interpolator, self.quadrature_demod,
+			self.low_pass_filter] + [branch["digital_clock_recovery_mm"] for branch in self.branches]
+		if not hasattr(self.fractional_interpolator, "pc_work_time"):
+			return None
+		return [(stage.name(), stage.pc_work_time()) for stage in stages]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+# POCSAG Multichannel Realtime Decoder -- protocol decoder benchmark
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Synthetic bitstreams (see pocsag_encoder) with bit errors and bit slips,
+# decoded by the protocol engine the pktdecoder block runs, fed in
+# scheduler-like chunks. The results can be appended to a history file,
+# each run being compared to the previous one with the same parameters.
+import os
+import sys
+import time
+import json
+import argparse
+import subprocess
+import collections
+import numpy
+import pocsag_engine
+import pocsag_encoder
+try:
+	from gruel import pmt
+	from gnuradio import extras # pmt.from_python/to_python
+except ImportError:
+	pmt = None
+
+# name, bit error rate, slip rate
+SCENARIOS = [
+	("clean", 0, 0),
+	("ber-1e-3", 1e-3, 0),
+	("ber-1e-2", 1e-2, 0),
+	("slips-1e-4", 0, 1e-4),
+]
+CHUNK = 4096 # bits per call, like a gnuradio buffer
+TOLERANCE = 0.1 # relative throughput drop considered as a regression
+
+def timed(f, repeat):
+	best = None
+	for i in xrange(repeat):
+		start = time.time()
+		result = f()
+		elapsed = time.time() - start
+		best = elapsed if best == None else min(best, elapsed)
+	return best, result
+
+def decode(bits):
+	engine = pocsag_engine.pocsag_engine()
+	chunks = [bits[i:i + CHUNK] for i in xrange(0, len(bits), CHUNK)]
+	messages = list(engine.decode(chunks))
+	return engine, messages
+
+def bench_scenario(messages, ber, slips, seed, repeat):
+	rng = numpy.random.RandomState(seed)
+	bits = pocsag_encoder.encode_bits(messages)
+	if ber:
+		bits = pocsag_encoder.add_bit_errors(bits, ber, rng)
+	if slips:
+		bits = pocsag_encoder.add_slips(bits, slips, rng)
+	elapsed, (engine, decoded) = timed(lambda: decode(bits), repeat)
+	sent = collections.Counter(pocsag_encoder.expected(*m) for m in messages)
+	received = collections.Counter(pocsag_encoder.decoded(txt) for txt in decoded if txt["endofmsg"])
+	return {
+		"bits_per_sec": len(bits) / elapsed,
+		"codewords_per_sec": engine.nwords / elapsed,
+		"messages_per_sec": len(decoded) / elapsed,
+		"decoded_rate": 1.0 * sum((sent & received).values()) / len(messages),
+		"correction_rate": 1.0 * engine.ncorrected / max(1, engine.nwords),
+		"syncloss_rate": 1.0 * engine.nsynclosses / max(1, engine.nsyncs),
+	}
+
+# BCH syndrome + correction alone, on codewords with 0 to 2 bit errors
+def bench_bch(count, seed, repeat):
+	rng = numpy.random.RandomState(seed)
+	words = [pocsag_encoder.data_word(int(d)) for d in rng.randint(0, 2 ** 20, count)]
+	for i in xrange(count):
+		for b in rng.randint(0, 32, i % 3):
+			words[i] ^= 1 << int(b)
+	engine = pocsag_engine.pocsag_engine()
+	def run():
+		for w in words:
+			if engine.BCH_syndrome(w) != 0:
+				engine.BCH_fix(w)
+	elapsed, result = timed(run, repeat)
+	return { "words_per_sec": count / elapsed }
+
+# SYNC search alone, on noise
+def bench_sync(count, seed, repeat):
+	bits = numpy.random.RandomState(seed).randint(0, 2, count).astype(numpy.uint8)
+	def run():
+		engine = pocsag_engine.pocsag_engine()
+		for i in xrange(0, count, CHUNK):
+			chunk = bits[i:i + CHUNK]
+			while len(chunk):
+				chunk = chunk[engine.search_sync(chunk):]
+	elapsed, result = timed(run, repeat)
+	return { "bits_per_sec": count / elapsed }
+
+# A message from the pktdecoder to the message sink: packed record
+# (pack_record/unpack_record) and, with gnuradio, the records through a pmt
+# u8 vector versus the former dicts through pmt
+def bench_records(decoded, repeat):
+	def records():
+		for txt in decoded:
+			pocsag_engine.unpack_record(pocsag_engine.pack_record(txt, 0.0))
+	results = { "records_per_sec": len(decoded) / timed(records, repeat)[0] }
+	if pmt:
+		def pmt_records():
+			for txt in decoded:
+				pocsag_engine.unpack_record(pmt.to_python(pmt.from_python(
+					numpy.frombuffer(pocsag_engine.pack_record(txt, 0.0), dtype = numpy.uint8))))
+		def pmt_dicts():
+			for txt in decoded:
+				txt = pmt.to_python(pmt.from_python(txt))
+				txt["ts"] = 0.0
+		results["pmt_records_per_sec"] = len(decoded) / timed(pmt_records, repeat)[0]
+		results["pmt_dicts_per_sec"] = len(decoded) / timed(pmt_dicts, repeat)[0]
+	return results
+
+def revision():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+			cwd = os.path.dirname(os.path.abspath(__file__)), stderr = open(os.devnull, "w")).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# Compare with the last run having the same parameters, returns the
+# regressions found
+def compare(previous, results, tolerance = TOLERANCE):
+	regressions = []
+	for bench, values in sorted(results.items()):
+		for key, value in sorted(values.items()):
+			old = previous["results"].get(bench, {}).get(key)
+			if old == None:
+				continue
+			if key.endswith("_per_sec"):
+				change = (value - old) / old
+				print "  %-12s %-18s %+6.1f%%" % (bench, key, 100 * change)
+				if change < -tolerance:
+					regressions.append("%s %s" % (bench, key))
+			elif key == "decoded_rate" and value < old:
+				regressions.append("%s %s" % (bench, key))
+	return regressions
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+		description='benchmark the POCSAG protocol decoder on synthetic bitstreams')
+	parser.add_argument('-n', '--messages', dest='messages', type=int, default=2000,
+		help='number of messages per scenario')
+	parser.add_argument('-s', '--seed', dest='seed', type=int, default=0,
+		help='random seed (messages and impairments)')
+	parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3,
+		help='best time of this many runs')
+	parser.add_argument('-H', '--history', dest='history', action='store',
+		help='append the results to this JSON lines file, and compare them with the previous run')
+	parser.add_argument('-t', '--tolerance', dest='tolerance', type=float, default=TOLERANCE,
+		help='relative throughput drop considered as a regression')
+	args = parser.parse_args()
+
+	messages = pocsag_encoder.random_messages(args.messages, args.seed)
+	results = collections.OrderedDict()
+	for name, ber, slips in SCENARIOS:
+		results[name] = bench_scenario(messages, ber, slips, args.seed, args.repeat)
+	results["bch"] = bench_bch(100000, args.seed, args.repeat)
+	results["sync"] = bench_sync(1000000, args.seed, args.repeat)
+	results["records"] = bench_records(decode(pocsag_encoder.encode_bits(messages))[1], args.repeat)
+
+	for name, values in results.items():
+		print "%-12s %s" % (name, ", ".join("%s %.4g" % (key, value) for key, value in sorted(values.items())))
+
+	if not args.history:
+		sys.exit(0)
+	params = { "messages": args.messages, "seed": args.seed }
+	previous = None
+	if os.path.exists(args.history):
+		for line in open(args.history):
+			run = json.loads(line)
+			if run["params"] == params:
+				previous = run
+	regressions = []
+	if previous:
+		print "Compared to %s (%s):" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(previous["ts"])), previous["revision"])
+		regressions = compare(previous, results, args.tolerance)
+	with open(args.history, "a") as history:
+		history.write(json.dumps({ "ts": time.time(), "revision": revision(), "params": params, "results": results }) + "\n")
+	if regressions:
+		print "Regressions: %s" % ", ".join(regressions)
+		sys.exit(1)
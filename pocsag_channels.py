@@ -0,0 +1,710 @@
+# POCSAG Multichannel Realtime Decoder -- channels bookkeeping
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Everything needed to run the channels, without any UI:
+# it is shared by the Qt UI and the headless mode
+from gruel import pmt
+from gnuradio import gr
+from gnuradio import blks2
+from gnuradio import extras
+from gnuradio import eng_notation
+import os
+import time
+import socket
+import threading
+import collections
+import pocsag
+
+BANNER = "POCSAG Multichannel Realtime Decoder -- iZsh (izsh at fail0verflow.com)"
+
+SPS = pocsag.SPS # signal per symbol
+
+XLATING_CUTOFF = 10e3
+CHANNELIZER_SPACING = 25e3
+CHANNELIZER_OVERSAMPLE = 2
+DROPS_WINDOW = 1000 # ms, window used to estimate the samples dropped by a reconfiguration
+MSGHUB_MAXLEN = 10000 # messages waiting for delivery, beyond that they are dropped
+MSGHUB_RATE = 10 # Hz, maximum delivery rate
+MSGHUB_BATCH = 500 # maximum number of messages per delivery
+DEDUP_TTL = 60 # s, a message seen again on another channel within this delay is a duplicate
+DEDUP_SIZE = 10000 # messages remembered, the least recently seen are evicted
+DEDUP_HOLD = 2 # s, partial messages are held back this long, waiting for the complete one
+PUBLISH_TIMEOUT = 1.0 # s, a subscriber blocking that long is disconnected
+
+# Hands the messages of a decoder to callback(txt). Every call drains the
+# whole queue. An unexpected message, or a failing callback, is counted and
+# logged, it never stops the sink (and thus the channel)
+class pocsag_msgsink(gr.block):
+	def __init__(self, callback, log = None):
+		gr.block.__init__(
+			self,
+			name = "POCSAG message sink",
+			in_sig = None,
+			out_sig = None,
+			has_msg_input = True
+		)
+		self.callback = callback
+		self.log = log
+		self.ignored = 0
+		self.failed = 0
+
+	def stats(self):
+		return { "ignored_messages": self.ignored, "failed_messages": self.failed }
+
+	def ignore(self, why):
+		self.ignored += 1
+		if self.log:
+			self.log("Message ignored: %s" % why)
+
+	def handle(self, msg):
+		key = pmt.pmt_symbol_to_string(msg.key)
+		if key != pocsag.POCSAG_ID:
+			self.ignore("unknown key %s" % key)
+			return
+		# (stamped by the decoder, the delivery may come much later)
+		try:
+			txt, end = pocsag.unpack_record(pmt.to_python(msg.value))
+		except (ValueError, TypeError) as e:
+			self.ignore("bad record (%s)" % e)
+			return
+		try:
+			self.callback(txt)
+		except Exception as e:
+			self.failed += 1
+			if self.log:
+				self.log("Message delivery failed: %s" % e)
+
+	# pop_msg_queue() waits for the first message, the wait being
+	# interrupted (RuntimeError) when the flowgraph stops: we're done then
+	def work(self, input_items, output_items):
+		handled = 0
+		while handled == 0 or self.check_msg_queue():
+			try:
+				msg = self.pop_msg_queue()
+			except RuntimeError:
+				return -1
+			self.handle(msg)
+			handled += 1
+		return handled
+
+# All the channels messages go through a single hub: the message sinks
+# (called from the gnuradio threads) only queue them, and the consumer
+# drains them in batches, at a bounded rate. When the consumer falls behind,
+# the queue is bounded and the extra messages are dropped (and counted)
+# instead of piling up.
+class msghub:
+	def __init__(self, maxlen = MSGHUB_MAXLEN, cache = None):
+		self.maxlen = maxlen
+		self.cache = cache
+		self.queue = collections.deque()
+		self.lock = threading.Lock()
+		self.received = 0
+		self.dropped = 0
+		self.reported = 0
+
+	def push(self, txt):
+		with self.lock:
+			self.received += 1
+			if len(self.queue) >= self.maxlen:
+				self.dropped += 1
+				return
+			self.queue.append(txt)
+
+	def counters(self):
+		counters = { "received": self.received, "dropped": self.dropped }
+		if self.cache:
+			counters["duplicates"] = self.cache.hits
+			counters["delivered"] = self.cache.misses
+		return counters
+
+	def stats(self):
+		stats = "%d messages received, %d dropped" % (self.received, self.dropped)
+		if self.cache:
+			stats += ", %d duplicates/fragments suppressed, %d delivered" % (self.cache.hits, self.cache.misses)
+		return stats
+
+	# to be called by the consumer, to report the drops
+	def new_drops(self):
+		with self.lock:
+			dropped, self.reported = self.dropped - self.reported, self.dropped
+			return dropped
+
+	def drain(self, maxcount = MSGHUB_BATCH):
+		with self.lock:
+			n = min(maxcount, len(self.queue))
+			batch = [self.queue.popleft() for i in xrange(n)]
+		# (only the consumer uses the cache, no need to lock it)
+		return self.cache.filter(batch) if self.cache else batch
+
+	# Deliver the batches to deliver(batch) from a thread, at most rate
+	# times per second (used when there's no UI event loop)
+	def start_delivery(self, deliver, rate = MSGHUB_RATE):
+		def run():
+			deadline = time.time()
+			while True:
+				batch = self.drain()
+				if batch:
+					deliver(batch)
+				# one delivery per period, however long the previous
+				# one took (no catching up after a slow one)
+				deadline = max(deadline + 1.0 / rate, time.time())
+				time.sleep(max(0, deadline - time.time()))
+		thread = threading.Thread(target = run)
+		thread.daemon = True
+		thread.start()
+
+# Duplicates and partial messages suppression, the same page being often
+# simulcast on several of the monitored channels:
+# - a message seen again (same address, function and content) on another
+#   channel within the ttl is dropped. A repeat on the same channel is kept,
+#   pagers are often sent the same message twice.
+# - a partial message (sync lost) is held back for a while, and dropped if
+#   it's the beginning of a complete message (or of another partial one)
+# The hits are the messages dropped, the misses the ones delivered.
+class message_cache:
+	def __init__(self, ttl = DEDUP_TTL, size = DEDUP_SIZE, hold = DEDUP_HOLD):
+		self.ttl = ttl
+		self.size = size
+		self.hold = hold
+		# (addr, fun, content hash) -> (last delivered, channel), least
+		# recently delivered first
+		self.seen = collections.OrderedDict()
+		# (addr, fun) -> the contents seen, to match the partial messages
+		self.texts = dict()
+		# (addr, fun) -> the partial messages held back, oldest first
+		self.partials = dict()
+		self.hits = 0
+		self.misses = 0
+
+	def key(self, txt):
+		return (txt["addr"], txt["fun"], hash((txt["text"], txt["num"])))
+
+	# is txt the beginning of the content?
+	def is_prefix(self, txt, content):
+		return content[0].startswith(txt["text"]) and content[1].startswith(txt["num"])
+
+	def forget(self, key):
+		del self.seen[key]
+		texts = self.texts[key[:2]]
+		del texts[key]
+		if not texts:
+			del self.texts[key[:2]]
+
+	def remember(self, key, txt, now):
+		if key in self.seen:
+			last, channel = self.seen.pop(key)
+			if now - last <= self.ttl and channel != txt["channel"]:
+				self.seen[key] = (last, channel)
+				return False
+			self.texts[key[:2]].pop(key)
+		elif len(self.seen) >= self.size:
+			self.forget(next(iter(self.seen)))
+		self.seen[key] = (now, txt["channel"])
+		self.texts.setdefault(key[:2], dict())[key] = (txt["text"], txt["num"])
+		return True
+
+	# is it the beginning of a message already seen?
+	def seen_prefix(self, txt):
+		for content in self.texts.get((txt["addr"], txt["fun"]), dict()).values():
+			if self.is_prefix(txt, content):
+				return True
+		return False
+
+	# is a longer fragment of the same message held back?
+	def held_longer(self, txt, held):
+		size = len(txt["text"]) + len(txt["num"])
+		for since, other in held:
+			if len(other["text"]) + len(other["num"]) > size and self.is_prefix(txt, (other["text"], other["num"])):
+				return True
+		return False
+
+	def filter(self, batch, now = None):
+		now = now or time.time()
+		# the least recently seen first, so the expired ones are likely there
+		while self.seen and now - self.seen[next(iter(self.seen))][0] > self.ttl:
+			self.forget(next(iter(self.seen)))
+		out = []
+		for txt in batch:
+			if not txt["endofmsg"]:
+				self.partials.setdefault((txt["addr"], txt["fun"]), []).append((now, txt))
+			elif self.remember(self.key(txt), txt, now):
+				self.misses += 1
+				out.append(txt)
+			else:
+				self.hits += 1
+		# release the partial messages held long enough (a partial is
+		# only compared with the ones of the same address and function)
+		released = []
+		partials, self.partials = self.partials, dict()
+		for addr_fun, group in partials.items():
+			held = []
+			for since, txt in group:
+				if self.seen_prefix(txt) or self.held_longer(txt, group):
+					self.hits += 1
+				elif now - since < self.hold:
+					held.append((since, txt))
+				else:
+					released.append((since, txt))
+			if held:
+				self.partials[addr_fun] = held
+		released.sort(key = lambda partial: partial[0])
+		for since, txt in released:
+			if self.remember(self.key(txt), txt, now):
+				self.misses += 1
+				out.append(txt)
+			else:
+				self.hits += 1
+		return out
+
+def format_pagermsg(txt):
+	ch = "N/A" if txt["channel"] == None else txt["channel"]
+	return "Pager message -- Channel %s, From pager %d (%d), TXT: %s" % (ch, txt["addr"], txt["fun"], txt["text"])
+
+# Sends the delivered messages to the clients of a local unix socket, as
+# concatenated records (see pocsag_engine.pack_record). A client which
+# can't keep up is disconnected, the delivery never waits for long.
+class record_publisher:
+	def __init__(self, path, log):
+		if os.path.exists(path):
+			os.unlink(path)
+		self.path = path
+		self.log = log
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(path)
+		self.sock.listen(5)
+		self.clients = []
+		self.lock = threading.Lock()
+		thread = threading.Thread(target = self.accept)
+		thread.daemon = True
+		thread.start()
+
+	def accept(self):
+		while True:
+			try:
+				client, address = self.sock.accept()
+			except socket.error:
+				return # closed
+			client.settimeout(PUBLISH_TIMEOUT)
+			with self.lock:
+				self.clients.append(client)
+
+	def publish(self, batch):
+		with self.lock:
+			clients = list(self.clients)
+		if not clients:
+			return
+		data = "".join(pocsag.pack_record(txt) for txt in batch)
+		for client in clients:
+			try:
+				client.sendall(data)
+			except socket.error:
+				self.log("A message socket client was disconnected (gone, or too slow)")
+				with self.lock:
+					self.clients.remove(client)
+				client.close()
+
+	def close(self):
+		self.sock.close()
+		with self.lock:
+			for client in self.clients:
+				client.close()
+			self.clients = []
+		os.unlink(self.path)
+
+# one line per message, for the message files
+def format_pagerline(txt, now = None):
+	now = now or time.strftime("%Y-%m-%d %H:%M:%S")
+	return "%s %s%s" % (now, format_pagermsg(txt), "" if txt["endofmsg"] else " (partial)")
+
+def freq_str(freq):
+	return "%.6fMHz" % (freq / 1e6)
+
+# one frequency per line (engineering notation accepted)
+def read_channels(channels_file):
+	if not channels_file: return []
+	return [eng_notation.str_to_num(freq.strip()) for freq in channels_file.readlines() if freq.strip()]
+
+# comma separated symbol rates, e.g. "512,1200,2400"
+def parse_symrates(text):
+	return [float(rate) for rate in text.split(",")]
+
+# We can't derive from extras.stream_selector... hence the ugly workaround
+class stream_selector:
+	def __init__(self, num_inputs, size_of_items):
+		self.ss = extras.stream_selector(gr.io_signature(num_inputs, num_inputs, size_of_items),
+			gr.io_signature(1, 1, size_of_items))
+		self.num_inputs = num_inputs
+	def set_output(self, n):
+		p = [-2] * self.num_inputs
+		p[n] = 0
+		self.ss.set_paths(p)
+	def disable(self):
+		self.ss.set_paths([-2] * self.num_inputs)
+
+# Counts the samples flowing out of the source, used to estimate how many
+# were dropped while the flowgraph was being reconfigured, and as the origin
+# of the messages positions. It's the items counter of a null sink: nothing
+# runs in python. The counter starts over from 0 when the flowgraph is
+# restarted, which is caught up the next time it's read (channel_manager
+# reads it right before stopping the flowgraph).
+class sample_counter:
+	def __init__(self, topblock, source):
+		self.sink = gr.null_sink(gr.sizeof_gr_complex)
+		topblock.connect(source, self.sink)
+		self.lock = threading.Lock()
+		self.base = 0
+		self.last = 0
+		self.start = None
+
+	def count(self):
+		with self.lock:
+			read = self.sink.nitems_read(0)
+			if read < self.last:
+				self.base += self.last
+			self.last = read
+			return self.base + read
+
+	# The samples lost (source overruns, flowgraph restarts...) are
+	# estimated from the samples we should have received by now (the
+	# ones before the first look being assumed all there)
+	def stats(self, samplerate):
+		count = self.count()
+		if self.start == None and count:
+			self.start = time.time() - count / samplerate
+		expected = int(samplerate * (time.time() - self.start)) if self.start else 0
+		return { "samples": count, "lost_samples": max(0, expected - count) }
+
+# Shared polyphase filterbank front end: the whole band is split once into
+# nchans channels, each output being already decimated to
+# oversample * samplerate / nchans. A monitored frequency is then taken from
+# the nearest channel and only the (small) residual shift is done by a
+# xlating filter running at the channel rate.
+# Unused channels are terminated with null sinks.
+class channelizer:
+	def __init__(self, topblock, samplerate, spacing = CHANNELIZER_SPACING, oversample = CHANNELIZER_OVERSAMPLE):
+		self.nchans = oversample * max(1, int(samplerate / spacing / oversample))
+		self.binwidth = 1.0 * samplerate / self.nchans
+		self.rate = self.binwidth * oversample
+		# the residual shift is at most binwidth / 2, plus the signal itself
+		taps = gr.firdes.low_pass(1, samplerate, 0.8 * self.binwidth, 0.2 * self.binwidth, gr.firdes.WIN_BLACKMAN_hARRIS)
+		self.pfb = blks2.pfb_channelizer_ccf(self.nchans, taps, oversample)
+		topblock.connect(topblock.source, self.pfb)
+		self.outputs = [(self.pfb, i) for i in xrange(self.nchans)]
+		self.null_sinks = []
+		for i in xrange(self.nchans):
+			self.null_sinks.append(gr.null_sink(gr.sizeof_gr_complex))
+			topblock.connect(self.outputs[i], self.null_sinks[i])
+
+	# Returns the channel output to use and the residual shift for a given
+	# frequency shift. Channel i is centered on i * binwidth (FFT order)
+	def channel(self, freqshift):
+		n = int(round(freqshift / self.binwidth))
+		return self.outputs[n % self.nchans], freqshift - n * self.binwidth
+
+# A pre-allocated channel: the whole chain is always connected, and a
+# stream_selector routes one of the sources (the source itself, or one of
+# the channelizer outputs) to it, or drops everything when the slot is free.
+# A slot is thus retuned, enabled and disabled without stopping the
+# flowgraph.
+class channel_slot:
+	def __init__(self, topblock, srcs, samplerate, symrates, callback, debug = False,
+		squelch = False, squelch_db = None, record = None, capfilter = None, log = None,
+		ratio = 1.0, direct = False):
+		self.topblock = topblock
+		self.srcs = srcs
+		self.samplerate = samplerate
+		self.callback = callback
+		self.direct = direct
+		self.squelch = squelch
+		self.squelch_db = squelch_db
+		self.record = record
+		self.capfilter = capfilter
+		self.freq_txt = None
+		self.gate = stream_selector(len(srcs), gr.sizeof_gr_complex)
+		self.gate.disable()
+		plan = pocsag.decimation_plan(samplerate, max(symrates) * SPS, XLATING_CUTOFF)
+		self.decim, rate, taps = plan[0] if plan else (1, samplerate, pocsag.lowpass_taps(samplerate, XLATING_CUTOFF, XLATING_CUTOFF / 2))
+		self.freq_xlating_fir_filter = gr.freq_xlating_fir_filter_ccc(self.decim, taps, 0, samplerate)
+		self.ratio = ratio * self.decim
+		self.msgsink = None if direct else pocsag_msgsink(callback, log)
+		self.sink = gr.null_sink(1) if direct else self.msgsink
+		self.uchar2float = gr.uchar_to_float() # we need a converter to connect it to the qtsink
+		for i in xrange(len(srcs)):
+			topblock.connect(srcs[i], (self.gate.ss, i))
+		topblock.connect(self.gate.ss, self.freq_xlating_fir_filter)
+		self.build_decoder(symrates, debug)
+
+	def build_decoder(self, symrates, debug):
+		self.pocsag_decoder = pocsag.pocsag_decoder(1.0 * self.samplerate / self.decim,
+			symbolrates = symrates, debug = debug, cutoff = XLATING_CUTOFF,
+			squelch = self.squelch, squelch_db = self.squelch_db, record = self.record,
+			capfilter = self.capfilter, ratio = self.ratio, deliver = self.callback if self.direct else None)
+		self.topblock.connect(self.freq_xlating_fir_filter, self.pocsag_decoder, self.sink)
+
+	# The decoder depends on the symbol rate, changing it needs the
+	# flowgraph to be stopped
+	def rebuild_decoder(self, symrates, debug):
+		self.topblock.disconnect(self.freq_xlating_fir_filter, self.pocsag_decoder, self.sink)
+		self.build_decoder(symrates, debug)
+
+	# (origin: the source position of the first sample the slot gets)
+	def enable(self, src, freqshift, freq_txt, origin = 0):
+		self.freq_txt = freq_txt
+		self.freq_xlating_fir_filter.set_center_freq(freqshift)
+		self.pocsag_decoder.reset(freq_txt, origin)
+		self.gate.set_output(self.srcs.index(src))
+
+	def disable(self):
+		self.gate.disable()
+		self.freq_txt = None
+
+# The monitored channels of a flowgraph.
+# - log(text) reports what's going on
+# - pagermsg(txt) receives the decoded messages, from the gnuradio threads
+# - schedule(ms, fn) calls fn later on (used to report the dropped samples)
+# - squelch/squelch_db gate the idle channels (see pocsag.power_squelch)
+# - symrates, several symbol rates decoded at once (instead of symrate, see
+#   pocsag.pocsag_decoder)
+# - record, the IQ recording settings (see pocsag_record.record_settings)
+# - capcodes, the file of the pagers to decode (see pocsag_engine.capcode_filter)
+# - direct, the decoders call pagermsg themselves instead of posting the
+#   messages to sinks: nothing waits for messages, the flowgraph finishes
+#   along with its source (see pocsag_offline)
+# The messages positions (txt["pos"]) are counted in samples of the
+# topblock source, from the topblock.counter count (when there's one) at
+# the time their decoder was connected.
+class channel_manager:
+	def __init__(self, topblock, samplerate, centerfreq, symrate, debug = False,
+		log = None, pagermsg = None, schedule = None, squelch = False, squelch_db = None,
+		symrates = None, record = None, capcodes = None, direct = False):
+		self.topblock = topblock
+		self.direct = direct
+		self.squelch = squelch
+		self.squelch_db = squelch_db
+		self.samplerate = samplerate
+		self.centerfreq = centerfreq
+		self.symrate = symrate
+		self.symrates = symrates
+		self.record = record
+		self.capfilter = pocsag.capcode_filter(capcodes) if capcodes else None
+		self.debug = debug
+		self.log = log if log else self.print_log
+		self.pagermsg = pagermsg if pagermsg else self.print_pagermsg
+		self.schedule = schedule if schedule else self.timer_schedule
+		self.freqs = dict()
+		self.slots = []
+
+	def print_log(self, text):
+		print text
+
+	# the rates the decoders are built for, the fastest one being the
+	# front end rate
+	def symbolrates(self):
+		return list(self.symrates) if self.symrates else [self.symrate]
+
+	def frontrate(self):
+		return max(self.symbolrates()) * SPS
+
+	def print_pagermsg(self, txt):
+		print format_pagermsg(txt)
+
+	def timer_schedule(self, ms, fn):
+		timer = threading.Timer(ms / 1000.0, fn)
+		timer.daemon = True
+		timer.start()
+
+	# The flowgraph must be stopped
+	def init_slots(self, nslots):
+		if self.topblock.channelizer:
+			srcs, samplerate = self.topblock.channelizer.outputs, self.topblock.channelizer.rate
+		else:
+			srcs, samplerate = [self.topblock.source], self.samplerate
+		for i in xrange(nslots):
+			self.slots.append(channel_slot(self.topblock, srcs, samplerate, self.symbolrates(), self.pagermsg, self.debug,
+				self.squelch, self.squelch_db, self.record, self.capfilter, self.log,
+				1.0 * self.samplerate / samplerate, self.direct))
+
+	# the samples the source delivered so far
+	def position(self):
+		return self.topblock.counter.count() if self.topblock.counter else 0
+
+	# The source position all the channels decoded up to (see
+	# pocsag_decoder.horizon), None without any channel
+	def horizon(self):
+		horizons = [values["pocsag_decoder"].horizon() for values in self.freqs.values()]
+		return min(horizons) if horizons else None
+
+	def in_reach(self, freq):
+		return abs(self.centerfreq - freq) <= self.samplerate / 2.0
+
+	def out_of_reach(self):
+		return [freq_txt for freq_txt, values in self.freqs.items() if not self.in_reach(values["freq"])]
+
+	# Estimate the number of samples dropped by a reconfiguration: compare
+	# the samples received during a window starting right before it with
+	# the ones the source should have delivered
+	def begin_reconfigure(self):
+		return (time.time(), self.position())
+
+	def end_reconfigure(self, what, mark):
+		self.schedule(DROPS_WINDOW, lambda: self.report_drops(what, mark))
+
+	def report_drops(self, what, mark):
+		if not self.topblock.counter: return
+		elapsed = time.time() - mark[0]
+		received = self.position() - mark[1]
+		self.log("%s: ~%d samples dropped" % (what, max(0, int(elapsed * self.samplerate - received))))
+
+	# Returns the name of the new channel, None if it couldn't be added.
+	# relink(slot, connect) is called (with the flowgraph stopped) around the
+	# rebuild of a slot decoder
+	def addfreq(self, freq, relink = None):
+		freq_txt = freq_str(freq)
+		if freq_txt in self.freqs:
+			self.log("%s is already monitored!" % freq_txt)
+			return None
+		if not self.in_reach(freq):
+			self.log("%s is outside of the bandwidth reach!" % freq_txt)
+			return None
+		freqshift = self.centerfreq - freq
+		if self.topblock.channelizer:
+			src, freqshift = self.topblock.channelizer.channel(freqshift)
+			samplerate = self.topblock.channelizer.rate
+		else:
+			src, samplerate = self.topblock.source, self.samplerate
+		if self.slots:
+			return self.addfreq_slot(freq, freq_txt, src, freqshift, relink)
+		self.log("Monitoring %s" % freq_txt)
+		mark = self.begin_reconfigure()
+		# reconfigure the flowgraph
+		# We use stop()/wait() because lock()/unlock() seems to freeze the app
+		# Can't find the reason...
+		self.topblock.stop()
+		self.topblock.wait()
+		# self.topblock.lock()
+		# The xlating filter is the first stage of the decimation plan,
+		# the pocsag decoder takes care of the following ones
+		plan = pocsag.decimation_plan(samplerate, self.frontrate(), XLATING_CUTOFF)
+		self.log("Decimation plan: %s" % pocsag.describe_plan(samplerate, plan, self.frontrate()))
+		decim, rate, taps = plan[0] if plan else (1, samplerate, pocsag.lowpass_taps(samplerate, XLATING_CUTOFF, XLATING_CUTOFF / 2))
+		freq_xlating_fir_filter = gr.freq_xlating_fir_filter_ccc(decim, taps, freqshift, samplerate)
+		pocsag_decoder = pocsag.pocsag_decoder(1.0 * samplerate / decim, channel_str = freq_txt, symbolrates = self.symbolrates(), debug = self.debug, cutoff = XLATING_CUTOFF,
+			squelch = self.squelch, squelch_db = self.squelch_db, record = self.record,
+			capfilter = self.capfilter, origin = self.position(), ratio = 1.0 * self.samplerate / samplerate * decim,
+			deliver = self.pagermsg if self.direct else None)
+		# a message input only takes one connection, hence one (tiny) sink per
+		# channel, they all feed the same msghub anyway
+		msgsink = None if self.direct else pocsag_msgsink(self.pagermsg, self.log)
+		sink = gr.null_sink(1) if self.direct else msgsink
+		self.topblock.connect(src, freq_xlating_fir_filter, pocsag_decoder, sink)
+		# self.topblock.unlock()
+		self.topblock.start()
+		self.end_reconfigure("Monitoring %s" % freq_txt, mark)
+		# Save the blocks
+		self.freqs[freq_txt] = {
+			"freq": freq,
+			"src": src,
+			"samplerate": samplerate,
+			"slot": None,
+			"freq_xlating_fir_filter": freq_xlating_fir_filter,
+			"pocsag_decoder": pocsag_decoder,
+			"msgsink": msgsink,
+			"sink": sink,
+			"uchar2float": gr.uchar_to_float() # we need a converter to connect it to the qtsink
+		}
+		return freq_txt
+
+	# Use a free pre-allocated slot: no need to stop the flowgraph,
+	# unless the symbol rate changed since the slot was built
+	def addfreq_slot(self, freq, freq_txt, src, freqshift, relink = None):
+		free = [i for i in xrange(len(self.slots)) if self.slots[i].freq_txt == None]
+		if len(free) == 0:
+			self.log("No free channel slot left for %s! (see -S/--slots)" % freq_txt)
+			return None
+		self.log("Monitoring %s" % freq_txt)
+		mark = self.begin_reconfigure()
+		slot = self.slots[free[0]]
+		if slot.pocsag_decoder.symbolrates != self.symbolrates():
+			self.topblock.stop()
+			self.topblock.wait()
+			if relink: relink(free[0], False)
+			slot.rebuild_decoder(self.symbolrates(), self.debug)
+			if relink: relink(free[0], True)
+			self.topblock.start()
+		self.log("Decimation plan: %s" % pocsag.describe_plan(slot.samplerate, pocsag.decimation_plan(slot.samplerate, self.frontrate(), XLATING_CUTOFF), self.frontrate()))
+		slot.pocsag_decoder.set_debug(self.debug)
+		slot.enable(src, freqshift, freq_txt, self.position())
+		self.end_reconfigure("Monitoring %s" % freq_txt, mark)
+		self.freqs[freq_txt] = {
+			"freq": freq,
+			"src": src,
+			"samplerate": slot.samplerate,
+			"slot": free[0],
+			"freq_xlating_fir_filter": slot.freq_xlating_fir_filter,
+			"pocsag_decoder": slot.pocsag_decoder,
+			"msgsink": slot.msgsink,
+			"sink": slot.sink,
+			"uchar2float": slot.uchar2float
+		}
+		return freq_txt
+
+	# unlink() is called with the flowgraph stopped, before the chain
+	# is disconnected
+	def remove_freq(self, freq, unlink = None):
+		if freq == None or freq not in self.freqs: return False
+		self.log("Removing %s" % freq)
+		mark = self.begin_reconfigure()
+		if self.freqs[freq]["slot"] != None:
+			self.slots[self.freqs[freq]["slot"]].disable()
+		else:
+			self.topblock.stop()
+			self.topblock.wait()
+			if unlink: unlink()
+			self.topblock.disconnect(self.freqs[freq]["src"],
+				self.freqs[freq]["freq_xlating_fir_filter"],
+				self.freqs[freq]["pocsag_decoder"],
+				self.freqs[freq]["sink"])
+			self.topblock.start()
+		self.end_reconfigure("Removing %s" % freq, mark)
+		del self.freqs[freq]
+		return True
+
+	# (items() copies the dict, it can be called from another thread)
+	def stats(self):
+		return { "channels": dict((freq, dict(values["pocsag_decoder"].stats(),
+			**(values["msgsink"].stats() if values["msgsink"] else {})))
+			for freq, values in self.freqs.items()) }
+
+	# All the channels (and the ones added later), or a single one
+	def set_debug(self, debug, freq = None):
+		if freq == None:
+			self.debug = debug
+			for value in self.freqs.values():
+				value["pocsag_decoder"].set_debug(debug)
+			return True
+		if freq not in self.freqs: return False
+		self.freqs[freq]["pocsag_decoder"].set_debug(debug)
+		return True
+
+	# Reloads the capcodes file, returns the number of entries (None without
+	# any filter), raises IOError/ValueError (the filter being left as is)
+	def reload_filter(self):
+		return self.capfilter.load() if self.capfilter else None
+
+	# The decoding trace of a channel (empty unless it's debugged)
+	def dump_trace(self, freq):
+		if freq not in self.freqs: return None
+		return self.freqs[freq]["pocsag_decoder"].dump_trace()
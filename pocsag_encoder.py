@@ -0,0 +1,146 @@
+# POCSAG bitstream encoder, to test and benchmark the decoder
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The bitstreams are made of the sliced bits, as fed to the decoder: one
+# bit per byte, and inverted (see pocsag_engine.add_bit).
+# The encoding follows the decoder conventions, the point being to get
+# back what was encoded:
+# - the 18 address bits are the address >> 3, the frame being address & 7
+# - the digits are sent as 4-bit values, in the decoder's table order
+# - every message is followed by an IDLE codeword (the decoder only
+#   reports a message when it sees one)
+import random
+import numpy
+from pocsag_engine import POCSAG_BCH_POLY, POCSAG_BCH_N, POCSAG_BCH_K, POCSAG_STD_SYNC, \
+	POCSAG_STD_IDLE, POCSAG_MAXWORD, hamming_weight
+
+POCSAG_PREAMBLE_LENGTH = 576 # bits
+POCSAG_NUMERIC = "0123456789*U -)("
+POCSAG_FUN_NUMERIC = 0
+POCSAG_FUN_ALPHA = 3
+
+# 21 data bits to a 31-bit BCH codeword followed by the even parity bit
+def BCH_encode(data, BCH_POLY = POCSAG_BCH_POLY, BCH_N = POCSAG_BCH_N, BCH_K = POCSAG_BCH_K):
+	r = data << (BCH_N - BCH_K)
+	for i in reversed(xrange(BCH_N - BCH_K, BCH_N)):
+		if r & (1 << i):
+			r ^= BCH_POLY << (i - (BCH_N - BCH_K))
+	word = (data << (BCH_N - BCH_K + 1)) | (r << 1)
+	return word | (hamming_weight(word) & 1)
+
+def addr_word(addr, fun):
+	return BCH_encode((((addr >> 3) & (2 ** 18 - 1)) << 2) | (fun & 3))
+
+def data_word(data):
+	return BCH_encode((1 << 20) | (data & (2 ** 20 - 1)))
+
+# 7-bit characters, LSB first, 20 bits per codeword
+def text_words(text):
+	bits = []
+	for c in text:
+		bits += [(ord(c) >> i) & 1 for i in xrange(7)]
+	bits += [0] * (-len(bits) % 20)
+	words = []
+	for i in xrange(0, len(bits), 20):
+		data = 0
+		for b in bits[i:i + 20]:
+			data = (data << 1) | b
+		words.append(data_word(data))
+	return words
+
+# 4-bit digits, 5 per codeword, padded with spaces
+def numeric_words(num):
+	num += " " * (-len(num) % 5)
+	words = []
+	for i in xrange(0, len(num), 5):
+		data = 0
+		for c in num[i:i + 5]:
+			data = (data << 4) | POCSAG_NUMERIC.index(c)
+		words.append(data_word(data))
+	return words
+
+# The codewords of a transmission (SYNC words included): each message
+# starts in the frame of its address, and is followed by an IDLE word.
+# messages: list of (addr, fun, content), the content being the text for
+# the alphanumeric function and the digits otherwise
+def encode_words(messages):
+	words = []
+	slot = 0 # position within the current batch
+	def push(word):
+		if slot % POCSAG_MAXWORD == 0:
+			words.append(POCSAG_STD_SYNC)
+		words.append(word)
+		return slot + 1
+	for addr, fun, content in messages:
+		while slot % POCSAG_MAXWORD != 2 * (addr & 7):
+			slot = push(POCSAG_STD_IDLE)
+		slot = push(addr_word(addr, fun))
+		for word in text_words(content) if fun == POCSAG_FUN_ALPHA else numeric_words(content):
+			slot = push(word)
+		slot = push(POCSAG_STD_IDLE)
+	while slot % POCSAG_MAXWORD != 0:
+		slot = push(POCSAG_STD_IDLE)
+	return words
+
+def words_to_bits(words):
+	words = numpy.array(words, dtype = '>u4')
+	return numpy.unpackbits(words.view(numpy.uint8)) ^ 1
+
+def encode_bits(messages, preamble = POCSAG_PREAMBLE_LENGTH):
+	bits = numpy.tile(numpy.array([0, 1], dtype = numpy.uint8), preamble / 2)
+	return numpy.concatenate((bits, words_to_bits(encode_words(messages))))
+
+#
+# Channel impairments
+#
+def add_bit_errors(bits, ber, rng = numpy.random):
+	return bits ^ (rng.random_sample(len(bits)) < ber).astype(numpy.uint8)
+
+# Drop or repeat a bit, at the given rate (per bit): the clock recovery
+# slipping by one symbol
+def add_slips(bits, rate, rng = numpy.random):
+	slips = numpy.flatnonzero(rng.random_sample(len(bits)) < rate)
+	if len(slips) == 0:
+		return bits
+	dup = rng.random_sample(len(slips)) < 0.5
+	keep = numpy.ones(len(bits), dtype = numpy.int)
+	keep[slips[dup]] = 2
+	keep[slips[~dup]] = 0
+	return numpy.repeat(bits, keep)
+
+# Random messages, alphanumeric and numeric, to random addresses
+def random_messages(count, seed = None, maxlen = 80):
+	rnd = random.Random(seed)
+	messages = []
+	for i in xrange(count):
+		addr = rnd.getrandbits(21)
+		if rnd.random() < 0.5:
+			text = "".join(chr(rnd.randint(32, 126)) for j in xrange(rnd.randint(1, maxlen)))
+			messages.append((addr, POCSAG_FUN_ALPHA, text))
+		else:
+			num = "".join(rnd.choice("0123456789") for j in xrange(rnd.randint(1, maxlen / 4)))
+			messages.append((addr, POCSAG_FUN_NUMERIC, num))
+	return messages
+
+# What the decoder is expected to give back for a message: the address it
+# computes, and the content (without the padding)
+def expected(addr, fun, content):
+	return ((addr >> 3) | (addr & 7), fun, content)
+
+def decoded(txt):
+	if txt["fun"] == POCSAG_FUN_ALPHA:
+		return (txt["addr"], txt["fun"], txt["text"].rstrip("\x00"))
+	return (txt["addr"], txt["fun"], txt["num"].rstrip(" "))
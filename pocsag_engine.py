@@ -0,0 +1,642 @@
+# POCSAG protocol decoding engine, without any GNURadio dependency
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The engine takes the sliced bits (one bit per byte, as output by the
+# binary slicer) and produces the message records, it can be used as is
+# to decode bit captures offline.
+import time
+import struct
+import numpy
+
+# yeah I know, it's slow, and there are nice bit tricks to do this,
+# but meh
+def hamming_weight(val):
+	return bin(val).count('1')
+
+def is_evenparity(val):
+	return True if hamming_weight(val) & 1 else False
+
+# the code used by POCSAG is a (n=31,k=21) BCH Code with dmin=5,
+# thus it could correct two bit errors in a 31-Bit codeword.
+# It is a systematic code.
+# The generator polynomial is: 
+#   g(x) = x^10+x^9+x^8+x^6+x^5+x^3+1
+# The parity check polynomial is: 
+#   h(x) = x^21+x^20+x^18+x^16+x^14+x^13+x^12+x^11+x^8+x^5+x^3+1
+#   g(x) * h(x) = x^n+1
+# 
+POCSAG_BCH_POLY = 0x769
+POCSAG_BCH_N = 31
+POCSAG_BCH_K = 21
+
+def BCH_syndrome(data, BCH_POLY, BCH_N, BCH_K):
+	mask = 1 << (BCH_N - 1)
+	coeff = BCH_POLY << (BCH_K - 1)
+	n = BCH_K
+
+	s = data >> 1 # throw away parity bit
+	while n > 0:
+		if s & mask:
+			s ^= coeff
+		n -= 1
+		mask >>= 1
+		coeff >>= 1
+	if is_evenparity(data):
+		s |= 1 << (BCH_N - BCH_K)
+
+	return s
+
+def BCH_fix(data, BCH_POLY, BCH_N, BCH_K):
+	for i in xrange(32):
+		t = data ^ (1 << i)
+		if BCH_syndrome(t, BCH_POLY, BCH_N, BCH_K) == 0:
+			return t
+	for i in xrange(32):
+		for j in xrange(i + 1, 32):
+			t = data ^ ((1 << i) | (1 << j))
+			if BCH_syndrome(t, BCH_POLY, BCH_N, BCH_K) == 0:
+				return t
+	return data
+
+# The syndrome (remainder + parity flag) is linear over GF(2), so the
+# syndrome of a 32-bit word is the xor of the syndromes of its 4 bytes.
+# We precompute one 256 entries table per byte with the slow version above.
+def BCH_syndrome_tables(BCH_POLY, BCH_N, BCH_K):
+	return [[BCH_syndrome(b << (8 * i), BCH_POLY, BCH_N, BCH_K) for b in xrange(256)]
+		for i in xrange(4)]
+
+# Map a syndrome to the error pattern BCH_fix() would apply: the first
+# 1-bit and then 2-bit pattern (in the same order) having that syndrome.
+# Since syndrome(data ^ e) == syndrome(data) ^ syndrome(e), the fix is
+# then just data ^ table[syndrome(data)], bit-for-bit identical to BCH_fix()
+def BCH_fix_table(syndrome_tables):
+	def syndrome(data):
+		return BCH_table_syndrome(data, syndrome_tables)
+	table = dict()
+	for i in xrange(32):
+		table.setdefault(syndrome(1 << i), 1 << i)
+	for i in xrange(32):
+		for j in xrange(i + 1, 32):
+			e = (1 << i) | (1 << j)
+			table.setdefault(syndrome(e), e)
+	return table
+
+def BCH_table_syndrome(data, syndrome_tables):
+	t0, t1, t2, t3 = syndrome_tables
+	return t0[data & 0xFF] ^ t1[(data >> 8) & 0xFF] ^ t2[(data >> 16) & 0xFF] ^ t3[(data >> 24) & 0xFF]
+
+def BCH_table_fix(data, syndrome_tables, fix_table):
+	return data ^ fix_table.get(BCH_table_syndrome(data, syndrome_tables), 0)
+
+# Built once at import time, it only takes a few milliseconds
+POCSAG_BCH_SYNDROME_TABLES = BCH_syndrome_tables(POCSAG_BCH_POLY, POCSAG_BCH_N, POCSAG_BCH_K)
+POCSAG_BCH_FIX_TABLE = BCH_fix_table(POCSAG_BCH_SYNDROME_TABLES)
+
+# automata states
+POCSAG_SEARCH_PREAMBLE_START = 0
+POCSAG_SEARCH_PREAMBLE_END = 1
+POCSAG_SYNC = 2
+POCSAG_SEARCH_SYNC = 3
+POCSAG_SYNCHED = 4
+# Some constants
+POCSAG_STD_SYNC = 0x7cd215d8
+POCSAG_STD_IDLE = 0x7a89c197
+POCSAG_WORDSIZE = 32
+POCSAG_SOFTTHRESHOLD = 2
+POCSAG_PREAMBLE_WORD = 0xAAAAAAAA
+POCSAG_MAXWORD = 16
+
+# Vectorized version of the bit by bit SYNC search:
+# the last 31 bits of the accumulator are prepended to the (inverted)
+# input bits, and for every offset we count the bits differing from the
+# SYNC word, one shifted comparison per SYNC bit.
+# Returns the number of bits consumed (up to and including the first
+# matching window, or the whole input), the number of bit errors of that
+# window and the updated accumulator, so that the results are exactly the
+# ones of the per-bit loop.
+def correlate_sync(inp, acc, sync = POCSAG_STD_SYNC, threshold = POCSAG_SOFTTHRESHOLD):
+	n = len(inp)
+	bits = numpy.empty(n + POCSAG_WORDSIZE - 1, dtype = numpy.uint8)
+	bits[:POCSAG_WORDSIZE - 1] = [(acc >> i) & 1 for i in reversed(xrange(POCSAG_WORDSIZE - 1))]
+	bits[POCSAG_WORDSIZE - 1:] = (numpy.asarray(inp) & 1) ^ 1
+	errors = numpy.zeros(n, dtype = numpy.uint8)
+	for i in xrange(POCSAG_WORDSIZE):
+		errors += bits[i:i + n] ^ ((sync >> (POCSAG_WORDSIZE - 1 - i)) & 1)
+	match = numpy.flatnonzero(errors <= threshold)
+	end = match[0] + 1 if len(match) else n
+	acc = int(numpy.packbits(bits[end - 1:end + POCSAG_WORDSIZE - 1]).view('>u4')[0])
+	return int(end), int(errors[end - 1]), acc
+
+# Pack the (inverted) input bits into 32-bit words, all at once
+def pack_words(inp):
+	n = len(inp) / POCSAG_WORDSIZE * POCSAG_WORDSIZE
+	return numpy.packbits((numpy.asarray(inp[:n]) & 1) ^ 1).view('>u4')
+
+# Trace events
+TRACE_SYNC = 0
+TRACE_SYNC_LOST = 1
+TRACE_IDLE = 2
+TRACE_IDLE_END = 3
+TRACE_DATA = 4
+TRACE_ADDR = 5
+TRACE_PREAMBLE = 6
+TRACE_PREAMBLE_END = 7
+TRACE_SIZE = 4096 # events kept per channel
+# one trace event: the (corrected) word, the raw accumulator, the number of
+# bits differing, the word position in the batch and the new automata state
+TRACE_DTYPE = numpy.dtype([("event", "u1"), ("state", "u1"), ("wcnt", "i1"),
+	("errors", "u1"), ("word", "u4"), ("acc", "u4")])
+
+# The message records, as posted by the decoders (and sent as is to the
+# --msgsocket subscribers): a fixed header
+#   version (u8), flags (u8, RECORD_ENDOFMSG), fun (u8), addr (u32),
+#   capcode (u32), ts (f64, UNIX time), pos (i64, sample position of the
+#   end of the message, -1 if unknown), channel, text and num lengths
+#   (u16 each)
+# little endian, followed by these three strings (the channel being empty
+# when unknown). Records are self-delimited, they can be concatenated.
+RECORD_HEADER = struct.Struct("<BBBIIdqHHH")
+RECORD_VERSION = 2
+RECORD_ENDOFMSG = 1
+
+# (ts: the time of the record, by default the one of txt, or now)
+def pack_record(txt, ts = None):
+	channel = txt["channel"] or ""
+	pos = txt.get("pos")
+	if ts == None:
+		ts = txt["ts"] if "ts" in txt else time.time()
+	return RECORD_HEADER.pack(RECORD_VERSION, RECORD_ENDOFMSG if txt["endofmsg"] else 0,
+		txt["fun"], txt["addr"], txt["capcode"], ts, -1 if pos == None else pos,
+		len(channel), len(txt["text"]), len(txt["num"])) + channel + txt["text"] + txt["num"]
+
+# Returns the message record at offset in buf (a string or any buffer, e.g.
+# a numpy u8 array) and the offset of the next one. The header is read in
+# place, only the strings are copied out. Raises ValueError on an unknown
+# version or a truncated record.
+def unpack_record(buf, offset = 0):
+	if len(buf) - offset < RECORD_HEADER.size:
+		raise ValueError("truncated record")
+	version, flags, fun, addr, capcode, ts, pos, nchannel, ntext, nnum = RECORD_HEADER.unpack_from(buf, offset)
+	if version != RECORD_VERSION:
+		raise ValueError("unknown record version %d" % version)
+	start = offset + RECORD_HEADER.size
+	end = start + nchannel + ntext + nnum
+	if len(buf) < end:
+		raise ValueError("truncated record")
+	return {
+		"addr": addr,
+		"capcode": capcode,
+		"fun": fun,
+		"text": str(buffer(buf, start + nchannel, ntext)),
+		"num": str(buffer(buf, start + nchannel + ntext, nnum)),
+		"endofmsg": bool(flags & RECORD_ENDOFMSG),
+		"channel": str(buffer(buf, start, nchannel)) or None,
+		"ts": ts,
+		"pos": pos if pos >= 0 else None
+	}, end
+
+# Subscription filter of the (capcode, fun) pairs, shared by all the
+# decoders: a bitmap of the 2^21 capcodes, each entry holding a bit per
+# function. A capcode is the 21-bit pager address: the 18 bits of the
+# address codeword, followed by the 3 bits of its frame (the capcode of the
+# message records, their addr isn't one).
+# The file has one entry per line ('#' starts a comment):
+#   1234567        the capcode, any function
+#   1234567:3      the capcode, function 3 only
+#   1200000-1200999 a range of capcodes (optionally with :fun too)
+#   !1234567       a denied capcode (and so on), the denials win
+# Without any allowed entry, everything but the denied entries goes
+# through. load() swaps the bitmap at once, it can be called while the
+# decoders are running.
+CAPCODE_ADDRESSES = 2 ** 21
+
+class capcode_filter:
+	def __init__(self, path):
+		self.path = path
+		self.load()
+
+	def parse_entry(self, entry):
+		entry, _, fun = entry.partition(":")
+		lo, _, hi = entry.partition("-")
+		lo = int(lo)
+		hi = int(hi) if hi else lo
+		bits = 1 << int(fun) if fun else 0xF
+		if not 0 <= lo <= hi < CAPCODE_ADDRESSES or not 0 < bits <= 0xF:
+			raise ValueError()
+		return lo, hi, bits
+
+	# Returns the number of entries, raises ValueError (the bitmap being
+	# left as is) on a malformed file
+	def load(self):
+		allowed, denied = [], []
+		with open(self.path) as f:
+			for n, line in enumerate(f):
+				entry = line.split("#")[0].strip()
+				if not entry:
+					continue
+				try:
+					if entry.startswith("!"):
+						denied.append(self.parse_entry(entry[1:]))
+					else:
+						allowed.append(self.parse_entry(entry))
+				except ValueError:
+					raise ValueError("%s:%d: bad capcode entry %s" % (self.path, n + 1, entry))
+		masks = numpy.zeros(CAPCODE_ADDRESSES, dtype = numpy.uint8)
+		if not allowed:
+			masks.fill(0xF)
+		for lo, hi, bits in allowed:
+			masks[lo:hi + 1] |= bits
+		for lo, hi, bits in denied:
+			masks[lo:hi + 1] &= ~bits & 0xF
+		self.masks = masks
+		return len(allowed) + len(denied)
+
+	def accepts(self, addr, fun):
+		return (self.masks[addr] >> fun) & 1
+
+# The message records are dicts (addr, capcode, fun, text, num, endofmsg,
+# channel), given to send(), or queued in self.messages by default.
+# addr is the historical "From pager" number (the 18 address bits or'ed
+# with the frame), capcode the 21-bit pager address (see word_capcode()).
+# With capfilter (a capcode_filter), the messages of the other pagers are
+# skipped: their data words are neither assembled nor sent.
+# With debug, the decoding events are traced in a ring buffer (see
+# set_debug() and dump_trace()), nothing is formatted until it's dumped.
+# nbits counts the bits consumed since the last reset, and bitpos is the
+# position of the end of the word being decoded (the end of a message, when
+# it's sent).
+class pocsag_engine:
+	def __init__(self, channel_str = None, sendmsg = True, debug = False, send = None, capfilter = None):
+		self.channel_str = channel_str
+		self.sendmsg = sendmsg
+		self.capfilter = capfilter
+		self.set_debug(debug)
+		self.messages = []
+		self.send = send if send else self.messages.append
+		self.reset_counters()
+		self.acc = 0
+		self.bcnt = 0
+		self.wcnt = -1
+		self.nbits = 0
+		self.bitpos = 0
+		self.reset_txtvars()
+		# there's two ways/two automata:
+		# - one search for the preamble and then for the SYNC word
+		#   (this could be useful to extend to non-standard SYNC words)
+		# - the other one directly looks for the SYNC word
+		# To properly factorize the code, we just set the initial
+		# automata state, and the code will take care of taking the
+		# proper path
+		self.init_state = POCSAG_SEARCH_SYNC
+		self.state = self.init_state
+		self.handlers = {
+			POCSAG_SEARCH_PREAMBLE_START: self.search_preamble_start,
+			POCSAG_SEARCH_PREAMBLE_END: self.search_preamble_end,
+			POCSAG_SYNC: self.sync,
+			POCSAG_SEARCH_SYNC: self.search_sync,
+			POCSAG_SYNCHED: self.synched
+		}
+		self.compute_syncmask(32)
+		# self.compute_syncmask(576)
+
+	def reset(self, channel_str = None):
+		self.channel_str = channel_str
+		self.reset_counters()
+		self.acc = 0
+		self.bcnt = 0
+		self.wcnt = -1
+		self.nbits = 0
+		self.bitpos = 0
+		self.reset_txtvars()
+		self.state = self.init_state
+
+	# decoding statistics: codewords decoded (and corrected by the BCH
+	# code, by number of bits fixed), SYNC words found, synchronisations
+	# lost, messages sent (complete or partial) and skipped by the filter
+	def reset_counters(self):
+		self.nwords = 0
+		self.ncorrected = 0
+		self.ncorrected_bits = [0, 0, 0]
+		self.nsyncs = 0
+		self.nsynclosses = 0
+		self.nmessages = 0
+		self.npartials = 0
+		self.nfiltered = 0
+
+	def counters(self):
+		return {
+			"words": self.nwords,
+			"corrected": self.ncorrected,
+			"corrected_1bit": self.ncorrected_bits[1],
+			"corrected_2bits": self.ncorrected_bits[2],
+			"syncs": self.nsyncs,
+			"synclosses": self.nsynclosses,
+			"messages": self.nmessages,
+			"partials": self.npartials,
+			"filtered": self.nfiltered
+		}
+
+	# Within a transmission: synchronised, or the last bits seen look like
+	# a preamble (in either phase)
+	def active(self):
+		if self.state == POCSAG_SYNCHED:
+			return True
+		acc = self.acc & 0xFFFFFFFF
+		return min(hamming_weight(acc ^ POCSAG_PREAMBLE_WORD),
+			hamming_weight(acc ^ POCSAG_PREAMBLE_WORD ^ 0xFFFFFFFF)) <= POCSAG_SOFTTHRESHOLD
+
+	def reset_txtvars(self):
+		self.activetxt = False
+		self.txt = ""
+		self.num = ""
+		self.txt_w = 0
+		self.txt_bcnt = 0
+		self.addr = 0
+		self.capcode = 0
+		self.fun = 0
+		self.filtered = False
+
+	def compute_syncmask(self, length):
+		self.preamble = 0
+		assert(length % 2 == 0)
+		for i in xrange(length / 2):
+			self.preamble = (self.preamble << 2) | 0b10
+		self.preamble_mask = 2 ** length - 1
+		self.preamble_shifted = ((self.preamble << 1) | 1) & self.preamble_mask
+
+	def send_txt(self, endofmsg = False):
+		if self.sendmsg and (self.addr != 0 or len(self.txt) > 0):
+			if endofmsg:
+				self.nmessages += 1
+			else:
+				self.npartials += 1
+			self.send({
+				"addr": self.addr,
+				"capcode": self.capcode,
+				"fun": self.fun,
+				"text": self.txt,
+				"num": self.num,
+				"endofmsg": endofmsg,
+				"channel": self.channel_str
+			})
+
+	def BCH_syndrome(self, data):
+		return BCH_table_syndrome(data, POCSAG_BCH_SYNDROME_TABLES)
+
+	def BCH_fix(self, data):
+		return BCH_table_fix(data, POCSAG_BCH_SYNDROME_TABLES, POCSAG_BCH_FIX_TABLE)
+
+	# The trace ring is only allocated while tracing, and the hot paths
+	# only check self.debug before calling trace()
+	def set_debug(self, debug = False):
+		self.debug = debug
+		if debug and getattr(self, "traces", None) is None:
+			self.traces = numpy.zeros(TRACE_SIZE, dtype = TRACE_DTYPE)
+			self.ntraces = 0
+		elif not debug:
+			self.traces = None
+
+	def trace(self, event, word, errors = None):
+		if errors == None:
+			errors = hamming_weight(self.acc ^ word)
+		self.traces[self.ntraces % TRACE_SIZE] = (event, self.state, self.wcnt, errors, word, self.acc)
+		self.ntraces += 1
+
+	# The traced events, oldest first, formatted like:
+	#   <channel> <word #> <word> (<raw word>) <bit errors> <OK/ERR> <what>
+	# The text of the messages is rebuilt by replaying the traced codewords
+	# (the oldest one may be incomplete once the ring wrapped)
+	def dump_trace(self):
+		if self.traces is None:
+			return []
+		start = max(0, self.ntraces - TRACE_SIZE)
+		replay = pocsag_engine(sendmsg = False)
+		lines = []
+		for i in xrange(start, self.ntraces):
+			event, state, wcnt, errors, word, acc = self.traces[i % TRACE_SIZE]
+			word, acc = int(word), int(acc)
+			if event == TRACE_SYNC:
+				what = "=> SYNC"
+			elif event == TRACE_SYNC_LOST:
+				replay.reset_txtvars()
+				what = "=> lost sync!"
+			elif event == TRACE_IDLE:
+				what = "=> IDLE"
+			elif event == TRACE_IDLE_END:
+				replay.reset_txtvars()
+				what = "=> IDLE (end of message)"
+			elif event == TRACE_DATA:
+				data = (word >> 11) & (2 ** 20 - 1)
+				replay.push_text(data)
+				what = "=> NUM: |%s| - TXT: |%s|" % (replay.push_num(data), replay.txt)
+			elif event == TRACE_ADDR:
+				replay.reset_txtvars()
+				what = "=> Pager %d (fun = %d)" % (((word >> 13) & (2 ** 18 - 1)) | (wcnt / 2), (word >> 11) & 3)
+			elif event == TRACE_PREAMBLE:
+				what = "Found preamble"
+			else:
+				what = "Found end of preamble"
+			lines.append("%s %2d %08x (%08x) %d %3s %s" % (self.channel_str, wcnt, word, acc, errors,
+				"ERR" if event == TRACE_SYNC_LOST else "OK", what))
+		return lines
+
+	def add_preamble_bit(self, b):
+		self.add_bit(b, self.preamble_mask)
+
+	def add_bit(self, b, mask = 0xFFFFFFFF):
+		self.bcnt += 1
+		self.acc = ((self.acc << 1) | int(~b & 1)) & mask
+
+	def read_word(self, inp):
+		assert(len(inp) >= POCSAG_WORDSIZE)
+		self.acc = int(pack_words(inp[:POCSAG_WORDSIZE])[0])
+		self.bcnt = POCSAG_WORDSIZE
+
+	def push_text(self, data):
+		for i in reversed(xrange(20)):
+			b = (data >> i) & 1
+			self.txt_w = (self.txt_w >> 1) | (b << 6)
+			self.txt_bcnt += 1
+			if self.txt_bcnt == 7:
+				self.txt += chr(self.txt_w)
+				self.txt_w = 0
+				self.txt_bcnt = 0
+
+	def push_num(self, data):
+		num = ""
+		for i in xrange(5):
+			num += "0123456789*U -)("[(data >> (16 - 4 * i)) & 0xF]
+		self.num += num
+		return num
+
+	# Walk the whole input buffer within a single call: a state change
+	# doesn't need a round trip through the scheduler anymore. We only
+	# stop when a state needs more input than what's available.
+	# Returns the number of bits consumed, the caller has to give the
+	# remaining ones back with the next bits (like the gnuradio scheduler)
+	def process(self, inp):
+		consumed = 0
+		while consumed < len(inp):
+			state = self.state
+			self.bitpos = self.nbits + consumed
+			n = self.handlers[state](inp[consumed:])
+			consumed += n
+			if n == 0 and self.state == state:
+				break
+		self.nbits += consumed
+		return consumed
+
+	# it is not really needed, we could directly look for the SYNC word
+	# but let's keep this code, it could be useful in case something
+	# is not using a standard SYNC word
+	def search_preamble_start(self, inp):
+		self.wcnt = -1
+		self.reset_txtvars()
+		for i in xrange(len(inp)):
+			self.add_preamble_bit(inp[i])
+			if self.acc == self.preamble or self.acc == self.preamble_shifted:
+				self.state = POCSAG_SEARCH_PREAMBLE_END
+				if self.debug: self.trace(TRACE_PREAMBLE, self.acc & 0xFFFFFFFF, 0)
+				return i + 1
+		return len(inp)
+
+	def search_preamble_end(self, inp):
+		for i in xrange(len(inp)):
+			self.add_preamble_bit(inp[i])
+			if self.acc != self.preamble and self.acc != self.preamble_shifted:
+				self.state = POCSAG_SYNC
+				if self.debug: self.trace(TRACE_PREAMBLE_END, self.acc & 0xFFFFFFFF, 0)
+				return i
+		return len(inp)
+
+	def search_sync(self, inp):
+		self.wcnt = -1
+		self.reset_txtvars()
+		if len(inp) == 0:
+			return 0
+		n, hw, self.acc = correlate_sync(inp, self.acc)
+		self.bcnt += n
+		if hw <= POCSAG_SOFTTHRESHOLD:
+			self.nsyncs += 1
+			self.state = POCSAG_SYNCHED
+			if self.debug: self.trace(TRACE_SYNC, self.acc, hw)
+		return n
+
+	def sync(self, inp):
+		# wait till we have at least enough bit
+		# this simplify the following code
+		if len(inp) < POCSAG_WORDSIZE: 
+			return 0
+		self.wcnt = -1
+		self.read_word(inp)
+		self.bitpos += POCSAG_WORDSIZE
+		hw = hamming_weight(self.acc ^ POCSAG_STD_SYNC)
+		if hw <= POCSAG_SOFTTHRESHOLD:
+			self.nsyncs += 1
+			self.state = POCSAG_SYNCHED
+			if self.debug: self.trace(TRACE_SYNC, self.acc, hw)
+		else:
+			self.nsynclosses += 1
+			self.send_txt(False)
+			self.state = self.init_state
+			if self.debug: self.trace(TRACE_SYNC_LOST, self.acc, hw)
+		return POCSAG_WORDSIZE
+
+	def synched(self, inp):
+		if len(inp) < POCSAG_WORDSIZE: 
+			return 0
+		if self.wcnt + 1 >= POCSAG_MAXWORD:
+			self.wcnt += 1
+			self.state = POCSAG_SYNC
+			return 0
+		# decode all the available words left in the batch at once
+		nwords = min(len(inp) / POCSAG_WORDSIZE, POCSAG_MAXWORD - 1 - self.wcnt)
+		consumed = 0
+		for word in pack_words(inp[:nwords * POCSAG_WORDSIZE]):
+			self.wcnt += 1
+			self.acc = int(word)
+			self.bcnt = POCSAG_WORDSIZE
+			self.bitpos += POCSAG_WORDSIZE
+			consumed += POCSAG_WORDSIZE
+			if not self.decode_word():
+				break
+		return consumed
+
+	# returns False when we lost the sync
+	def decode_word(self):
+		w = self.acc
+		self.nwords += 1
+		if self.BCH_syndrome(w) != 0:
+			w = self.BCH_fix(self.acc)
+			if self.BCH_syndrome(w):
+				self.nsynclosses += 1
+				self.send_txt(False)
+				self.state = self.init_state
+				if self.debug: self.trace(TRACE_SYNC_LOST, w)
+				return False
+			self.ncorrected += 1
+			self.ncorrected_bits[hamming_weight(self.acc ^ w)] += 1
+		assert(w != POCSAG_STD_SYNC)
+		if w == POCSAG_STD_IDLE and self.activetxt:
+			if self.debug: self.trace(TRACE_IDLE_END, w)
+			self.send_txt(True)
+			self.reset_txtvars()
+		elif w == POCSAG_STD_IDLE:
+			if self.debug: self.trace(TRACE_IDLE, w)
+		elif w & (1 << 31):
+			self.decode_data(w)
+		else:
+			self.decode_addr(w)
+		return True
+
+	def decode_data(self, w):
+		if self.filtered:
+			return
+		data = (w >> 11) & (2 ** 20 - 1)
+		self.push_text(data)
+		self.push_num(data)
+		if self.debug: self.trace(TRACE_DATA, w)
+
+	def decode_addr(self, w):
+		self.reset_txtvars()
+		self.activetxt = True
+		self.addr = ((w >> 13) & (2 ** 18 - 1)) | (self.wcnt / 2)
+		self.capcode = self.word_capcode(w)
+		self.fun = (w >> 11) & 3
+		if self.debug: self.trace(TRACE_ADDR, w)
+		if self.capfilter and not self.capfilter.accepts(self.capcode, self.fun):
+			self.nfiltered += 1
+			self.reset_txtvars()
+			self.filtered = True
+
+	# the 21-bit address of an address codeword, its frame being the
+	# position of the codeword in the batch
+	def word_capcode(self, w):
+		return (((w >> 13) & (2 ** 18 - 1)) << 3) | (self.wcnt / 2)
+
+	# Decode a stream of bit arrays (taking care of the leftovers),
+	# yields the message records
+	def decode(self, chunks):
+		left = numpy.zeros(0, dtype = numpy.uint8)
+		for chunk in chunks:
+			inp = numpy.concatenate((left, numpy.asarray(chunk, dtype = numpy.uint8)))
+			left = inp[self.process(inp):]
+			while self.messages:
+				yield self.messages.pop(0)
+
+# Decode a whole bit array at once, returns the message records
+def decode_bits(bits, channel_str = None, debug = False):
+	return list(pocsag_engine(channel_str = channel_str, debug = debug).decode([bits]))
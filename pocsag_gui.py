@@ -0,0 +1,577 @@
+# POCSAG Multichannel Realtime Decoder -- Qt UI
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from gnuradio import gr
+from gnuradio import eng_notation
+import sys
+import time
+import collections
+import pocsag_store
+import pocsag_metrics
+import pocsag_record
+from pocsag_channels import BANNER, SPS, MSGHUB_RATE, stream_selector, channel_manager, msghub, message_cache, format_pagermsg, format_pagerline, record_publisher
+
+try:
+	from gnuradio import qtgui
+	from PyQt4 import QtGui, QtCore, uic
+	import sip
+except ImportError:
+	print "Error: Program requires PyQt4 and gr-qtgui."
+	sys.exit(1)
+
+FFTSIZE = 2048
+SINK_UPDATE = 0.1 # s, the sinks refresh period
+CONSOLE_LINES = 10000 # lines kept in the console, the older ones are dropped
+
+# The console lines, (text, color), in a fixed size ring: the memory and the
+# cost of a new line don't depend on the uptime, and the list view only
+# renders the visible rows
+class console_model(QtCore.QAbstractListModel):
+	def __init__(self, maxlen = CONSOLE_LINES, parent = None):
+		QtCore.QAbstractListModel.__init__(self, parent)
+		self.lines = collections.deque(maxlen = maxlen)
+
+	def rowCount(self, parent = QtCore.QModelIndex()):
+		return 0 if parent.isValid() else len(self.lines)
+
+	def data(self, index, role = QtCore.Qt.DisplayRole):
+		if not index.isValid() or index.row() >= len(self.lines):
+			return QtCore.QVariant()
+		text, color = self.lines[index.row()]
+		if role == QtCore.Qt.DisplayRole:
+			return text
+		if role == QtCore.Qt.ForegroundRole:
+			return QtGui.QBrush(color)
+		return QtCore.QVariant()
+
+	def extend(self, lines):
+		lines = lines[-self.lines.maxlen:]
+		if not lines: return
+		overflow = len(self.lines) + len(lines) - self.lines.maxlen
+		if overflow > 0:
+			self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+			for i in xrange(overflow):
+				self.lines.popleft()
+			self.endRemoveRows()
+		start = len(self.lines)
+		self.beginInsertRows(QtCore.QModelIndex(), start, start + len(lines) - 1)
+		self.lines.extend(lines)
+		self.endInsertRows()
+
+class main_window(QtGui.QMainWindow):
+
+	backspacepressed = QtCore.pyqtSignal()
+
+	def __init__(self, topblock, args):
+		QtGui.QMainWindow.__init__(self)
+
+		uic.loadUi('pocsag-mrt_main.ui', self)
+		self.srcsink = uic.loadUi('pocsag-mrt_srcsink.ui')
+		self.demodsink = uic.loadUi('pocsag-mrt_demodsink.ui')
+
+		self.topblock = topblock
+		self.args = args
+		self.console_model = console_model(parent = self)
+		self.console.setModel(self.console_model)
+		# the whole history is only kept in the message file, if any
+		self.msgfile = open(args.msgfile, "a") if args.msgfile else None
+		# (the store errors are reported through its drops count, its
+		# writer thread can't touch the UI)
+		self.store = pocsag_store.message_store(args.store) if args.store else None
+		self.store_dropped = 0
+		self.publisher = record_publisher(args.msgsocket, self.push_text) if args.msgsocket else None
+		self.push_text(BANNER, QtCore.Qt.magenta)
+		# the messages come from the gnuradio threads through the hub,
+		# the UI picks them up in batches at a bounded rate
+		self.msghub = msghub(cache = message_cache(args.dedup) if args.dedup else None)
+		self.msgstats = None
+		self.msgtimer = QtCore.QTimer(self)
+		self.msgtimer.timeout.connect(self.deliver_pagermsgs)
+		self.msgtimer.start(1000 / MSGHUB_RATE)
+		self.channels = channel_manager(topblock, topblock.source.get_sample_rate(),
+			topblock.source.get_center_freq(), float(args.symrate),
+			log = self.push_text, pagermsg = self.msghub.push,
+			schedule = QtCore.QTimer.singleShot,
+			squelch = args.squelch, squelch_db = args.squelch_db, symrates = args.symrates,
+			record = pocsag_record.record_settings(args), capcodes = args.capcodes)
+
+		# the visualisation sinks are only connected while their window
+		# is shown: "c" (source/premodulation) and "f" (demodulation)
+		self.sinks_attached = set()
+		self.init_sink()
+		if args.metrics:
+			pocsag_metrics.start_dump(args.metrics, self.metrics, args.metrics_period)
+
+		# Connect the signals/slots etc.
+		self.freq_list.installEventFilter(self)
+		self.srcsink.installEventFilter(self)
+		self.demodsink.installEventFilter(self)
+		self.installEventFilter(self)
+		self.centerfreq_edit.returnPressed.connect(self.centerfreq_edittext)
+		self.addfreq_edit.returnPressed.connect(self.addfreq_edittext)
+		self.symrate_edit.returnPressed.connect(self.symrate_edittext)
+		self.samplerate_edit.returnPressed.connect(self.samplerate_edittext)
+		self.freqcorr_edit.returnPressed.connect(self.freqcorr_edittext)
+		self.freq_list.itemSelectionChanged.connect(self.select_freq)
+		self.backspacepressed.connect(self.remove_selected_freq)
+		self.debug_check.stateChanged.connect(self.debug_state)
+		self.srcsink_check.stateChanged.connect(self.srcsink_state)
+		self.demodsink_check.stateChanged.connect(self.demodsink_state)
+		# General inits
+		self.selected_freq = None
+		self.symrate_edit.setText("%d" % self.args.symrate)
+		self.symrate = float(self.args.symrate)
+		self.set_freqcorr(self.topblock.source.get_freq_corr())
+		self.set_samplerate(self.topblock.source.get_sample_rate())
+		self.set_centerfreq(self.topblock.source.get_center_freq())
+		for freq in args.channels:
+			self.addfreq(freq)
+
+	def init_sink(self):
+		self.topblock.stop()
+		self.topblock.wait()
+		self.enable_selector_buttons(False)
+		#
+		# Source/premodulation
+		#
+		# Create the selector, the source is its first input
+		# With channel slots, the visualisation taps of every slot are
+		# connected to the selectors (2 complex and 4 float inputs per
+		# slot) while the sinks are shown, selecting a channel is then
+		# just a matter of routing
+		nslots = self.args.slots
+		self.sel_c = stream_selector(1 + 2 * nslots if nslots else 3, gr.sizeof_gr_complex)
+		self.srcsink.source_source_radio.setEnabled(True)
+		self.sel_c.set_output(0)
+		# The sink itself is created when first shown, it only gets one
+		# FFT worth of samples per refresh
+		self.srcsink.grsink = None
+		self.keep_c = gr.keep_m_in_n(gr.sizeof_gr_complex, FFTSIZE, FFTSIZE, 0)
+		# add a button group for the radio buttons
+		self.waveselc = QtGui.QButtonGroup(self.srcsink.verticalLayout)
+		self.waveselc.addButton(self.srcsink.source_source_radio, 0)
+		self.waveselc.addButton(self.srcsink.source_xlating_radio, 1)
+		self.waveselc.addButton(self.srcsink.source_interpolator_radio, 2)
+		self.waveselc.buttonClicked[int].connect(self.waveselc_toggled)
+		self.srcsink.source_source_radio.setChecked(True)
+		#
+		# Demodulation
+		#
+		self.sel_f = stream_selector(4 * nslots if nslots else 4, gr.sizeof_float)
+		self.sel_f.set_output(0)
+		self.demodsink.grsink = None
+		self.keep_f = gr.keep_m_in_n(gr.sizeof_float, FFTSIZE, FFTSIZE, 0)
+		# Add the button group
+		self.waveself = QtGui.QButtonGroup(self.demodsink.verticalLayout)
+		self.waveself.addButton(self.demodsink.demodulation_quaddemod_radio, 0)
+		self.waveself.addButton(self.demodsink.demodulation_lowpass_radio, 1)
+		self.waveself.addButton(self.demodsink.demodulation_clockrecovery_radio, 2)
+		self.waveself.addButton(self.demodsink.demodulation_bits_radio, 3)
+		self.waveself.buttonClicked[int].connect(self.waveself_toggled)
+		self.demodsink.demodulation_quaddemod_radio.setChecked(True)
+		#
+		# Channel slots
+		#
+		self.channels.init_slots(nslots)
+		#
+		self.topblock.start()
+
+	def create_sink(self, kind):
+		if kind == "c" and self.srcsink.grsink == None:
+			self.srcsink.grsink = qtgui.sink_c(FFTSIZE, gr.firdes.WIN_BLACKMAN_hARRIS,
+				self.topblock.source.get_center_freq(), self.topblock.source.get_sample_rate(),
+				"Source Signal", True, True, True, False)
+			self.srcsink.grsink.set_update_time(SINK_UPDATE)
+			self.srcsink.sink = sip.wrapinstance(self.srcsink.grsink.pyqwidget(), QtGui.QWidget)
+			self.srcsink.horizontalLayout.addWidget(self.srcsink.sink)
+		if kind == "f" and self.demodsink.grsink == None:
+			self.demodsink.grsink = qtgui.sink_f(FFTSIZE, gr.firdes.WIN_BLACKMAN_hARRIS,
+				0, self.channels.frontrate(), "Demodulated Signal", True, True, True, False)
+			self.demodsink.grsink.set_update_time(SINK_UPDATE)
+			self.demodsink.sink = sip.wrapinstance(self.demodsink.grsink.pyqwidget(), QtGui.QWidget)
+			self.demodsink.horizontalLayout.addWidget(self.demodsink.sink)
+
+	# Everything feeding the shown sinks: the taps of the selected channel
+	# (or of every slot), the selectors and the sinks. The demodulation
+	# selector is left out when nothing feeds it
+	def sink_edges(self, kinds = None):
+		kinds = self.sinks_attached if kinds == None else kinds
+		edges = []
+		if self.channels.slots:
+			for i in xrange(len(self.channels.slots)):
+				edges += self.slot_sink_taps(i, kinds)
+		elif self.selected_freq:
+			edges += self.channel_sink_taps(self.selected_freq, kinds)
+		if "c" in kinds:
+			edges.append((self.topblock.source, (self.sel_c.ss, 0)))
+			edges.append((self.sel_c.ss, self.keep_c, self.srcsink.grsink))
+		if "f" in kinds and (self.channels.slots or self.selected_freq):
+			edges.append((self.sel_f.ss, self.keep_f, self.demodsink.grsink))
+		return edges
+
+	def connect_sinks(self, kinds = None):
+		for edge in self.sink_edges(kinds):
+			self.topblock.connect(*edge)
+
+	def disconnect_sinks(self, kinds = None):
+		for edge in self.sink_edges(kinds):
+			self.topblock.disconnect(*edge)
+
+	# Shown/hidden sink windows: the sink subgraph is (dis)connected, so
+	# that a hidden sink doesn't cost anything
+	def attach_sink(self, kind):
+		if kind in self.sinks_attached: return
+		self.create_sink(kind)
+		mark = self.channels.begin_reconfigure()
+		self.topblock.stop()
+		self.topblock.wait()
+		self.sinks_attached.add(kind)
+		self.connect_sinks([kind])
+		self.topblock.start()
+		self.channels.end_reconfigure("Showing the sink", mark)
+		self.set_display_rate()
+
+	def detach_sink(self, kind):
+		if kind not in self.sinks_attached: return
+		mark = self.channels.begin_reconfigure()
+		self.topblock.stop()
+		self.topblock.wait()
+		self.disconnect_sinks([kind])
+		self.sinks_attached.remove(kind)
+		self.topblock.start()
+		self.channels.end_reconfigure("Hiding the sink", mark)
+
+	# Samplerate of the streams shown, for a given radio button
+	def sink_rate_c(self, Id):
+		if Id == 0 or self.selected_freq == None:
+			return self.samplerate
+		if Id == 1:
+			chain = self.channels.freqs[self.selected_freq]
+			return chain["samplerate"] / chain["freq_xlating_fir_filter"].decimation()
+		return self.channels.frontrate()
+
+	# (the clock recovery and the bits are the main branch ones)
+	def sink_rate_f(self, Id):
+		return self.channels.frontrate() if Id < 2 else self.channels.symbolrates()[0]
+
+	# One FFT worth of samples per refresh is kept, the rest is dropped
+	def set_display_rate(self):
+		self.keep_c.set_n(max(FFTSIZE, int(self.sink_rate_c(self.waveselc.checkedId()) * SINK_UPDATE)))
+		self.keep_f.set_n(max(FFTSIZE, int(self.sink_rate_f(self.waveself.checkedId()) * SINK_UPDATE)))
+
+	def eventFilter(self, watched, event):
+		if event.type() == QtCore.QEvent.KeyPress and event.key() == QtCore.Qt.Key_Backspace:
+			self.backspacepressed.emit()
+			return True
+		if event.type() == QtCore.QEvent.Close and watched == self.srcsink:
+			self.srcsink_check.setCheckState(QtCore.Qt.Unchecked)
+			return True
+		if event.type() == QtCore.QEvent.Close and watched == self.demodsink:
+			self.demodsink_check.setCheckState(QtCore.Qt.Unchecked)
+			return True
+		if event.type() == QtCore.QEvent.Close and watched == self:
+			self.srcsink_check.setCheckState(QtCore.Qt.Unchecked)
+			self.demodsink_check.setCheckState(QtCore.Qt.Unchecked)
+			# Keep processing the event, we want to close the app
+		return False
+
+	def enable_selector_buttons(self, enabled = True):
+		# We never disable the source button
+		self.srcsink.source_xlating_radio.setEnabled(enabled)
+		self.srcsink.source_interpolator_radio.setEnabled(enabled)
+		self.demodsink.demodulation_quaddemod_radio.setEnabled(enabled)
+		self.demodsink.demodulation_lowpass_radio.setEnabled(enabled)
+		self.demodsink.demodulation_clockrecovery_radio.setEnabled(enabled)
+		self.demodsink.demodulation_bits_radio.setEnabled(enabled)
+
+	def waveselc_toggled(self, Id):
+		self.sel_c.set_output(self.sink_input_c(Id))
+		self.set_display_rate()
+		self.set_uisink_frequency_range()
+
+	def waveself_toggled(self, Id):
+		self.sel_f.set_output(self.sink_input_f(Id))
+		self.set_display_rate()
+		self.set_uisink_frequency_range()
+
+	# Selectors inputs of the selected channel, for a given radio button
+	def sink_input_c(self, Id):
+		if Id == 0 or not self.channels.slots or self.selected_freq == None:
+			return Id
+		return 1 + 2 * self.channels.freqs[self.selected_freq]["slot"] + Id - 1
+
+	def sink_input_f(self, Id):
+		if not self.channels.slots or self.selected_freq == None:
+			return Id
+		return 4 * self.channels.freqs[self.selected_freq]["slot"] + Id
+
+	# (text, color) lines, the view keeps following the last line unless
+	# it was scrolled up
+	def push_lines(self, lines):
+		scrollbar = self.console.verticalScrollBar()
+		follow = scrollbar.value() == scrollbar.maximum()
+		self.console_model.extend(lines)
+		if follow:
+			self.console.scrollToBottom()
+
+	def push_text(self, text, color = QtCore.Qt.black):
+		self.push_lines([(text, color)])
+
+	# called from the metrics thread
+	def metrics(self):
+		metrics = self.channels.stats()
+		metrics["source"] = self.topblock.counter.stats(self.samplerate)
+		metrics["hub"] = self.msghub.counters()
+		return metrics
+
+	def deliver_pagermsgs(self):
+		batch = self.msghub.drain()
+		if batch:
+			self.push_pagermsgs(batch)
+		stats = self.msghub.stats()
+		if stats != self.msgstats:
+			self.statusBar().showMessage(stats)
+			self.msgstats = stats
+		dropped = self.msghub.new_drops()
+		if dropped:
+			self.push_text("%d messages dropped, the UI can't keep up!" % dropped, QtCore.Qt.red)
+
+	def push_pagermsgs(self, batch):
+		self.push_lines([(format_pagermsg(txt), QtCore.Qt.blue if txt["endofmsg"] else QtCore.Qt.red) for txt in batch])
+		if self.msgfile:
+			now = time.strftime("%Y-%m-%d %H:%M:%S")
+			self.msgfile.write("".join(format_pagerline(txt, now) + "\n" for txt in batch))
+			self.msgfile.flush()
+		if self.store:
+			self.store.push(batch)
+			if self.store.dropped != self.store_dropped:
+				self.push_text("%d messages couldn't be stored!" % (self.store.dropped - self.store_dropped), QtCore.Qt.red)
+				self.store_dropped = self.store.dropped
+		if self.publisher:
+			self.publisher.publish(batch)
+
+	def close_store(self):
+		if self.store:
+			self.store.close()
+		if self.publisher:
+			self.publisher.close()
+
+	def set_uisink_frequency_range(self):
+		if not  hasattr(self, 'freq') or not hasattr(self, 'freqshift') or not  hasattr(self, 'samplerate'):
+			return
+		if self.waveselc.checkedId() == 0: # the source
+			self.srcsink.grsink.set_frequency_range(self.centerfreq, self.samplerate)
+		elif self.waveselc.checkedId() == 1: # the shifted frequency
+			self.srcsink.grsink.set_frequency_range(self.centerfreq + self.freqshift, self.samplerate)
+		elif self.waveselc.checkedId() == 2: # interpolated/decimated
+			self.srcsink.grsink.set_frequency_range(self.centerfreq + self.freqshift, self.symrate * SPS)
+		if self.waveself.checkedId() == 0: # quad demod
+			self.demodsink.grsink.set_frequency_range(0, self.symrate * SPS)
+		elif self.waveself.checkedId() == 1: # lowpass
+			self.demodsink.grsink.set_frequency_range(0, self.symrate * SPS)
+		elif self.waveself.checkedId() == 2: # clock recovery
+			self.demodsink.grsink.set_frequency_range(0, self.symrate)
+		elif self.waveself.checkedId() == 3: # bits
+			self.demodsink.grsink.set_frequency_range(0, self.symrate)
+
+	def set_centerfreq(self, freq):
+		self.centerfreq = freq
+		self.channels.centerfreq = freq
+		self.centerfreq_edit.setText("%.3fM" % (self.centerfreq / 1e6))
+		self.push_text("Setting center frequency to %.3fMhz" % (self.centerfreq / 1e6))
+		self.update_freqs()
+		self.topblock.source.set_center_freq(self.centerfreq)
+		self.set_uisink_frequency_range()
+
+	def update_freqs(self):
+		for freq_txt in self.channels.out_of_reach():
+			self.push_text("%s is outside of the bandwidth reach!" % freq_txt)
+			self.remove_freq(freq_txt)
+
+	def addfreq(self, freq):
+		self.addfreq_edit.clearFocus()
+		self.addfreq_edit.clear()
+		freq_txt = self.channels.addfreq(freq, self.relink_slot_sink)
+		if freq_txt:
+			self.freq_list.addItem(freq_txt)
+
+	# The visualisation taps of a channel, to the selectors inputs
+	# starting at c (complex) and f (float), for the given sinks (the
+	# shown ones by default)
+	def sink_taps(self, freq_xlating_fir_filter, pocsag_decoder, uchar2float, c = 1, f = 0, kinds = None):
+		kinds = self.sinks_attached if kinds == None else kinds
+		taps = []
+		if "c" in kinds:
+			taps += [
+				(freq_xlating_fir_filter, (self.sel_c.ss, c)),
+				(pocsag_decoder.fractional_interpolator, (self.sel_c.ss, c + 1))
+			]
+		if "f" in kinds:
+			taps += [
+				(pocsag_decoder.quadrature_demod, (self.sel_f.ss, f)),
+				(pocsag_decoder.low_pass_filter, (self.sel_f.ss, f + 1)),
+				(pocsag_decoder.digital_clock_recovery_mm, (self.sel_f.ss, f + 2)),
+				(pocsag_decoder.digital_binary_slicer_fb, uchar2float, (self.sel_f.ss, f + 3))
+			]
+		return taps
+
+	def channel_sink_taps(self, freq, kinds = None):
+		chain = self.channels.freqs[freq]
+		return self.sink_taps(chain["freq_xlating_fir_filter"], chain["pocsag_decoder"], chain["uchar2float"], kinds = kinds)
+
+	def slot_sink_taps(self, i, kinds = None):
+		slot = self.channels.slots[i]
+		return self.sink_taps(slot.freq_xlating_fir_filter, slot.pocsag_decoder, slot.uchar2float, 1 + 2 * i, 4 * i, kinds)
+
+	def disconnect_slot_sink(self, i):
+		for tap in self.slot_sink_taps(i):
+			self.topblock.disconnect(*tap)
+
+	def connect_slot_sink(self, i):
+		for tap in self.slot_sink_taps(i):
+			self.topblock.connect(*tap)
+
+	def relink_slot_sink(self, i, connect):
+		if connect:
+			self.connect_slot_sink(i)
+		else:
+			self.disconnect_slot_sink(i)
+
+	def select_freq(self):
+		if len(self.freq_list.selectedItems()) == 0:
+			return
+		freq = str(self.freq_list.selectedItems()[0].text())
+		if self.channels.slots:
+			# everything is already connected, just route it
+			self.selected_freq = freq
+			self.sel_c.set_output(self.sink_input_c(self.waveselc.checkedId()))
+			self.sel_f.set_output(self.sink_input_f(self.waveself.checkedId()))
+			self.set_display_rate()
+			self.set_uisink_frequency_range()
+			self.enable_selector_buttons(True)
+			return
+		if not self.sinks_attached:
+			# nothing to connect until a sink is shown
+			self.selected_freq = freq
+			self.enable_selector_buttons(True)
+			return
+		mark = self.channels.begin_reconfigure()
+		# Stop the flowchart
+		self.topblock.stop()
+		self.topblock.wait()
+		# self.topblock.lock()
+		# Disconnect the old selection, connect the new one
+		self.disconnect_sinks()
+		self.selected_freq = freq
+		self.connect_sinks()
+		# Restart the flowgraph
+		self.topblock.start()
+		# self.topblock.unlock()
+		self.channels.end_reconfigure("Selecting %s" % freq, mark)
+		# Adjust the UI info
+		self.set_display_rate()
+		self.set_uisink_frequency_range()
+		self.enable_selector_buttons(True)
+
+	def remove_selected_freq(self):
+		if self.selected_freq == None: return
+		self.remove_freq(self.selected_freq)
+
+	# the sinks are left on the source alone
+	def unselect_sink(self):
+		self.disconnect_sinks()
+		self.selected_freq = None
+		self.connect_sinks()
+
+	def remove_freq(self, freq):
+		unlink = self.unselect_sink if self.selected_freq == freq and self.sinks_attached else None
+		if not self.channels.remove_freq(freq, unlink): return
+		self.enable_selector_buttons(False)
+		self.set_uisink_frequency_range()
+		if self.selected_freq == freq: self.selected_freq = None
+		self.set_display_rate()
+		self.freq_list.takeItem(self.freq_list.row(self.freq_list.findItems(freq, QtCore.Qt.MatchExactly)[0]))
+
+	def set_freqcorr(self, freqcorr):
+		self.freqcorr = freqcorr
+		self.topblock.source.set_freq_corr(self.freqcorr, 0)
+		self.freqcorr_edit.setText("%.3f" % self.freqcorr)
+		self.push_text("Setting freq. correction to %.3f ppm" % self.freqcorr)
+
+	def set_samplerate(self, samplerate):
+		self.samplerate = samplerate
+		self.channels.samplerate = samplerate
+		self.samplerate_edit.setText("%.3fM" % (self.samplerate / 1e6))
+		self.push_text("Setting sample rate to %.3fMhz" % (self.samplerate / 1e6))
+		self.update_freqs()
+		self.set_display_rate()
+		self.set_uisink_frequency_range()	
+
+	def centerfreq_edittext(self):
+		# try:
+			self.set_centerfreq(eng_notation.str_to_num(str(self.centerfreq_edit.text())))
+		# except ValueError:
+		# 	self.push_text("Bad center frequency value entered")
+
+	def addfreq_edittext(self):
+		try:
+			self.addfreq(eng_notation.str_to_num(str(self.addfreq_edit.text())))
+		except ValueError:
+			self.push_text("Bad frequency value entered")
+
+	def symrate_edittext(self):
+		try:
+			self.symrate = eng_notation.str_to_num(str(self.symrate_edit.text()))
+			self.channels.symrate = self.symrate
+			self.set_display_rate()
+			self.push_text("Setting symbol rate to %.3fbaud\n" % self.symrate)
+		except ValueError:
+			self.push_text("Bad symbol rate value entered\n")
+
+	def samplerate_edittext(self):
+		try:
+			self.set_samplerate(eng_notation.str_to_num(str(self.samplerate_edit.text())))
+		except ValueError:
+			self.push_text("Bad sample rate value entered")
+
+	def freqcorr_edittext(self):
+		try:
+			self.set_freqcorr(eng_notation.str_to_num(str(self.freqcorr_edit.text())))
+		except ValueError:
+			self.push_text("Bad Freq. correction value entered")
+
+	# the traces are shown in the console when the debugging stops
+	def debug_state(self, state):
+		if state != QtCore.Qt.Checked:
+			for freq in sorted(self.channels.freqs.keys()):
+				self.push_lines([(line, QtCore.Qt.gray) for line in self.channels.dump_trace(freq)])
+		self.channels.set_debug(state == QtCore.Qt.Checked)
+
+	def srcsink_state(self, state):
+		if state == QtCore.Qt.Checked:
+			self.attach_sink("c")
+			self.srcsink.show()
+		else:
+			self.srcsink.hide()
+			self.detach_sink("c")
+
+	def demodsink_state(self, state):
+		if state == QtCore.Qt.Checked:
+			self.attach_sink("f")
+			self.demodsink.show()
+		else:
+			self.demodsink.hide()
+			self.detach_sink("f")
+
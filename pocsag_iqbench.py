@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+# POCSAG Multichannel Realtime Decoder -- end to end benchmark
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Synthetic 2-FSK POCSAG IQ (N channels, noise, frequency offset) written
+# to a file, and decoded as fast as possible (no throttle) by the very
+# chains channel_manager.addfreq() builds. Reports the realtime factor,
+# the CPU time per channel, the time spent in each block and how many
+# messages were decoded.
+from gnuradio import gr
+from gnuradio import eng_notation
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import collections
+import numpy
+import pocsag
+import pocsag_encoder
+from pocsag_channels import channelizer, sample_counter, channel_manager, freq_str, parse_symrates
+
+SYNTH_BLOCK = 1 << 20 # samples synthesized at once
+CHANNEL_BANDWIDTH = 25e3 # the SNR is given within a channel bandwidth
+
+# Writes the IQ file, returns the number of samples and, per channel, the
+# frequency and the messages sent. With args.idle, every message is a
+# separate transmission (with its preamble), followed by that much silence.
+# With args.symrates, the channels use each rate in turn.
+# The channels are placed like addfreq() expects them: a channel at freq is
+# at (centerfreq - freq) in the baseband
+def synthesize(path, args):
+	rng = numpy.random.RandomState(args.seed)
+	rates = args.symrates or [args.symrate]
+	channels = []
+	for i in xrange(args.channels):
+		freq = args.centerfreq + args.spacing * (i / 2 + 1) * (1 if i % 2 == 0 else -1)
+		symrate = rates[i % len(rates)]
+		messages = pocsag_encoder.random_messages(args.messages, args.seed + i)
+		transmissions = [messages] if not args.idle else [[m] for m in messages]
+		deviation, carrier = [], []
+		for transmission in transmissions:
+			bits = pocsag_encoder.encode_bits(transmission)
+			# the sliced bits: 1 is the upper frequency
+			deviation += [(bits.astype(numpy.float32) * 2 - 1) * pocsag.FM_DEVIATION, numpy.zeros(int(args.idle * symrate))]
+			carrier += [numpy.ones(len(bits)), numpy.zeros(int(args.idle * symrate))]
+		channels.append((freq, messages, 1.0 * args.samplerate / symrate, numpy.concatenate(deviation), numpy.concatenate(carrier)))
+	nsamples = int(max(len(deviation) * sps for freq, messages, sps, deviation, carrier in channels))
+	noise = numpy.sqrt(10 ** (-args.snr / 10.0) * args.samplerate / CHANNEL_BANDWIDTH / 2)
+	phases = [0.0] * args.channels
+	out = open(path, "wb")
+	for start in xrange(0, nsamples, SYNTH_BLOCK):
+		n = min(SYNTH_BLOCK, nsamples - start)
+		t = numpy.arange(start, start + n)
+		iq = (rng.normal(0, noise, n) + 1j * rng.normal(0, noise, n)).astype(numpy.complex64)
+		for i, (freq, messages, sps, deviation, carrier) in enumerate(channels):
+			symbols = numpy.minimum((t / sps).astype(numpy.int), len(deviation) - 1)
+			on = numpy.where(t / sps < len(deviation), carrier[symbols], 0)
+			inst = (args.centerfreq - freq + args.offset) + deviation[symbols]
+			phase = phases[i] + numpy.cumsum(2 * numpy.pi * inst / args.samplerate)
+			phases[i] = phase[-1] % (2 * numpy.pi)
+			iq += (on * numpy.exp(1j * phase)).astype(numpy.complex64)
+		iq.tofile(out)
+	out.close()
+	return nsamples, [(freq, messages) for freq, messages, sps, deviation, carrier in channels]
+
+# Looks like my_top_block from the channels point of view. The manager
+# restarts the flowgraph on every addfreq(), but the file source must only
+# start once all the channels are there: start/stop/wait are ignored until
+# the bench is armed
+class bench_top_block(gr.top_block):
+	def __init__(self, path, args):
+		gr.top_block.__init__(self)
+		self.armed = False
+		self.source = gr.file_source(gr.sizeof_gr_complex, path, False)
+		self.channelizer = channelizer(self, args.samplerate) if args.channelizer else None
+		self.counter = sample_counter(self, self.source)
+
+	def start(self):
+		if self.armed: gr.top_block.start(self)
+
+	def stop(self):
+		if self.armed: gr.top_block.stop(self)
+
+	def wait(self):
+		if self.armed: gr.top_block.wait(self)
+
+def block_time(block):
+	return block.pc_work_time() / 1e9 if hasattr(block, "pc_work_time") else None
+
+def run(args):
+	fd, path = tempfile.mkstemp(suffix = ".iq")
+	os.close(fd)
+	try:
+		print "Synthesizing %d channels, %d messages each..." % (args.channels, args.messages)
+		nsamples, channels = synthesize(path, args)
+		print "%d samples (%.1fs at %sS/s)" % (nsamples, nsamples / args.samplerate, eng_notation.num_to_str(args.samplerate))
+		tb = bench_top_block(path, args)
+		lock = threading.Lock()
+		received = []
+		def pagermsg(txt):
+			with lock:
+				received.append(txt)
+		manager = channel_manager(tb, args.samplerate, args.centerfreq, float(args.symrate),
+			log = lambda text: None, pagermsg = pagermsg,
+			squelch = args.squelch, squelch_db = args.squelch_db, symrates = args.symrates)
+		for freq, messages in channels:
+			manager.addfreq(freq)
+		tb.armed = True
+		cpu = os.times()
+		start = time.time()
+		tb.start()
+		while tb.counter.count() < nsamples:
+			time.sleep(0.05)
+		elapsed = time.time() - start
+		# let the chains flush their buffers
+		time.sleep(0.5)
+		tb.stop()
+		tb.wait()
+		cpu = sum(os.times()[:2]) - sum(cpu[:2])
+	finally:
+		os.unlink(path)
+
+	duration = nsamples / args.samplerate
+	print "Realtime factor: %.2f (%.2fs for %.2fs of samples)" % (duration / elapsed, elapsed, duration)
+	print "CPU: %.2fs, %.1f%% of a core per channel" % (cpu, 100.0 * cpu / duration / args.channels)
+	print "Estimated capacity at realtime: %.0f channels (wall clock), %.0f channels per core" % (
+		args.channels * duration / elapsed, args.channels * duration / cpu)
+	got = collections.Counter((txt["channel"],) + pocsag_encoder.decoded(txt) for txt in received if txt["endofmsg"])
+	sent = collections.Counter((freq_str(freq),) + pocsag_encoder.expected(*m) for freq, messages in channels for m in messages)
+	print "Decoded: %d/%d messages (%d partial)" % (sum((sent & got).values()), sum(sent.values()),
+		len([txt for txt in received if not txt["endofmsg"]]))
+	print "Time per block (s, summed over the channels):"
+	times = collections.OrderedDict()
+	times["freq_xlating_fir_filter"] = [block_time(values["freq_xlating_fir_filter"]) for values in manager.freqs.values()]
+	for values in manager.freqs.values():
+		for name, t in values["pocsag_decoder"].stage_times() or []:
+			times.setdefault(name, []).append(t / 1e9)
+	times["pocsag (python)"] = [sum(pktdecoder.work_time for pktdecoder in values["pocsag_decoder"].pktdecoders())
+		for values in manager.freqs.values()]
+	if args.squelch:
+		duty = [values["pocsag_decoder"].squelch.duty() for values in manager.freqs.values()]
+		print "Squelch open %.1f%% of the time (average over the channels)" % (100.0 * sum(duty) / len(duty))
+	if args.symrates:
+		for rate in args.symrates:
+			duty = [branch["gate"].duty() for values in manager.freqs.values()
+				for branch in values["pocsag_decoder"].branches if branch["symbolrate"] == rate]
+			print "%d baud branches open %.1f%% of the time (average over the channels)" % (rate, 100.0 * sum(duty) / len(duty))
+	for name, values in times.items():
+		if None in values:
+			print "  %-28s n/a (gnuradio built without the performance counters)" % name
+		else:
+			print "  %-28s %.3f" % (name, sum(values))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+		description='end to end benchmark on synthetic POCSAG IQ')
+	parser.add_argument('-r', '--samplerate', dest='samplerate', action='store',
+		type=eng_notation.str_to_num, default=1e6, help='set the samplerate')
+	parser.add_argument('-f', '--freq', dest='centerfreq', action='store',
+		type=eng_notation.str_to_num, default=466e6, help='set the center frequency')
+	parser.add_argument('-s', '--symrate', dest='symrate', action='store',
+		type=int, default=pocsag.SYMRATE, help='set the symbol rate')
+	parser.add_argument('-b', '--symrates', dest='symrates', action='store',
+		type=parse_symrates, default=None, help='multi-rate decoders, the channels being synthesized at each rate in turn')
+	parser.add_argument('-n', '--channels', dest='channels', action='store',
+		type=int, default=4, help='number of channels')
+	parser.add_argument('-m', '--messages', dest='messages', action='store',
+		type=int, default=5, help='number of messages per channel')
+	parser.add_argument('--spacing', dest='spacing', action='store',
+		type=eng_notation.str_to_num, default=25e3, help='channels spacing')
+	parser.add_argument('--snr', dest='snr', action='store',
+		type=float, default=15, help='signal to noise ratio (dB), within a 25kHz channel')
+	parser.add_argument('--offset', dest='offset', action='store',
+		type=eng_notation.str_to_num, default=0, help='frequency error of the transmitters (Hz)')
+	parser.add_argument('--seed', dest='seed', action='store',
+		type=int, default=0, help='random seed')
+	parser.add_argument('-P', '--channelizer', dest='channelizer', action='store_true',
+		help='use the shared polyphase channelizer front end')
+	parser.add_argument('-q', '--squelch', dest='squelch', action='store_true',
+		help='gate the idle channels with a power squelch')
+	parser.add_argument('--squelch-db', dest='squelch_db', action='store',
+		type=float, default=None, help='fixed squelch threshold (dBFS)')
+	parser.add_argument('--idle', dest='idle', action='store',
+		type=float, default=0, help='silence (s) between the transmissions of a channel')
+	args = parser.parse_args()
+	if args.spacing * (args.channels / 2 + 1) >= args.samplerate / 2:
+		print "Error: %d channels spaced by %sHz don't fit in %sS/s" % (args.channels,
+			eng_notation.num_to_str(args.spacing), eng_notation.num_to_str(args.samplerate))
+		sys.exit(1)
+	run(args)
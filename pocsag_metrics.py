@@ -0,0 +1,110 @@
+# POCSAG Multichannel Realtime Decoder -- runtime metrics
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The metrics are plain counters and fixed bucket histograms, updated in
+# place (cheap enough to be always on). A collect() function gathers them
+# in a dict:
+#   { "source": {...}, "hub": {...}, "channels": { channel: {...} } }
+# which is periodically dumped to a file, as JSON (*.json) or in the
+# Prometheus text format (anything else, e.g. for the node exporter
+# textfile collector).
+import os
+import json
+import time
+import bisect
+import threading
+
+METRICS_PERIOD = 10 # s, dump period
+WORK_TIME_BOUNDS = [1e-5, 1e-4, 1e-3, 1e-2, 1e-1] # s
+INPUT_ITEMS_BOUNDS = [64, 256, 1024, 4096, 16384]
+
+class histogram:
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.reset()
+
+	def reset(self):
+		self.counts = [0] * (len(self.bounds) + 1)
+		self.sum = 0
+		self.count = 0
+
+	def add(self, value):
+		self.counts[bisect.bisect_left(self.bounds, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def stats(self):
+		return { "bounds": self.bounds, "counts": list(self.counts), "sum": self.sum, "count": self.count }
+
+def is_histogram(value):
+	return isinstance(value, dict) and "bounds" in value
+
+# Sum of two sets of counters and histograms (e.g. of several decoders
+# of a channel)
+def merge(stats, other):
+	merged = dict(stats)
+	for key, value in other.items():
+		if key not in merged:
+			merged[key] = value
+		elif is_histogram(value):
+			merged[key] = { "bounds": value["bounds"],
+				"counts": [a + b for a, b in zip(merged[key]["counts"], value["counts"])],
+				"sum": merged[key]["sum"] + value["sum"], "count": merged[key]["count"] + value["count"] }
+		else:
+			merged[key] += value
+	return merged
+
+# a counter/gauge or a histogram, in the Prometheus text format
+def prometheus_metric(lines, name, labels, value):
+	if is_histogram(value):
+		cumulated = 0
+		for bound, count in zip(value["bounds"] + ["+Inf"], value["counts"]):
+			cumulated += count
+			lines.append("%s_bucket{%s} %s" % (name, ",".join(labels + ['le="%s"' % bound]), cumulated))
+		lines.append("%s_sum{%s} %s" % (name, ",".join(labels), value["sum"]))
+		lines.append("%s_count{%s} %s" % (name, ",".join(labels), value["count"]))
+	else:
+		lines.append("%s{%s} %s" % (name, ",".join(labels), value))
+
+def prometheus(metrics):
+	lines = []
+	for group in ["source", "hub"]:
+		for key, value in sorted(metrics.get(group, {}).items()):
+			prometheus_metric(lines, "pocsag_%s_%s" % (group, key), [], value)
+	for channel, values in sorted(metrics.get("channels", {}).items()):
+		for key, value in sorted(values.items()):
+			prometheus_metric(lines, "pocsag_channel_%s" % key, ['channel="%s"' % channel], value)
+	return "".join(line.replace("{}", "") + "\n" for line in lines)
+
+def dump(path, metrics):
+	text = json.dumps(metrics, indent = 1) if path.endswith(".json") else prometheus(metrics)
+	# readers never see a partial file
+	with open(path + ".tmp", "w") as f:
+		f.write(text)
+	os.rename(path + ".tmp", path)
+
+def start_dump(path, collect, period = METRICS_PERIOD, log = None):
+	def run():
+		while True:
+			time.sleep(period)
+			try:
+				dump(path, collect())
+			except (IOError, OSError), e:
+				if log:
+					log("Can't write the metrics: %s" % e)
+	thread = threading.Thread(target = run)
+	thread.daemon = True
+	thread.start()
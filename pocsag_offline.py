@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+# POCSAG Multichannel Realtime Decoder -- offline batch decoding
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Decodes a capture (e.g. saved with pocsag-mrt.py -o) as fast as the CPUs
+# allow, instead of replaying it at the sample rate:
+# - the file is memory-mapped, and split into chunks, each boundary being
+#   moved to the quietest spot around it
+# - each chunk is decoded by a process of a pool, with the very chains
+#   channel_manager.addfreq() builds, starting overlap seconds earlier for
+#   the decoders to settle (and to catch the messages across the boundary)
+# - the messages are merged back in sample order: a chunk only keeps the
+#   messages decoded past its start, and those decoded twice around a
+#   boundary are dropped.
+# The position of a message is the sample its last bit came from, as traced
+# back by its decoder (see pocsag.pocsag_decoder).
+from gnuradio import gr
+from gnuradio import eng_notation
+import os
+import sys
+import time
+import argparse
+import threading
+import multiprocessing
+import numpy
+import pocsag
+from pocsag_channels import channelizer, channel_manager, format_pagerline, read_channels, parse_symrates
+
+OFFLINE_CHUNK = 60 # s, of samples per chunk
+OFFLINE_OVERLAP = 5 # s, decoded before the chunk start (longer than a message)
+OFFLINE_SEARCH = 5 # s, a boundary moves that far at most, looking for silence
+OFFLINE_QUIET = 0.01 # s, window of the power measurements
+OFFLINE_BLOCK = 1 << 20 # samples read at once
+OFFLINE_POLL = 0.05 # s, chunk completion polling period
+OFFLINE_STALL = 30 # s, without any progress, a chunk decoding is given up
+
+# interleaved I/Q sample formats: (dtype, offset, full scale)
+# (cf32 being what gr.file_sink writes, cu8 what rtl_sdr writes)
+CAPTURE_FORMATS = {
+	"cf32": (numpy.complex64, 0, 1),
+	"cs16": (numpy.int16, 0, 32768.0),
+	"cs8": (numpy.int8, 0, 128.0),
+	"cu8": (numpy.uint8, 127.5, 127.5)
+}
+
+# Returns the memory-mapped file and its number of samples
+def open_capture(path, fmt):
+	dtype = CAPTURE_FORMATS[fmt][0]
+	if os.path.getsize(path) == 0:
+		return numpy.zeros(0, dtype = dtype), 0
+	mm = numpy.memmap(path, dtype = dtype, mode = "r")
+	return mm, len(mm) if fmt == "cf32" else len(mm) / 2
+
+# samples [start, end[ as complex64
+def read_samples(mm, fmt, start, end):
+	dtype, offset, scale = CAPTURE_FORMATS[fmt]
+	if fmt == "cf32":
+		return numpy.array(mm[start:end])
+	iq = (mm[2 * start:2 * end].astype(numpy.float32) - offset) / scale
+	return (iq[0::2] + 1j * iq[1::2]).astype(numpy.complex64)
+
+# The quietest window around pos (the lowest power over the whole band)
+def quietest(mm, fmt, samplerate, pos, nsamples, search = OFFLINE_SEARCH, quiet = OFFLINE_QUIET):
+	window = max(1, int(samplerate * quiet))
+	start = max(0, pos - int(samplerate * search))
+	end = min(nsamples, pos + int(samplerate * search))
+	n = (end - start) / window
+	if n == 0:
+		return pos
+	powers = []
+	step = max(1, OFFLINE_BLOCK / window)
+	for i in xrange(0, n, step):
+		m = min(step, n - i)
+		samples = read_samples(mm, fmt, start + i * window, start + (i + m) * window)
+		powers.append((samples.real ** 2 + samples.imag ** 2).reshape(m, window).mean(axis = 1))
+	return start + int(numpy.argmin(numpy.concatenate(powers))) * window + window / 2
+
+# Returns the chunks (start, end), every chunk length apart, give or take
+# the search for silence
+def split(mm, fmt, samplerate, nsamples, chunk = OFFLINE_CHUNK, search = OFFLINE_SEARCH):
+	step = int(samplerate * chunk)
+	search = min(search, chunk / 4.0)
+	bounds = [0]
+	while nsamples - bounds[-1] > step + samplerate * search:
+		bounds.append(quietest(mm, fmt, samplerate, bounds[-1] + step, nsamples, search))
+	bounds.append(nsamples)
+	return zip(bounds[:-1], bounds[1:])
+
+class memmap_source(gr.block):
+	def __init__(self, path, fmt, start, end):
+		gr.block.__init__(
+			self,
+			name = "memmap source",
+			in_sig = None,
+			out_sig = [numpy.complex64]
+		)
+		self.mm, nsamples = open_capture(path, fmt)
+		self.fmt = fmt
+		self.pos = start
+		self.end = min(end, nsamples)
+
+	def work(self, input_items, output_items):
+		n = min(len(output_items[0]), self.end - self.pos)
+		if n <= 0:
+			return -1 # done
+		output_items[0][:n] = read_samples(self.mm, self.fmt, self.pos, self.pos + n)
+		self.pos += n
+		return n
+
+# Looks like my_top_block from the channels point of view. As in
+# pocsag_iqbench, the manager restarts the flowgraph on every addfreq(): it
+# only starts once all the channels are there. There's no sample counter,
+# the decoders all start with the source.
+class offline_top_block(gr.top_block):
+	def __init__(self, settings, start, end):
+		gr.top_block.__init__(self)
+		self.armed = False
+		self.source = memmap_source(settings["path"], settings["format"], start, end)
+		self.channelizer = channelizer(self, settings["samplerate"]) if settings["channelizer"] else None
+		self.counter = None
+
+	def start(self):
+		if self.armed: gr.top_block.start(self)
+
+	def stop(self):
+		if self.armed: gr.top_block.stop(self)
+
+	def wait(self):
+		if self.armed: gr.top_block.wait(self)
+
+# Runs in a pool process: decodes [first, end[ and returns the index of
+# the chunk and its messages, as (position, message) tuples.
+# The decoders deliver the messages themselves (no message sinks waiting
+# for more): the flowgraph finishes once the source is done and the chains
+# drained. Raises RuntimeError if nothing moves anymore (a block failed),
+# rather than waiting forever.
+def decode_chunk(job):
+	settings, index, first, end = job
+	tb = offline_top_block(settings, first, end)
+	lock = threading.Lock()
+	received = []
+	def pagermsg(txt):
+		with lock:
+			received.append((first + txt["pos"], txt))
+	manager = channel_manager(tb, settings["samplerate"], settings["centerfreq"], float(settings["symrate"]),
+		log = lambda text: None, pagermsg = pagermsg,
+		squelch = settings["squelch"], squelch_db = settings["squelch_db"], symrates = settings["symrates"],
+		capcodes = settings["capcodes"], direct = True)
+	for freq in settings["channels"]:
+		manager.addfreq(freq)
+	decoders = [values["pocsag_decoder"] for values in manager.freqs.values()]
+	# the samples read, and the bits decoded (they keep coming while the
+	# chains drain)
+	def progress():
+		return tb.source.pos + sum(pktdecoder.engine.nbits for decoder in decoders
+			for pktdecoder in decoder.pktdecoders())
+	tb.armed = True
+	tb.start()
+	waiter = threading.Thread(target = tb.wait)
+	waiter.daemon = True
+	waiter.start()
+	last = (progress(), time.time())
+	while waiter.is_alive():
+		waiter.join(OFFLINE_POLL)
+		if progress() != last[0]:
+			last = (progress(), time.time())
+		elif waiter.is_alive() and time.time() - last[1] > OFFLINE_STALL:
+			tb.stop()
+			waiter.join()
+			raise RuntimeError("chunk %d (samples %d to %d) stalled after %d samples" % (index, first, end, tb.source.pos - first))
+	return index, received
+
+# A message decoded by both chunks around a boundary (within overlap
+# samples of each other) is only kept once. A message repeated within a
+# chunk is left alone, pagers are often sent the same message twice.
+def merge(chunks, results, overlap):
+	messages = []
+	for index, received in results:
+		start = chunks[index][0]
+		messages += [(pos, index, txt) for pos, txt in received if index == 0 or pos >= start]
+	messages.sort(key = lambda message: (message[0], message[1]))
+	seen = dict()
+	merged = []
+	for pos, index, txt in messages:
+		key = (txt["channel"], txt["addr"], txt["fun"], txt["text"], txt["num"], txt["endofmsg"])
+		if key in seen and seen[key][1] != index and pos - seen[key][0] <= overlap:
+			continue
+		seen[key] = (pos, index)
+		merged.append((pos, txt))
+	return merged
+
+def run(args, output):
+	mm, nsamples = open_capture(args.input_file, args.format)
+	chunks = split(mm, args.format, args.samplerate, nsamples, args.chunk)
+	overlap = int(args.samplerate * args.overlap)
+	settings = {
+		"path": args.input_file,
+		"format": args.format,
+		"samplerate": args.samplerate,
+		"centerfreq": args.centerfreq,
+		"symrate": args.symrate,
+		"symrates": args.symrates,
+		"channelizer": args.channelizer,
+		"squelch": args.squelch,
+		"squelch_db": args.squelch_db,
+		"channels": args.channels,
+		"capcodes": args.capcodes
+	}
+	jobs = [(settings, i, max(0, start - overlap), end) for i, (start, end) in enumerate(chunks)]
+	# the capture ends when the file was last written, unless told otherwise
+	origin = args.start if args.start != None else os.path.getmtime(args.input_file) - nsamples / args.samplerate
+	print "# %d samples (%.1fs), %d chunks, %d processes" % (nsamples, nsamples / args.samplerate, len(chunks), args.jobs)
+	started = time.time()
+	pool = multiprocessing.Pool(args.jobs)
+	results = []
+	try:
+		for index, received in pool.imap_unordered(decode_chunk, jobs):
+			results.append((index, received))
+			print "# chunk %d/%d done (%d messages)" % (len(results), len(chunks), len(received))
+	except RuntimeError as e:
+		pool.terminate()
+		print "Error: %s" % e
+		sys.exit(1)
+	pool.close()
+	pool.join()
+	merged = merge(chunks, results, overlap)
+	for pos, txt in merged:
+		now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(origin + pos / args.samplerate))
+		output.write(format_pagerline(txt, now) + "\n")
+	elapsed = time.time() - started
+	print "# %d messages in %.1fs (%.1fx realtime)" % (len(merged), elapsed,
+		nsamples / args.samplerate / elapsed if elapsed else 0)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+		description='decode a capture file with a pool of processes')
+	parser.add_argument('input_file', help='the capture file')
+	parser.add_argument('-C', '--channelsfile', dest='channels_file', type=file, required=True,
+		help='the channels to decode, one frequency per line')
+	parser.add_argument('-F', '--format', dest='format', action='store',
+		choices=sorted(CAPTURE_FORMATS.keys()), default="cf32", help='samples format (cf32 for the pocsag-mrt.py -o files, cu8 for rtl_sdr)')
+	parser.add_argument('-f', '--freq', dest='centerfreq', action='store',
+		type=eng_notation.str_to_num, required=True, help='center frequency of the capture')
+	parser.add_argument('-r', '--samplerate', dest='samplerate', action='store',
+		type=eng_notation.str_to_num, default=1e6, help='samplerate of the capture')
+	parser.add_argument('-s', '--symrate', dest='symrate', action='store',
+		type=int, default=pocsag.SYMRATE, help='set the symbol rate')
+	parser.add_argument('-b', '--symrates', dest='symrates', action='store',
+		type=parse_symrates, default=None, help='decode several symbol rates at once (overrides --symrate)')
+	parser.add_argument('-P', '--channelizer', dest='channelizer', action='store_true',
+		help='use the shared polyphase channelizer front end')
+	parser.add_argument('-q', '--squelch', dest='squelch', action='store_true',
+		help='gate the idle channels with a power squelch')
+	parser.add_argument('--squelch-db', dest='squelch_db', action='store',
+		type=float, default=None, help='fixed squelch threshold (dBFS)')
+	parser.add_argument('--capcodes', dest='capcodes', action='store',
+		default=None, help='only decode the pagers listed in this file (see pocsag_engine.capcode_filter)')
+	parser.add_argument('-j', '--jobs', dest='jobs', action='store',
+		type=int, default=multiprocessing.cpu_count(), help='number of processes')
+	parser.add_argument('--chunk', dest='chunk', action='store',
+		type=float, default=OFFLINE_CHUNK, help='chunk length (s)')
+	parser.add_argument('--overlap', dest='overlap', action='store',
+		type=float, default=OFFLINE_OVERLAP, help='decoded before each chunk (s), longer than the longest message')
+	parser.add_argument('--start', dest='start', action='store',
+		type=float, default=None, help='UNIX time of the first sample (by default, the file modification time minus the capture length)')
+	parser.add_argument('-m', '--msgfile', dest='msgfile', action='store',
+		default=None, help='write the messages to a file instead of stdout')
+	args = parser.parse_args()
+	args.channels = read_channels(args.channels_file)
+	out_of_reach = [freq for freq in args.channels if abs(args.centerfreq - freq) > args.samplerate / 2.0]
+	if out_of_reach or not args.channels:
+		print "Error: no channels, or outside of the capture band: %s" % " ".join(eng_notation.num_to_str(freq) for freq in out_of_reach)
+		sys.exit(1)
+	output = open(args.msgfile, "w") if args.msgfile else sys.stdout
+	run(args, output)
+	if args.msgfile:
+		output.close()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# POCSAG Multichannel Realtime Decoder -- channel plan
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Picks the tunings (center frequency and sample rate) covering a list of
+# channels at the lowest cost. Every channel brings the sample rate down
+# through the stages of pocsag.decimation_plan (the xlating filter being the
+# first one, see channel_manager.addfreq), so the cost of a tuning is the
+# multiply-accumulates per second of these stages, times the number of
+# channels it covers. (The rest of a channel chain runs at the symbol rate,
+# whatever the tuning.)
+# A channel is covered when it's within the usable part of the band (the
+# edges being eaten by the anti-aliasing filter roll-off), and away from
+# the center (the "DC spike").
+# With several devices, the sorted channels are split in contiguous groups,
+# one tuning per group, the split being optimal for that cost.
+import sys
+import bisect
+import argparse
+from gnuradio import eng_notation
+import pocsag
+from pocsag_channels import SPS, XLATING_CUTOFF
+
+# the RTL-SDR sample rates
+PLAN_RATES = [250e3, 1.024e6, 1.4e6, 1.8e6, 1.92e6, 2.048e6, 2.4e6, 2.56e6, 2.88e6, 3.2e6]
+PLAN_GUARD = 20e3 # Hz, no channel that close to the center frequency
+PLAN_USABLE = 0.8 # fraction of the band clear of the filters roll-off
+PLAN_HALFWIDTH = 12.5e3 # Hz, half the bandwidth of a channel
+PLAN_OUTRATE = pocsag.SYMRATE * SPS # the decimation stages output rate
+
+def parse_rates(text):
+	return sorted(eng_notation.str_to_num(rate) for rate in text.split(","))
+
+# The best tuning for a group of (sorted) channels: the center frequency
+# and the smallest rate covering them all, None if no rate does.
+# The center is either the middle of the group, or right at the guard
+# distance of one of the channels
+def tuning(freqs, rates = PLAN_RATES, guard = PLAN_GUARD, usable = PLAN_USABLE, halfwidth = PLAN_HALFWIDTH):
+	lo, hi = freqs[0], freqs[-1]
+	middle = (lo + hi) / 2.0
+	# the closest to the middle, the narrowest
+	candidates = sorted([middle] + [freq + side * guard for freq in freqs for side in [-1, 1]],
+		key = lambda center: abs(center - middle))
+	for center in candidates:
+		i = bisect.bisect_left(freqs, center)
+		if all(abs(freq - center) >= guard for freq in freqs[max(0, i - 1):i + 1]):
+			break
+	else:
+		return None
+	span = max(center - lo, hi - center) + halfwidth
+	for rate in sorted(rates):
+		if usable * rate / 2.0 >= span:
+			return (center, rate)
+	return None
+
+# (rate, outrate) -> MAC/s of a channel, the plans being the same for
+# every channel of a tuning
+channel_costs = dict()
+
+def channel_cost(rate, outrate = PLAN_OUTRATE):
+	if (rate, outrate) not in channel_costs:
+		stages = pocsag.decimation_plan(rate, outrate, XLATING_CUTOFF)
+		if stages:
+			cost = sum(len(taps) * stage_rate / decim for decim, stage_rate, taps in stages)
+		else:
+			# a single (full rate) xlating filter
+			cost = len(pocsag.lowpass_taps(rate, XLATING_CUTOFF, XLATING_CUTOFF / 2)) * rate
+		channel_costs[(rate, outrate)] = cost
+	return channel_costs[(rate, outrate)]
+
+def tuning_cost(rate, nfreqs, outrate = PLAN_OUTRATE):
+	return nfreqs * channel_cost(rate, outrate)
+
+# Returns a list of (centerfreq, samplerate, freqs) using at most devices
+# tunings, None if the channels can't be covered. Raises ValueError without
+# any channel.
+# outrate: the fastest symbol rate times pocsag.SPS
+def plan(freqs, devices = 1, rates = PLAN_RATES, guard = PLAN_GUARD, usable = PLAN_USABLE, halfwidth = PLAN_HALFWIDTH,
+	outrate = PLAN_OUTRATE):
+	freqs = sorted(set(freqs))
+	n = len(freqs)
+	if n == 0:
+		raise ValueError("no channels to plan (see -C/--channelsfile)")
+	# groups[(i, j)]: the tuning of freqs[i:j]
+	groups = dict()
+	for i in xrange(n):
+		for j in xrange(i + 1, n + 1):
+			t = tuning(freqs[i:j], rates, guard, usable, halfwidth)
+			if t == None:
+				break # a wider group won't fit either
+			groups[(i, j)] = t
+	# best[k][j]: (cost, previous split) covering freqs[:j] with k tunings
+	best = [[None] * (n + 1) for k in xrange(devices + 1)]
+	best[0][0] = (0, None)
+	for k in xrange(1, devices + 1):
+		for j in xrange(1, n + 1):
+			for i in xrange(j):
+				if best[k - 1][i] == None or (i, j) not in groups:
+					continue
+				cost = best[k - 1][i][0] + tuning_cost(groups[(i, j)][1], j - i, outrate)
+				if best[k][j] == None or cost < best[k][j][0]:
+					best[k][j] = (cost, i)
+	candidates = [k for k in xrange(1, devices + 1) if best[k][n] != None]
+	if not candidates:
+		return None
+	k = min(candidates, key = lambda k: best[k][n][0])
+	tunings = []
+	j = n
+	while k > 0:
+		i = best[k][j][1]
+		center, rate = groups[(i, j)]
+		tunings.insert(0, (center, rate, freqs[i:j]))
+		j, k = i, k - 1
+	return tunings
+
+def describe(tunings, outrate = PLAN_OUTRATE):
+	lines = []
+	for i, (center, rate, freqs) in enumerate(tunings):
+		lines.append("Tuning %d: -f %s -r %s (%d channels, %s..%s)" % (i, eng_notation.num_to_str(center),
+			eng_notation.num_to_str(rate), len(freqs), eng_notation.num_to_str(freqs[0]), eng_notation.num_to_str(freqs[-1])))
+	lines.append("Cost: %.1fM MAC/s in the channels decimation stages" % (sum(tuning_cost(rate, len(freqs), outrate) for center, rate, freqs in tunings) / 1e6))
+	return lines
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+		description='plan the tunings covering a channels list')
+	parser.add_argument('channels_file', type=file, help='one frequency per line')
+	parser.add_argument('-n', '--devices', dest='devices', type=int, default=1,
+		help='at most this many tunings (devices)')
+	parser.add_argument('-R', '--rates', dest='rates', type=parse_rates, default=PLAN_RATES,
+		help='the sample rates supported by the device, comma separated')
+	parser.add_argument('-g', '--guard', dest='guard', type=eng_notation.str_to_num, default=PLAN_GUARD,
+		help='no channel closer than this to the center frequency (Hz)')
+	parser.add_argument('-s', '--symrate', dest='symrate', type=int, default=pocsag.SYMRATE,
+		help='the (fastest) symbol rate decoded')
+	args = parser.parse_args()
+	freqs = [eng_notation.str_to_num(freq.strip()) for freq in args.channels_file.readlines() if freq.strip()]
+	try:
+		tunings = plan(freqs, args.devices, args.rates, args.guard, outrate = args.symrate * SPS)
+	except ValueError as e:
+		print "Error: %s" % e
+		sys.exit(1)
+	if tunings == None:
+		print "Error: the channels can't be covered by %d tuning(s)" % args.devices
+		sys.exit(1)
+	print "\n".join(describe(tunings, args.symrate * SPS))
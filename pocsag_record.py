@@ -0,0 +1,212 @@
+# POCSAG Multichannel Realtime Decoder -- triggered IQ recording
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Instead of the whole band, around the clock (see -o/--output), each
+# channel keeps its last seconds of (already decimated) samples in memory,
+# and only writes them down around the decoded messages:
+# - <channel>_<time>.cs8 (or .cs16): interleaved I/Q, signed 8 (or 16) bits,
+#   scaled to the segment peak
+# - <channel>_<time>.json: the metadata (channel, rate, time of the first
+#   sample, scale, the messages which triggered the recording)
+# read_segment() loads them back.
+# The files are written by a writer thread (one per process), never by the
+# gnuradio threads: a slow or failing disk doesn't stall the decoding, the
+# segments are dropped (and counted) instead.
+from gnuradio import gr
+import os
+import json
+import time
+import threading
+import Queue
+import numpy
+
+RECORD_FORMAT = "int8"
+RECORD_PRE = 5 # s, kept before a trigger (the message being decoded at its end)
+RECORD_POST = 1 # s, recorded after the last trigger
+RECORD_MAX = 60 # s, a longer segment (a busy channel) is cut in several ones
+RECORD_QUEUE = 16 # segments waiting for the writer, beyond that they are dropped
+RECORD_EXTENSIONS = { "int8": ".cs8", "int16": ".cs16" }
+
+# The recorder settings (given to pocsag_decoder) from the command line,
+# None if not recording. The directory is created if needed, raises
+# OSError if it can't be written to.
+def record_settings(args):
+	if not args.record:
+		return None
+	if not os.path.isdir(args.record):
+		os.makedirs(args.record)
+	if not os.access(args.record, os.W_OK | os.X_OK):
+		raise OSError("%s is not writable" % args.record)
+	return { "directory": args.record, "fmt": args.record_format,
+		"pre": args.record_pre, "post": args.record_post }
+
+# complex samples to interleaved integers, full scale being the peak
+def encode_iq(samples, fmt = RECORD_FORMAT):
+	peak = max(numpy.abs(samples.real).max(), numpy.abs(samples.imag).max(), 1e-12) if len(samples) else 1.0
+	scale = numpy.iinfo(fmt).max / peak
+	iq = numpy.empty(2 * len(samples), dtype = fmt)
+	iq[0::2] = numpy.round(samples.real * scale)
+	iq[1::2] = numpy.round(samples.imag * scale)
+	return iq, scale
+
+# Returns the samples (complex64) and the metadata of a segment, given its
+# .json file
+def read_segment(path):
+	with open(path) as f:
+		meta = json.load(f)
+	iq = numpy.fromfile(os.path.join(os.path.dirname(path), meta["file"]), dtype = meta["format"])
+	samples = (iq[0::2] + 1j * iq[1::2]) / meta["scale"]
+	return samples.astype(numpy.complex64), meta
+
+# Writes the segments queued by the recorders, and updates their counters
+class segment_writer:
+	def __init__(self, maxlen = RECORD_QUEUE):
+		self.queue = Queue.Queue(maxlen)
+		thread = threading.Thread(target = self.run)
+		thread.daemon = True
+		thread.start()
+
+	# never blocks, returns False if the segment is dropped
+	def push(self, recorder, name, samples, meta):
+		try:
+			self.queue.put_nowait((recorder, name, samples, meta))
+			return True
+		except Queue.Full:
+			return False
+
+	def run(self):
+		while True:
+			recorder, name, samples, meta = self.queue.get()
+			iq, scale = encode_iq(samples, meta["format"])
+			meta["scale"] = scale
+			try:
+				iq.tofile(os.path.join(recorder.directory, name + RECORD_EXTENSIONS[meta["format"]]))
+				with open(os.path.join(recorder.directory, name + ".json"), "w") as f:
+					json.dump(meta, f)
+			except (IOError, OSError):
+				recorder.nerrors += 1
+				continue
+			recorder.nsegments += 1
+			recorder.nbytes += iq.nbytes
+
+# the writer of this process, started along with the first recorder
+writer = None
+
+def get_writer():
+	global writer
+	if writer == None:
+		writer = segment_writer()
+	return writer
+
+# Samples sink of a channel: a ring of the last pre seconds, and a segment
+# written post seconds after the last trigger (or every maxlen seconds, as
+# long as the triggers keep coming).
+# trigger() is called from the decoder threads, the samples are only
+# touched by work()
+class iq_recorder(gr.block):
+	def __init__(self, samplerate, directory, channel_str = None, fmt = RECORD_FORMAT,
+		pre = RECORD_PRE, post = RECORD_POST, maxlen = RECORD_MAX):
+		gr.block.__init__(
+			self,
+			name = "IQ recorder",
+			in_sig = [numpy.complex64],
+			out_sig = None
+		)
+		self.samplerate = samplerate
+		self.directory = directory
+		self.fmt = fmt
+		self.size = max(1, int(samplerate * pre))
+		self.post = int(samplerate * post)
+		self.maxlen = max(1, int(samplerate * maxlen))
+		self.ring = numpy.zeros(self.size, dtype = numpy.complex64)
+		self.lock = threading.Lock()
+		self.writer = get_writer()
+		self.nsegments = 0
+		self.nbytes = 0
+		self.nerrors = 0
+		self.ndropped = 0
+		self.reset(channel_str)
+
+	# (a segment being recorded is dropped)
+	def reset(self, channel_str = None):
+		with self.lock:
+			self.channel_str = channel_str
+			self.pending = []
+		self.count = 0
+		self.time = None
+		self.segment = None
+
+	def trigger(self, txt):
+		with self.lock:
+			self.pending.append({ "addr": txt["addr"], "capcode": txt["capcode"], "fun": txt["fun"],
+				"endofmsg": txt["endofmsg"], "time": time.time() })
+
+	def stats(self):
+		return { "recorded_segments": self.nsegments, "recorded_bytes": self.nbytes,
+			"record_errors": self.nerrors, "record_dropped": self.ndropped }
+
+	# the ring content, oldest first
+	def history(self):
+		n = min(self.count, self.size)
+		start = (self.count - n) % self.size
+		return numpy.concatenate((self.ring[start:start + n], self.ring[:max(0, start + n - self.size)]))
+
+	def write_ring(self, samples):
+		samples = samples[max(0, len(samples) - self.size):]
+		start = (self.count - len(samples)) % self.size
+		first = min(len(samples), self.size - start)
+		self.ring[start:start + first] = samples[:first]
+		self.ring[:len(samples) - first] = samples[first:]
+
+	# hands the segment to the writer
+	def flush(self):
+		samples = numpy.concatenate(self.segment["chunks"])
+		start = self.time - 1.0 * (self.count - self.segment["start"]) / self.samplerate
+		name = "%s_%.3f" % (self.channel_str or "channel", start)
+		if not self.writer.push(self, name, samples, {
+				"file": name + RECORD_EXTENSIONS[self.fmt],
+				"channel": self.channel_str,
+				"samplerate": self.samplerate,
+				"time": start,
+				"format": self.fmt,
+				"samples": len(samples),
+				"messages": self.segment["messages"]
+			}):
+			self.ndropped += 1
+		self.segment = None
+
+	def work(self, input_items, output_items):
+		inp = input_items[0]
+		with self.lock:
+			triggers, self.pending = self.pending, []
+		if triggers:
+			if self.segment == None:
+				history = self.history()
+				self.segment = { "start": self.count - len(history), "chunks": [history], "messages": [] }
+			self.segment["end"] = self.count + self.post
+			self.segment["messages"].extend(triggers)
+		self.count += len(inp)
+		self.time = time.time()
+		self.write_ring(inp)
+		if self.segment != None:
+			self.segment["chunks"].append(inp[:len(inp) - max(0, self.count - self.segment["end"])].copy())
+			if self.count >= self.segment["end"]:
+				self.flush()
+			elif self.count - self.segment["start"] >= self.maxlen:
+				end = self.segment["end"]
+				self.flush()
+				self.segment = { "start": self.count, "chunks": [], "messages": [], "end": end }
+		return len(inp)
@@ -0,0 +1,339 @@
+# POCSAG Multichannel Realtime Decoder -- multi-process channel sharding
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The python blocks of every channel share the same interpreter (and GIL),
+# so we split the channels across worker processes instead:
+# - the main flowgraph writes the source samples into a shared memory ring
+# - each worker runs its own flowgraph, reading the ring, with a subset of
+#   the channels
+# - the messages are merged back, ordered by their position in the ring
+#   (the sample their last bit came from, see pocsag.pocsag_decoder)
+from gnuradio import gr
+import mmap
+import time
+import heapq
+import threading
+import multiprocessing
+import Queue
+import numpy
+from pocsag import gap_log
+from pocsag_record import record_settings
+from pocsag_engine import capcode_filter
+from pocsag_channels import channelizer, channel_manager, freq_str
+
+RING_SECONDS = 4 # length of the samples ring
+SHARD_TICK = 0.5 # s, period of the workers progress reports
+SHARD_IDLE = 0.005 # s, the workers ring readers sleep when there's nothing to read
+SHARD_STALL = 5 # s, a worker silent that long (or dead) no longer holds the merge back
+
+# Single writer, multiple readers ring of complex samples, in shared memory.
+# It must be created before forking the workers.
+# The writer never waits: a reader lagging more than the ring size skips
+# the overwritten samples (and counts them).
+# The writer announces the samples it's about to write (writing) before
+# publishing them (written): a reader checks, once it copied its samples,
+# that none of them was overwritten meanwhile.
+class iq_ring:
+	def __init__(self, size):
+		self.size = size
+		self.mm = mmap.mmap(-1, size * numpy.dtype(numpy.complex64).itemsize)
+		self.buf = numpy.frombuffer(self.mm, dtype = numpy.complex64)
+		self.written = multiprocessing.Value('L', 0, lock = False)
+		self.writing = multiprocessing.Value('L', 0, lock = False)
+
+	def write(self, samples):
+		n = len(samples)
+		if n > self.size:
+			samples = samples[n - self.size:]
+			self.written.value += n - self.size
+			n = self.size
+		self.writing.value = self.written.value + n
+		start = self.written.value % self.size
+		first = min(n, self.size - start)
+		self.buf[start:start + first] = samples[:first]
+		self.buf[:n - first] = samples[first:]
+		# publish the samples only once they are written
+		self.written.value += n
+
+	# Returns the number of samples read, the new position and the number
+	# of samples skipped
+	def read(self, pos, out):
+		written = self.written.value
+		skipped = 0
+		if written - pos > self.size:
+			skipped = written - self.size - pos
+			pos = written - self.size
+		n = min(len(out), written - pos)
+		start = pos % self.size
+		first = min(n, self.size - start)
+		out[:first] = self.buf[start:start + first]
+		out[first:n] = self.buf[:n - first]
+		# the oldest samples copied may have been overwritten meanwhile
+		torn = min(n, self.writing.value - self.size - pos)
+		if torn > 0:
+			out[:n - torn] = out[torn:n].copy()
+			n -= torn
+			pos += torn
+			skipped += torn
+		return n, pos + n, skipped
+
+class ring_sink(gr.block):
+	def __init__(self, ring):
+		gr.block.__init__(
+			self,
+			name = "IQ ring sink",
+			in_sig = [numpy.complex64],
+			out_sig = None
+		)
+		self.ring = ring
+
+	def work(self, input_items, output_items):
+		self.ring.write(input_items[0])
+		return len(input_items[0])
+
+# Also the sample counter of the worker flowgraph: count() is the number of
+# samples it produced, and gaps (see pocsag.gap_log) their ring positions,
+# the overruns skipping some.
+class ring_source(gr.block):
+	def __init__(self, ring):
+		gr.block.__init__(
+			self,
+			name = "IQ ring source",
+			in_sig = None,
+			out_sig = [numpy.complex64]
+		)
+		self.ring = ring
+		# start from the current position, not from the beginning
+		self.pos = ring.written.value
+		self.overruns = 0
+		self.produced = 0
+		self.gaps = gap_log()
+		self.gaps.add(0, self.pos)
+
+	def work(self, input_items, output_items):
+		n, self.pos, skipped = self.ring.read(self.pos, output_items[0])
+		self.overruns += skipped
+		if n == 0:
+			time.sleep(SHARD_IDLE)
+		self.gaps.add(self.produced, self.pos - n - self.produced)
+		self.produced += n
+		return n
+
+	def count(self):
+		return self.produced
+
+# the worker flowgraph looks like my_top_block, from the channels point of view
+class shard_top_block(gr.top_block):
+	def __init__(self, ring, args):
+		gr.top_block.__init__(self)
+		self.source = ring_source(ring)
+		self.channelizer = channelizer(self, args.samplerate) if args.channelizer else None
+		self.counter = self.source
+
+# The reports carry the ring position of what they're about (a message, or
+# anything else: the progress) and the progress of the worker, the ring
+# position all its channels decoded up to.
+# The decoders report their messages themselves (direct), before they count
+# the bits decoded: a message is always reported before the progress gets
+# past it.
+def shard_worker(index, ring, args, commands, results):
+	tb = shard_top_block(ring, args)
+	def progress():
+		horizon = channels.horizon()
+		return tb.source.pos if horizon == None else int(tb.source.gaps.input(horizon))
+	def report(kind, payload = None, pos = None):
+		done = progress()
+		results.put((done if pos == None else pos, done, index, kind, payload, tb.source.overruns))
+	channels = channel_manager(tb, args.samplerate, args.centerfreq, float(args.symrate),
+		log = lambda text: report("log", "[worker %d] %s" % (index, text)),
+		pagermsg = lambda txt: report("msg", txt, int(tb.source.gaps.input(txt["pos"]))),
+		squelch = args.squelch, squelch_db = args.squelch_db, symrates = args.symrates,
+		record = record_settings(args), capcodes = args.capcodes, direct = True)
+	if args.slots:
+		channels.init_slots(args.slots)
+	tb.start()
+	while True:
+		try:
+			cmd = commands.get(timeout = SHARD_TICK)
+		except Queue.Empty:
+			report("tick", channels.stats())
+			continue
+		if cmd[0] == "stop":
+			break
+		elif cmd[0] == "add":
+			channels.addfreq(cmd[1])
+		elif cmd[0] == "remove":
+			channels.remove_freq(cmd[1])
+		elif cmd[0] == "debug":
+			channels.set_debug(cmd[2], cmd[1])
+		elif cmd[0] == "reload":
+			try:
+				channels.reload_filter()
+			except (IOError, ValueError) as e:
+				report("log", "[worker %d] %s" % (index, e))
+		elif cmd[0] == "trace":
+			for line in channels.dump_trace(cmd[1]) or []:
+				report("log", line)
+	tb.stop()
+	tb.wait()
+
+# Same interface as channel_manager (addfreq/remove_freq/freqs), the
+# channels being spread over the workers.
+# The workers are forked right away: create the pool before the main
+# flowgraph.
+class shard_pool:
+	def __init__(self, args, nworkers):
+		self.samplerate = args.samplerate
+		self.centerfreq = args.centerfreq
+		self.capcodes = args.capcodes
+		self.ring = iq_ring(int(args.samplerate * RING_SECONDS))
+		self.results = multiprocessing.Queue()
+		self.commands = []
+		self.workers = []
+		for i in xrange(nworkers):
+			self.commands.append(multiprocessing.Queue())
+			worker = multiprocessing.Process(target = shard_worker,
+				args = (i, self.ring, args, self.commands[i], self.results))
+			worker.daemon = True
+			worker.start()
+			self.workers.append(worker)
+		self.freqs = dict()
+		self.progress = [0] * nworkers
+		self.heard = [time.time()] * nworkers
+		self.stalled = set()
+		self.stopping = False
+		self.overruns = [0] * nworkers
+		self.stats_reports = [{ "channels": {} }] * nworkers
+		self.pending = []
+
+	def sink(self):
+		return ring_sink(self.ring)
+
+	# Merge the workers messages into a single stream ordered by ring
+	# position: a message is released once every worker decoded past it
+	def start_merger(self, log, pagermsg):
+		self.log = log
+		self.pagermsg = pagermsg
+		thread = threading.Thread(target = self.merge)
+		thread.daemon = True
+		thread.start()
+
+	def merge(self):
+		while True:
+			try:
+				pos, done, index, kind, payload, overruns = self.results.get(timeout = SHARD_TICK)
+			except Queue.Empty:
+				kind = None
+			if kind != None:
+				self.progress[index] = done
+				self.heard[index] = time.time()
+				if overruns != self.overruns[index]:
+					self.log("[worker %d] %d samples overrun" % (index, overruns - self.overruns[index]))
+					self.overruns[index] = overruns
+				if kind == "tick":
+					self.stats_reports[index] = payload
+				else:
+					heapq.heappush(self.pending, (pos, index, kind, payload))
+			live = self.live_workers()
+			horizon = min(self.progress[i] for i in live) if live else float("inf")
+			while self.pending and self.pending[0][0] <= horizon:
+				pos, index, kind, payload = heapq.heappop(self.pending)
+				if kind == "msg":
+					self.pagermsg(payload)
+				else:
+					self.log(payload)
+
+	# The workers the merge waits for: the dead or silent ones would hold
+	# the messages of the other ones back forever
+	def live_workers(self):
+		now = time.time()
+		live = []
+		for i in xrange(len(self.workers)):
+			if self.workers[i].is_alive() and now - self.heard[i] < SHARD_STALL:
+				live.append(i)
+				if i in self.stalled:
+					self.log("[worker %d] is back" % i)
+					self.stalled.discard(i)
+			elif i not in self.stalled:
+				if not self.stopping:
+					self.log("[worker %d] %s, its messages are no longer waited for" % (i,
+						"is dead" if not self.workers[i].is_alive() else "doesn't report anymore"))
+				self.stalled.add(i)
+		return live
+
+	# the workers statistics, as of their last progress report
+	def stats(self):
+		channels = dict()
+		for report in self.stats_reports:
+			channels.update(report["channels"])
+		return { "source": { "ring_overruns": sum(self.overruns) }, "channels": channels }
+
+	def in_reach(self, freq):
+		return abs(self.centerfreq - freq) <= self.samplerate / 2.0
+
+	def addfreq(self, freq):
+		freq_txt = freq_str(freq)
+		if freq_txt in self.freqs:
+			self.log("%s is already monitored!" % freq_txt)
+			return None
+		if not self.in_reach(freq):
+			self.log("%s is outside of the bandwidth reach!" % freq_txt)
+			return None
+		# the least loaded worker
+		load = [0] * len(self.workers)
+		for values in self.freqs.values():
+			load[values["worker"]] += 1
+		worker = load.index(min(load))
+		self.commands[worker].put(("add", freq))
+		self.freqs[freq_txt] = { "freq": freq, "worker": worker }
+		return freq_txt
+
+	def remove_freq(self, freq):
+		if freq == None or freq not in self.freqs: return False
+		self.commands[self.freqs[freq]["worker"]].put(("remove", freq))
+		del self.freqs[freq]
+		return True
+
+	def set_debug(self, debug, freq = None):
+		if freq == None:
+			for commands in self.commands:
+				commands.put(("debug", None, debug))
+			return True
+		if freq not in self.freqs: return False
+		self.commands[self.freqs[freq]["worker"]].put(("debug", freq, debug))
+		return True
+
+	# The file is checked here, the workers reload it on their own
+	def reload_filter(self):
+		if not self.capcodes: return None
+		entries = capcode_filter(self.capcodes).load()
+		for commands in self.commands:
+			commands.put(("reload", ))
+		return entries
+
+	# The trace is dumped by the worker, it ends up in the log: returns
+	# no lines
+	def dump_trace(self, freq):
+		if freq not in self.freqs: return None
+		self.commands[self.freqs[freq]["worker"]].put(("trace", freq))
+		return []
+
+	def stop(self):
+		self.stopping = True
+		for commands in self.commands:
+			commands.put(("stop", ))
+		for worker in self.workers:
+			worker.join()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+# POCSAG Multichannel Realtime Decoder -- message store
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The decoded messages are queued (never blocking the caller) and written
+# by a single writer thread, one transaction (or one write) per batch:
+# - *.db/*.sqlite: SQLite, indexed by capcode, address, channel and time
+# - anything else: JSON lines, rotated in numbered segments
+# Run it as a script to query a SQLite store.
+import os
+import sys
+import time
+import json
+import sqlite3
+import argparse
+import threading
+import Queue
+
+STORE_QUEUE = 100000 # messages waiting to be written, beyond that they are dropped
+STORE_BATCH = 1000 # maximum number of messages per transaction
+STORE_PERIOD = 1.0 # s, the writer commits at least this often
+STORE_SEGMENT = 64 << 20 # JSON lines segments size, in bytes
+
+SQLITE_SCHEMA = [
+	"""CREATE TABLE IF NOT EXISTS pages (
+		ts REAL NOT NULL,
+		channel TEXT,
+		addr INTEGER NOT NULL,
+		capcode INTEGER,
+		fun INTEGER NOT NULL,
+		text TEXT,
+		num TEXT,
+		endofmsg INTEGER NOT NULL)""",
+	"CREATE INDEX IF NOT EXISTS pages_capcode ON pages (capcode, ts)",
+	"CREATE INDEX IF NOT EXISTS pages_addr ON pages (addr, ts)",
+	"CREATE INDEX IF NOT EXISTS pages_channel ON pages (channel, ts)",
+	"CREATE INDEX IF NOT EXISTS pages_ts ON pages (ts)",
+]
+SQLITE_COLUMNS = ["ts", "channel", "addr", "capcode", "fun", "text", "num", "endofmsg"]
+
+def is_sqlite(path):
+	return os.path.splitext(path)[1] in [".db", ".sqlite"]
+
+def sqlite_connect(path):
+	db = sqlite3.connect(path, check_same_thread = False)
+	# the writes are grouped anyway, WAL lets the queries run meanwhile
+	db.execute("PRAGMA journal_mode=WAL")
+	db.execute("PRAGMA synchronous=NORMAL")
+	# (the stores written before the capcodes were recorded)
+	columns = [row[1] for row in db.execute("PRAGMA table_info(pages)")]
+	if columns and "capcode" not in columns:
+		db.execute("ALTER TABLE pages ADD COLUMN capcode INTEGER")
+	for statement in SQLITE_SCHEMA:
+		db.execute(statement)
+	db.commit()
+	return db
+
+def sqlite_row(txt):
+	return (txt.get("ts", time.time()), txt["channel"], txt["addr"], txt["capcode"], txt["fun"],
+		txt["text"], txt["num"], 1 if txt["endofmsg"] else 0)
+
+class sqlite_writer:
+	def __init__(self, path):
+		self.db = sqlite_connect(path)
+
+	def write(self, batch):
+		with self.db:
+			self.db.executemany("INSERT INTO pages (%s) VALUES (%s)" % (", ".join(SQLITE_COLUMNS), ", ".join("?" * len(SQLITE_COLUMNS))),
+				[sqlite_row(txt) for txt in batch])
+
+	def close(self):
+		self.db.close()
+
+# <path> is the current segment, the full ones are renamed <path>.1, <path>.2...
+class jsonl_writer:
+	def __init__(self, path, segment = STORE_SEGMENT):
+		self.path = path
+		self.segment = segment
+		self.file = open(path, "a")
+
+	def rotate(self):
+		self.file.close()
+		n = 1
+		while os.path.exists("%s.%d" % (self.path, n)):
+			n += 1
+		os.rename(self.path, "%s.%d" % (self.path, n))
+		self.file = open(self.path, "a")
+
+	def write(self, batch):
+		self.file.write("".join(json.dumps(txt) + "\n" for txt in batch))
+		self.file.flush()
+		if self.file.tell() >= self.segment:
+			self.rotate()
+
+	def close(self):
+		self.file.close()
+
+class message_store:
+	def __init__(self, path, log = None):
+		self.path = path
+		self.log = log
+		self.writer = sqlite_writer(path) if is_sqlite(path) else jsonl_writer(path)
+		self.queue = Queue.Queue(STORE_QUEUE)
+		self.dropped = 0
+		self.written = 0
+		self.thread = threading.Thread(target = self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	# called from the decoding side, never blocks
+	def push(self, batch):
+		for txt in batch:
+			try:
+				self.queue.put_nowait(txt)
+			except Queue.Full:
+				self.dropped += 1
+
+	def run(self):
+		while True:
+			try:
+				batch = [self.queue.get(timeout = STORE_PERIOD)]
+			except Queue.Empty:
+				continue
+			if batch[0] == None:
+				break
+			stop = False
+			while len(batch) < STORE_BATCH:
+				try:
+					txt = self.queue.get_nowait()
+				except Queue.Empty:
+					break
+				if txt == None:
+					stop = True
+					break
+				batch.append(txt)
+			try:
+				self.writer.write(batch)
+				self.written += len(batch)
+			except (IOError, OSError, sqlite3.Error), e:
+				self.dropped += len(batch)
+				if self.log:
+					self.log("Can't store %d messages: %s" % (len(batch), e))
+			if stop:
+				break
+		self.writer.close()
+
+	# flush what's queued and stop the writer
+	def close(self):
+		self.queue.put(None)
+		self.thread.join()
+
+# The messages, oldest first. capcode/addr/channel/since/until are optional
+# filters, since/until being unix timestamps
+def query(path, addr = None, channel = None, since = None, until = None, limit = None, capcode = None):
+	db = sqlite_connect(path)
+	where = []
+	params = []
+	for column, op, value in [("capcode", "=", capcode), ("addr", "=", addr), ("channel", "=", channel), ("ts", ">=", since), ("ts", "<", until)]:
+		if value != None:
+			where.append("%s %s ?" % (column, op))
+			params.append(value)
+	sql = "SELECT %s FROM pages" % ", ".join(SQLITE_COLUMNS)
+	if where:
+		sql += " WHERE " + " AND ".join(where)
+	sql += " ORDER BY ts"
+	if limit:
+		sql = "SELECT * FROM (%s DESC LIMIT %d) ORDER BY ts" % (sql, limit)
+	try:
+		rows = db.execute(sql, params).fetchall()
+	finally:
+		db.close()
+	return [dict(zip(SQLITE_COLUMNS, row)) for row in rows]
+
+# "24h", "30m", "2d"... to seconds
+def parse_duration(value):
+	units = { "s": 1, "m": 60, "h": 3600, "d": 86400 }
+	if value and value[-1] in units:
+		return float(value[:-1]) * units[value[-1]]
+	return float(value)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+		description='query a SQLite message store')
+	parser.add_argument('store', help='the SQLite store (*.db or *.sqlite)')
+	parser.add_argument('-p', '--capcode', dest='capcode', type=int, help='only the messages to this capcode (the 21-bit pager address)')
+	parser.add_argument('-a', '--addr', dest='addr', type=int, help='only the messages to this decoder address (the "From pager" number)')
+	parser.add_argument('-c', '--channel', dest='channel', help='only the messages of this channel (e.g. 466.075000MHz)')
+	parser.add_argument('-t', '--last', dest='last', type=parse_duration, help='only the last messages, e.g. 24h, 30m or 2d')
+	parser.add_argument('-n', '--limit', dest='limit', type=int, help='at most this many (most recent) messages')
+	args = parser.parse_args()
+	if not is_sqlite(args.store) or not os.path.exists(args.store):
+		print "Error: %s is not a SQLite store" % args.store
+		sys.exit(1)
+	since = time.time() - args.last if args.last else None
+	for txt in query(args.store, args.addr, args.channel, since, None, args.limit, args.capcode):
+		print "%s Channel %s, From pager %d (%d), Capcode %s, TXT: %s%s" % (
+			time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(txt["ts"])),
+			"N/A" if txt["channel"] == None else txt["channel"], txt["addr"], txt["fun"],
+			"N/A" if txt["capcode"] == None else "%07d" % txt["capcode"],
+			txt["text"], "" if txt["endofmsg"] else " (partial)")
@@ -0,0 +1,192 @@
+# POCSAG Multichannel Realtime Decoder -- protocol engine regression tests
+# Copyright (c) 2012 iZsh -- izsh at fail0verflow.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Runs without gnuradio: python -m unittest discover
+import os
+import tempfile
+import unittest
+import numpy
+import pocsag_engine
+import pocsag_encoder
+
+class capcode_filter_test(unittest.TestCase):
+	def setUp(self):
+		fd, self.path = tempfile.mkstemp()
+		os.close(fd)
+
+	def tearDown(self):
+		os.unlink(self.path)
+
+	def decode(self, entries, messages):
+		with open(self.path, "w") as f:
+			f.write("\n".join(entries) + "\n")
+		engine = pocsag_engine.pocsag_engine(capfilter = pocsag_engine.capcode_filter(self.path))
+		return [pocsag_encoder.decoded(txt) for txt in engine.decode([pocsag_encoder.encode_bits(messages)])]
+
+	def test_capcode(self):
+		messages = [(1234567, pocsag_encoder.POCSAG_FUN_ALPHA, "kept"),
+			(1234566, pocsag_encoder.POCSAG_FUN_ALPHA, "other frame"),
+			(1200500, pocsag_encoder.POCSAG_FUN_NUMERIC, "123")]
+		self.assertEqual(self.decode(["1234567"], messages), [pocsag_encoder.expected(*messages[0])])
+		self.assertEqual(self.decode(["1234567:%d" % pocsag_encoder.POCSAG_FUN_NUMERIC], messages), [])
+		self.assertEqual(self.decode(["1200000-1299999", "!1234566"], messages),
+			[pocsag_encoder.expected(*messages[0]), pocsag_encoder.expected(*messages[2])])
+		self.assertEqual(self.decode(["!1234567"], messages),
+			[pocsag_encoder.expected(*m) for m in messages[1:]])
+
+	# the records carry the capcode, not only the (mangled) address
+	def test_record_capcode(self):
+		engine = pocsag_engine.pocsag_engine()
+		txt = list(engine.decode([pocsag_encoder.encode_bits([(1234567, pocsag_encoder.POCSAG_FUN_ALPHA, "x")])]))[0]
+		self.assertEqual(txt["capcode"], 1234567)
+		self.assertEqual(pocsag_engine.unpack_record(pocsag_engine.pack_record(txt))[0]["capcode"], 1234567)
+
+# The slow, straightforward engine the table BCH, the vectorized SYNC search
+# and the batch decoding replaced (a word at a time, read bit by bit): they
+# must decode exactly the same
+class reference_engine(pocsag_engine.pocsag_engine):
+	def BCH_syndrome(self, data):
+		return pocsag_engine.BCH_syndrome(data, pocsag_engine.POCSAG_BCH_POLY,
+			pocsag_engine.POCSAG_BCH_N, pocsag_engine.POCSAG_BCH_K)
+
+	def BCH_fix(self, data):
+		return pocsag_engine.BCH_fix(data, pocsag_engine.POCSAG_BCH_POLY,
+			pocsag_engine.POCSAG_BCH_N, pocsag_engine.POCSAG_BCH_K)
+
+	def search_sync(self, inp):
+		self.wcnt = -1
+		self.reset_txtvars()
+		for i in xrange(len(inp)):
+			self.add_bit(inp[i])
+			if pocsag_engine.hamming_weight(self.acc ^ pocsag_engine.POCSAG_STD_SYNC) <= pocsag_engine.POCSAG_SOFTTHRESHOLD:
+				self.nsyncs += 1
+				self.state = pocsag_engine.POCSAG_SYNCHED
+				return i + 1
+		return len(inp)
+
+	def read_word(self, inp):
+		self.acc = 0
+		self.bcnt = 0
+		for i in xrange(pocsag_engine.POCSAG_WORDSIZE):
+			self.add_bit(inp[i])
+
+	def synched(self, inp):
+		if len(inp) < pocsag_engine.POCSAG_WORDSIZE:
+			return 0
+		self.wcnt += 1
+		if self.wcnt >= pocsag_engine.POCSAG_MAXWORD:
+			self.state = pocsag_engine.POCSAG_SYNC
+			return 0
+		self.read_word(inp)
+		self.bitpos += pocsag_engine.POCSAG_WORDSIZE
+		self.nwords += 1
+		w = self.acc
+		if self.BCH_syndrome(w) != 0:
+			w = self.BCH_fix(self.acc)
+			if self.BCH_syndrome(w):
+				self.nsynclosses += 1
+				self.send_txt(False)
+				self.state = self.init_state
+				return pocsag_engine.POCSAG_WORDSIZE
+			self.ncorrected += 1
+			self.ncorrected_bits[pocsag_engine.hamming_weight(self.acc ^ w)] += 1
+		if w == pocsag_engine.POCSAG_STD_IDLE and self.activetxt:
+			self.send_txt(True)
+			self.reset_txtvars()
+		elif w == pocsag_engine.POCSAG_STD_IDLE:
+			pass
+		elif w & (1 << 31):
+			self.decode_data(w)
+		else:
+			self.decode_addr(w)
+		return pocsag_engine.POCSAG_WORDSIZE
+
+class engine_equivalence_test(unittest.TestCase):
+	CHUNK_SIZES = [1, 33, 4096, None]
+
+	def setUp(self):
+		self.rng = numpy.random.RandomState(2012)
+		self.messages = pocsag_encoder.random_messages(12, seed = 2012)
+		self.bits = pocsag_encoder.encode_bits(self.messages)
+
+	# The messages (with their bit position) and counters, the bits fed by
+	# chunk_size (None: at once)
+	def decode(self, engine, bits, chunk_size = None):
+		chunk_size = chunk_size or len(bits)
+		chunks = [bits[i:i + chunk_size] for i in xrange(0, len(bits), chunk_size)]
+		positions = []
+		send = engine.send
+		def send_pos(txt):
+			positions.append(engine.bitpos)
+			send(txt)
+		engine.send = send_pos
+		messages = [pocsag_encoder.decoded(txt) for txt in engine.decode(chunks)]
+		return zip(messages, positions), engine.counters()
+
+	def check_stream(self, bits):
+		reference = self.decode(reference_engine(), bits)
+		for chunk_size in self.CHUNK_SIZES:
+			self.assertEqual(self.decode(pocsag_engine.pocsag_engine(), bits, chunk_size), reference,
+				"chunks of %s bits" % chunk_size)
+		return reference
+
+	def test_bch(self):
+		poly, n, k = pocsag_engine.POCSAG_BCH_POLY, pocsag_engine.POCSAG_BCH_N, pocsag_engine.POCSAG_BCH_K
+		words = [pocsag_encoder.data_word(self.rng.randint(0, 2 ** 20)) for i in xrange(100)]
+		for w in words:
+			for nerrors in xrange(4):
+				e = 0
+				for bit in self.rng.choice(32, nerrors, replace = False):
+					e |= 1 << int(bit)
+				self.assertEqual(pocsag_engine.BCH_table_syndrome(w ^ e, pocsag_engine.POCSAG_BCH_SYNDROME_TABLES),
+					pocsag_engine.BCH_syndrome(w ^ e, poly, n, k))
+				fixed = pocsag_engine.BCH_table_fix(w ^ e, pocsag_engine.POCSAG_BCH_SYNDROME_TABLES,
+					pocsag_engine.POCSAG_BCH_FIX_TABLE)
+				self.assertEqual(fixed, pocsag_engine.BCH_fix(w ^ e, poly, n, k))
+				if nerrors <= 2:
+					self.assertEqual(fixed, w)
+
+	def test_correlate_sync(self):
+		bits = pocsag_encoder.add_bit_errors(self.bits, 0.02, self.rng)
+		engine = reference_engine()
+		acc, start = 0, 0
+		while start < len(bits):
+			inp = bits[start:start + 700]
+			n, hw, acc = pocsag_engine.correlate_sync(inp, acc)
+			engine.state = pocsag_engine.POCSAG_SEARCH_SYNC
+			self.assertEqual(n, engine.search_sync(inp))
+			self.assertEqual(acc, engine.acc)
+			self.assertEqual(hw <= pocsag_engine.POCSAG_SOFTTHRESHOLD, engine.state == pocsag_engine.POCSAG_SYNCHED)
+			start += n
+
+	def test_clean(self):
+		messages, counters = self.check_stream(self.bits)
+		self.assertEqual([txt for txt, pos in messages], [pocsag_encoder.expected(*m) for m in self.messages])
+		positions = [pos for txt, pos in messages]
+		self.assertEqual(positions, sorted(positions))
+		self.assertTrue(positions[-1] <= len(self.bits))
+		self.assertEqual(counters["corrected"], 0)
+
+	def test_ber(self):
+		for ber in [1e-3, 1e-2]:
+			messages, counters = self.check_stream(pocsag_encoder.add_bit_errors(self.bits, ber, self.rng))
+			self.assertTrue(counters["corrected"] > 0)
+
+	def test_slips(self):
+		self.check_stream(pocsag_encoder.add_slips(self.bits, 1e-3, self.rng))
+
+if __name__ == "__main__":
+	unittest.main()